@@ -0,0 +1,91 @@
+"""Conversation analytics throughput
+
+Writes a synthetic recorder log and times parsing it into a `Turns`
+table, then builds a much larger synthetic table directly in numpy and
+times the full `analyze` report over it.
+
+    python analytics.py --log-turns 200000 --turns 20000000
+"""
+import os
+import json
+import time
+import argparse
+import tempfile
+
+import numpy as np
+
+from sarufi.analytics import Turns, analyze, load_turns
+
+STATES = ["<unmatched>", "end", "menu", "balance", "choose_amount", "confirm", "receipt", "help"]
+# state -> (next state, probability the user answers at all)
+PATH = {"menu": "balance", "balance": "choose_amount", "choose_amount": "confirm", "confirm": "receipt"}
+
+
+def write_log(path, n_turns, n_chats, seed=7):
+    rng = np.random.default_rng(seed)
+    with open(path, "w") as stream:
+        chat_state = {}
+        for i in range(n_turns):
+            chat = int(rng.integers(n_chats))
+            state = chat_state.get(chat) or ("menu" if rng.random() < 0.9 else None)
+            next_state = PATH.get(state, "end") if state else "end"
+            if rng.random() < 0.1:
+                next_state = "end"  # user gives up, flow restarts
+            chat_state[chat] = None if next_state == "end" else next_state
+            response = {"message": ["..."], "next_state": next_state}
+            if state:
+                response["current_state"] = state
+            record = {
+                "ts": i * 0.01,
+                "latency": float(rng.lognormal(-2.5, 0.5)),
+                "method": "POST",
+                "path": "conversation",
+                "request": {"bot_id": 1, "chat_id": str(chat), "message": "1"},
+                "status": 200,
+                "response": response,
+            }
+            stream.write(json.dumps(record, separators=(",", ":")) + "\n")
+
+
+def synthetic_turns(n_turns, n_chats, n_bots=20, seed=7):
+    rng = np.random.default_rng(seed)
+    columns = {
+        "ts": np.sort(rng.uniform(0, 30 * 86400, n_turns)),
+        "latency": rng.lognormal(-2.5, 0.5, n_turns),
+        "status": np.where(rng.random(n_turns) < 0.002, 502, 200),
+        "bot": rng.integers(n_bots, size=n_turns),
+        "chat": rng.integers(n_chats, size=n_turns),
+        "state": rng.integers(len(STATES), size=n_turns),
+        "next_state": rng.integers(1, len(STATES), size=n_turns),
+    }
+    return Turns(
+        columns, [str(i) for i in range(n_bots)], [str(i) for i in range(n_chats)], STATES
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--log-turns", type=int, default=200_000, help="turns in the NDJSON log")
+    parser.add_argument("--turns", type=int, default=10_000_000, help="turns in the numpy table")
+    parser.add_argument("--chats", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        log = os.path.join(directory, "chats.ndjson")
+        write_log(log, args.log_turns, max(args.log_turns // 20, 1))
+        started = time.perf_counter()
+        turns = load_turns(log)
+        elapsed = time.perf_counter() - started
+        print(f"parse: {len(turns)} turns in {elapsed:.2f} s ({len(turns) / elapsed:,.0f} turns/s)")
+        report = analyze(turns, funnels=[["menu", "balance", "choose_amount", "confirm"]])
+        print("funnel:", [step["sessions"] for step in report["funnels"]["menu > balance > choose_amount > confirm"]])
+
+    turns = synthetic_turns(args.turns, args.chats)
+    started = time.perf_counter()
+    analyze(turns, funnels=[["menu", "balance", "choose_amount", "confirm"]])
+    elapsed = time.perf_counter() - started
+    print(f"analyze: {len(turns):,} turns in {elapsed:.2f} s ({len(turns) / elapsed:,.0f} turns/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""Wire bytes and latency of large bot payloads, with and without compression
+
+Creates, updates and downloads a synthetic bot with many intents and flow
+states against the local stand-in server, once with plain JSON bodies and
+once with gzip request bodies, and prints bytes on the wire and timings.
+
+    python compression.py --intents 2000 --utterances 40
+"""
+import time
+import random
+import argparse
+
+from sarufi import Sarufi, Transport
+from sarufi.standin import StandinServer
+
+WORDS = "nataka kutoa hela weka beti naomba mpunga wangu salama habari asante sana".split()
+
+
+def synthetic_bot(n_intents, n_utterances, seed=7):
+    rng = random.Random(seed)
+    intents, flow = {}, {}
+    for i in range(n_intents):
+        name = f"intent_{i}"
+        intents[name] = [
+            " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 8)))
+            for _ in range(n_utterances)
+        ]
+        flow[name] = {"message": [f"Jibu la {name}"], "next_state": "end"}
+    return intents, flow
+
+
+def run(server, transport, intents, flow):
+    sarufi = Sarufi(api_key="benchmark", transport=transport)
+    sarufi._BASE_URL = server.url
+    server.reset_counters()
+    timings = {}
+
+    started = time.perf_counter()
+    bot = sarufi.create_bot(name="Benchmark", intents=intents, flow=flow)
+    timings["create_bot"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    sarufi.update_bot(bot.id, intents=intents, flow=flow)
+    timings["update_bot"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    sarufi.get_bot(bot.id)
+    timings["get_bot"] = time.perf_counter() - started
+    return timings, server.counters()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--intents", type=int, default=1000)
+    parser.add_argument("--utterances", type=int, default=30)
+    parser.add_argument("--latency", type=float, default=0.0)
+    args = parser.parse_args()
+    intents, flow = synthetic_bot(args.intents, args.utterances)
+
+    with StandinServer(latency=args.latency) as server:
+        for label, transport in [
+            ("plain", Transport()),
+            ("gzip", Transport(compress_threshold=16 * 1024)),
+        ]:
+            timings, counters = run(server, transport, intents, flow)
+            print(
+                f"{label:>5}: sent {counters['bytes_received'] / 1e6:7.2f} MB, "
+                f"received {counters['bytes_sent'] / 1e6:7.2f} MB, "
+                + ", ".join(f"{name} {secs * 1000:.0f} ms" for name, secs in timings.items())
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Latency-aware routing and failover over several stand-in servers
+
+Starts stand-ins with different latencies plus an address nothing listens
+on, routes chat traffic over them with `Endpoints` and prints where the
+requests went. The fastest stand-in is then stopped half way to show the
+failover to the next one.
+
+    python endpoints.py --requests 400 --latencies 0.005 0.02 0.05
+"""
+import time
+import argparse
+
+from sarufi import Endpoints, Sarufi
+from sarufi.standin import StandinServer
+
+INTENTS = {"salamu": ["mambo", "habari", "niaje"]}
+FLOW = {"salamu": {"message": ["Salama!"], "next_state": "end"}}
+UNREACHABLE = "http://127.0.0.1:9/"
+
+
+def report(endpoints, label):
+    print(label)
+    for url, stats in endpoints.stats().items():
+        ewma = "-" if stats["ewma"] is None else f"{stats['ewma'] * 1000:.1f} ms"
+        print(
+            f"  {url:<26} healthy {stats['healthy']!s:<5} ewma {ewma:>9} "
+            f"requests {stats['requests']:>5} failovers {stats['failovers']}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--latencies", type=float, nargs="+", default=[0.005, 0.02, 0.05])
+    parser.add_argument("--policy", default="latency", choices=["latency", "ordered"])
+    args = parser.parse_args()
+
+    standins = [StandinServer(latency=latency).start() for latency in args.latencies]
+    for standin in standins:
+        standin.handle("POST", "chatbot", {"name": "b", "intents": INTENTS, "flows": FLOW})
+    endpoints = Endpoints(
+        [UNREACHABLE] + [standin.url for standin in standins],
+        policy=args.policy,
+        check_interval=1.0,
+    )
+    sarufi = Sarufi(api_key="benchmark", endpoints=endpoints)
+
+    half = args.requests // 2
+    started = time.perf_counter()
+    for _ in range(half):
+        sarufi.chat(bot_id=1, chat_id="bench", message="mambo")
+    report(endpoints, f"{half} requests in {time.perf_counter() - started:.2f} s")
+
+    fastest = standins[args.latencies.index(min(args.latencies))]
+    fastest.stop()
+    sarufi._transport.close()  # drop kept-alive connections to the stopped stand-in
+    started = time.perf_counter()
+    for _ in range(args.requests - half):
+        sarufi.chat(bot_id=1, chat_id="bench", message="mambo")
+    report(endpoints, f"fastest stopped, {args.requests - half} requests in {time.perf_counter() - started:.2f} s")
+
+    endpoints.close()
+    for standin in standins:
+        if standin is not fastest:
+            standin.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Sockets and tail latency of concurrent chat traffic, HTTP/1.1 vs HTTP/2
+
+Serves the local stand-in API over cleartext HTTP/2 (h2c) with hypercorn
+and fires concurrent `chat` calls through the pooled HTTP/1.1 transport and
+through `HTTP2Transport`, then prints the number of connections the server
+saw and the latency percentiles.
+
+    pip install "httpx[http2]" hypercorn
+    python http2.py --requests 4000 --concurrency 200
+"""
+import time
+import asyncio
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from hypercorn.config import Config
+from hypercorn.asyncio import serve
+
+from sarufi import Sarufi, Transport, HTTP2Transport
+from sarufi.stats import LatencyStats
+from sarufi.standin import StandinServer
+
+INTENTS = {"salamu": ["mambo", "habari", "niaje"]}
+FLOW = {"salamu": {"message": ["Salama!"], "next_state": "end"}}
+
+
+def start_h2c(standin, port):
+    config = Config()
+    config.bind = [f"127.0.0.1:{port}"]
+    config.loglevel = "WARNING"
+    config.keep_alive_max_requests = 10**9  # no GOAWAY in the middle of the run
+
+    async def run_forever():
+        # a shutdown trigger keeps hypercorn from installing signal handlers off the main thread
+        await serve(standin.asgi, config, shutdown_trigger=asyncio.Event().wait)
+
+    threading.Thread(target=asyncio.run, args=(run_forever(),), daemon=True).start()
+    time.sleep(1.0)
+    return f"http://127.0.0.1:{port}/"
+
+
+def run(standin, url, transport, bot_id, requests, concurrency):
+    sarufi = Sarufi(api_key="benchmark", transport=transport)
+    sarufi._BASE_URL = url
+    stats = LatencyStats(window=requests)
+
+    def one(i):
+        started = time.perf_counter()
+        response = sarufi.chat(bot_id=bot_id, chat_id=str(i % 500), message="mambo")
+        stats.observe(time.perf_counter() - started, error="message" not in response)
+
+    standin.reset_counters()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - started
+    transport.close()
+    return elapsed, stats.summary(), standin.counters()["connections"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    standin = StandinServer(latency=0.002)
+    url = start_h2c(standin, args.port)
+    bot_id = standin.handle("POST", "chatbot", {"name": "b", "intents": INTENTS, "flows": FLOW})[1]["id"]
+
+    for label, transport in [
+        ("HTTP/1.1", Transport(pool_maxsize=args.concurrency)),
+        ("HTTP/2", HTTP2Transport(max_connections=2, prior_knowledge=True)),
+    ]:
+        elapsed, summary, sockets = run(
+            standin, url, transport, bot_id, args.requests, args.concurrency
+        )
+        print(
+            f"{label:>8}: {args.requests / elapsed:6.0f} req/s, sockets {sockets:4d}, "
+            f"p50 {summary['p50'] * 1000:.1f} ms, p99 {summary['p99'] * 1000:.1f} ms, "
+            f"errors {summary['errors']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
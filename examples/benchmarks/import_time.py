@@ -0,0 +1,58 @@
+"""Import time budget for the sarufi package
+
+Measures `import sarufi` + `from sarufi import Sarufi` in fresh interpreters
+and fails (exit code 1) when the median exceeds the budget or when a heavy
+dependency is imported eagerly.
+
+    python import_time.py --budget-ms 30
+"""
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+PROBE = """
+import sys, time, json
+started = time.perf_counter()
+import sarufi
+from sarufi import Sarufi, Bot
+elapsed = time.perf_counter() - started
+print(json.dumps({
+    "ms": elapsed * 1000,
+    "eager": [name for name in ("requests", "yaml") if name in sys.modules],
+    "handlers": len(sarufi.logger.handlers),
+}))
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--budget-ms", type=float, default=30.0)
+    parser.add_argument("--runs", type=int, default=7)
+    args = parser.parse_args()
+
+    results = [
+        json.loads(subprocess.check_output([sys.executable, "-c", PROBE]))
+        for _ in range(args.runs)
+    ]
+    median = statistics.median(result["ms"] for result in results)
+    eager = sorted({name for result in results for name in result["eager"]})
+    handlers = max(result["handlers"] for result in results)
+    print(f"import sarufi: median {median:.1f} ms over {args.runs} runs "
+          f"(budget {args.budget_ms:.1f} ms)")
+
+    failures = []
+    if median > args.budget_ms:
+        failures.append(f"import took {median:.1f} ms")
+    if eager:
+        failures.append(f"eagerly imported {', '.join(eager)}")
+    if handlers:
+        failures.append(f"{handlers} logging handler(s) installed at import")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
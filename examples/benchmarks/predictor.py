@@ -0,0 +1,84 @@
+"""Build and query times of the local intent predictor on large intent sets
+
+Generates synthetic intents (each intent has its own topic words mixed
+with shared filler words), builds an `IntentPredictor` and times single
+and batched predictions of held-out utterances with typos, reporting the
+accuracy against the intent they were generated from.
+
+    python predictor.py --intents 1000 --utterances 100 --queries 2000
+"""
+import time
+import random
+import string
+import argparse
+
+from sarufi.predictor import IntentPredictor
+from sarufi.stats import LatencyStats
+
+FILLER = "nataka naomba tafadhali sana kwa ya wa na hii ile leo kesho pia bado".split()
+
+
+def word(rng):
+    return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 8)))
+
+
+def utterance(rng, topic):
+    words = [rng.choice(topic) for _ in range(rng.randint(1, 3))]
+    words += [rng.choice(FILLER) for _ in range(rng.randint(1, 4))]
+    rng.shuffle(words)
+    return " ".join(words)
+
+
+def typo(rng, text):
+    chars = list(text)
+    for _ in range(max(1, len(chars) // 15)):
+        position = rng.randrange(len(chars))
+        chars[position] = rng.choice(string.ascii_lowercase)
+    return "".join(chars)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--intents", type=int, default=1000)
+    parser.add_argument("--utterances", type=int, default=100, help="utterances per intent")
+    parser.add_argument("--queries", type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    topics = {f"intent_{i}": [word(rng) for _ in range(4)] for i in range(args.intents)}
+    intents = {
+        name: [utterance(rng, topic) for _ in range(args.utterances)]
+        for name, topic in topics.items()
+    }
+    names = list(topics)
+    queries = []
+    for _ in range(args.queries):
+        name = rng.choice(names)
+        queries.append((name, typo(rng, utterance(rng, topics[name]))))
+
+    started = time.perf_counter()
+    predictor = IntentPredictor(intents)
+    build = time.perf_counter() - started
+    print(f"build: {predictor} in {build:.2f} s")
+
+    latency = LatencyStats(window=len(queries))
+    correct = 0
+    for name, message in queries:
+        started = time.perf_counter()
+        prediction = predictor.predict(message)
+        latency.observe(time.perf_counter() - started)
+        correct += prediction["intent"] == name
+    summary = latency.summary()
+    print(
+        f"predict: p50 {summary['p50'] * 1000:.2f} ms, p95 {summary['p95'] * 1000:.2f} ms, "
+        f"accuracy {correct / len(queries):.3f}"
+    )
+
+    started = time.perf_counter()
+    predictor.predict_many([message for _, message in queries])
+    elapsed = time.perf_counter() - started
+    print(f"predict_many: {len(queries) / elapsed:,.0f} messages/s")
+
+
+if __name__ == "__main__":
+    main()
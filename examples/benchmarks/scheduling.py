@@ -0,0 +1,96 @@
+"""Chat latency while a background deploy saturates the API
+
+Runs `chat` calls alongside a flood of background `predict/intent` and
+`update_bot` calls against the local stand-in, which answers a limited
+number of requests at once like a busy server. It runs once on a plain
+transport and once with a `PriorityScheduler`, and prints the chat latency
+percentiles, the background throughput and connection errors of both runs.
+
+    python scheduling.py --seconds 5 --background 48 --chat 4
+"""
+import time
+import argparse
+import threading
+
+import requests
+
+from sarufi import Sarufi, Transport
+from sarufi.scheduler import PriorityScheduler
+from sarufi.stats import LatencyStats
+from sarufi.standin import StandinServer
+
+INTENTS = {"salamu": ["mambo", "habari", "niaje"]}
+FLOW = {"salamu": {"message": ["Salama!"], "next_state": "end"}}
+
+
+def run(url, transport, bot_id, seconds, background, chat):
+    sarufi = Sarufi(api_key="benchmark", transport=transport)
+    sarufi._BASE_URL = url
+    chat_stats = LatencyStats(window=1_000_000)
+    background_done = [0]
+    errors = [0]
+    stop = threading.Event()
+
+    def chat_user(user):
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                sarufi.chat(bot_id=bot_id, chat_id=str(user), message="mambo")
+            except requests.ConnectionError:
+                errors[0] += 1
+                continue
+            chat_stats.observe(time.perf_counter() - started)
+            time.sleep(0.01)  # think time
+
+    def deploy_worker(worker):
+        while not stop.is_set():
+            try:
+                if worker % 4:
+                    sarufi._post_req(url + "predict/intent", {"bot_id": bot_id, "message": "habari"})
+                else:
+                    sarufi.update_bot(bot_id, intents=INTENTS)
+            except requests.ConnectionError:
+                errors[0] += 1  # connection churn once the pool overflows
+                continue
+            background_done[0] += 1
+
+    threads = [threading.Thread(target=chat_user, args=(i,)) for i in range(chat)]
+    threads += [threading.Thread(target=deploy_worker, args=(i,)) for i in range(background)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    transport.close()
+    return chat_stats.summary(), background_done[0] / seconds, errors[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--background", type=int, default=48, help="background worker threads")
+    parser.add_argument("--chat", type=int, default=4, help="concurrent chat users")
+    parser.add_argument("--workers", type=int, default=16, help="requests the stand-in serves at once")
+    parser.add_argument("--latency", type=float, default=0.02, help="stand-in seconds per request")
+    args = parser.parse_args()
+
+    with StandinServer(latency=args.latency, workers=args.workers) as standin:
+        bot_id = standin.handle("POST", "chatbot", {"name": "b", "intents": INTENTS, "flows": FLOW})[1]["id"]
+        pool = args.workers
+        for label, transport in [
+            ("plain", Transport(pool_maxsize=pool)),
+            ("scheduled", Transport(pool_maxsize=pool, scheduler=PriorityScheduler(total=pool))),
+        ]:
+            summary, throughput, errors = run(
+                standin.url, transport, bot_id, args.seconds, args.background, args.chat
+            )
+            print(
+                f"{label:>9}: chat p50 {summary['p50'] * 1000:6.1f} ms, "
+                f"p95 {summary['p95'] * 1000:6.1f} ms, p99 {summary['p99'] * 1000:6.1f} ms, "
+                f"background {throughput:5.0f} req/s, {errors} connection errors"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Local load test for the built-in webhook receiver
+
+Starts a `WebhookReceiver` on a free local port, fires concurrent fulfillment
+callbacks at it and prints throughput plus the per-intent handler latency.
+
+    python load_test.py --requests 5000 --concurrency 64
+"""
+import json
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from sarufi.webhook import WebhookReceiver
+
+receiver = WebhookReceiver(deadline=1.0, max_workers=64)
+
+
+@receiver.handler("toa_hela")
+def withdraw(payload):
+    time.sleep(0.005)  # simulate a blocking database call
+    return {"message": [f"Umetoa {payload.get('amount', 0)}"]}
+
+
+@receiver.handler()
+def fallback(payload):
+    return {"message": ["Sawa"]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    server = receiver.serve(port=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/"
+
+    local = threading.local()
+
+    def send(i):
+        session = getattr(local, "session", None)
+        if session is None:
+            session = local.session = requests.Session()
+        intent = "toa_hela" if i % 2 else "salamu"
+        body = json.dumps({"intent": intent, "chat_id": str(i), "amount": i})
+        return session.post(url, data=body, timeout=10).status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        statuses = list(pool.map(send, range(args.requests)))
+    elapsed = time.perf_counter() - started
+
+    server.shutdown()
+    print(f"{args.requests} callbacks in {elapsed:.2f}s "
+          f"({args.requests / elapsed:.0f} req/s), "
+          f"non-200: {sum(status != 200 for status in statuses)}")
+    print(json.dumps(receiver.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,563 @@
+"""Conversation analytics over recorded chat traffic
+
+Turns recorded by a `Recorder` are parsed once into a columnar `Turns`
+table (timestamps, latency, status and dictionary encoded bot, chat and
+state codes in numpy arrays), which can be cached as a compressed `.npz`
+file. Reports are computed with vectorized numpy operations over whole
+columns, so tens of millions of turns are analysed in seconds on one
+machine: state transition counts, funnels, per state drop-off, intent
+frequency and latency percentiles.
+
+A session is a run of turns of one chat that ends when the flow reaches
+`end` or the chat is idle for longer than `session_timeout`. A turn
+starting a session is answered from the intent the message matched, so
+intent frequency counts the states sessions start in. A session is
+dropped in the state it was left waiting in, unless it is still active at
+the end of the log. Failed requests count towards latency and errors but
+not towards the flow. Requires `pip install sarufi[analytics]` (numpy).
+
+    python -m sarufi.analytics chats.ndjson.1 chats.ndjson --funnel menu,balance,confirm -o report.json
+
+Examples:
+
+>>> from sarufi.analytics import Turns, analyze, load_turns, write_report
+>>> turns = load_turns(recorder.files(), workers=4)
+>>> turns.save("turns.npz")
+>>> report = analyze(Turns.load("turns.npz"), funnels=[["menu", "balance", "confirm"]])
+>>> report["drop_off"][0]
+{'state': 'choose_amount', 'entered': 18250, 'dropped': 4120, 'rate': 0.2258}
+>>> write_report(report, "report.json.gz")
+"""
+from __future__ import annotations
+import sys
+import gzip
+import json
+import argparse
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Union
+
+try:
+    import numpy as np
+except ImportError as error:  # pragma: no cover
+    raise ImportError(
+        "sarufi.analytics needs numpy, install it with `pip install sarufi[analytics]`"
+    ) from error
+
+from .recorder import CHAT_PATHS, read_log
+from .validation import END_STATE
+
+# state code of turns whose message matched no intent (fallback replies)
+UNMATCHED = "<unmatched>"
+START = "<start>"
+SESSION_TIMEOUT = 30 * 60
+
+_COLUMNS = {
+    "ts": "f8",
+    "latency": "f4",
+    "status": "i2",
+    "bot": "i4",
+    "chat": "i4",
+    "state": "i4",
+    "next_state": "i4",
+}
+
+
+class Turns(object):
+    """Columnar table of recorded chat turns
+
+    Attributes:
+        ts, latency, status, bot, chat, state, next_state (numpy.ndarray): One entry per turn,
+            bot, chat and state columns hold codes into `bots`, `chats` and `states`
+        bots (List[str]): Bot ids by code
+        chats (List[str]): Chat ids by code
+        states (List[str]): State names by code, code 0 is `UNMATCHED`
+    """
+
+    def __init__(
+        self,
+        columns: Dict[str, np.ndarray],
+        bots: Sequence[str],
+        chats: Sequence[str],
+        states: Sequence[str],
+    ) -> None:
+        for name, dtype in _COLUMNS.items():
+            setattr(self, name, np.asarray(columns[name], dtype=dtype))
+        self.bots = list(bots)
+        self.chats = list(chats)
+        self.states = list(states)
+        self._cache: Dict[Any, Any] = {}  # sort orders shared by the reports
+
+    def __len__(self) -> int:
+        return len(self.ts)
+
+    def __repr__(self) -> str:
+        return (
+            f"Turns({len(self)} turns, {len(self.bots)} bots, "
+            f"{len(self.chats)} chats, {len(self.states)} states)"
+        )
+
+    def _sessions(self, session_timeout: float) -> _Sessions:
+        key = ("sessions", session_timeout)
+        if key not in self._cache:
+            self._cache[key] = _Sessions(self, session_timeout)
+        return self._cache[key]
+
+    def _latency_order(self) -> np.ndarray:
+        if "latency" not in self._cache:
+            self._cache["latency"] = np.argsort(self.latency)
+        return self._cache["latency"]
+
+    def state_code(self, name: str) -> int:
+        """Code of a state name, -1 when it never occurs"""
+        try:
+            return self.states.index(name)
+        except ValueError:
+            return -1
+
+    def select(self, mask: np.ndarray) -> Turns:
+        """Turns where a boolean mask over the rows is set, sharing the dictionaries"""
+        columns = {name: getattr(self, name)[mask] for name in _COLUMNS}
+        return Turns(columns, self.bots, self.chats, self.states)
+
+    def for_bot(self, bot_id: Union[int, str]) -> Turns:
+        """Turns of one bot"""
+        try:
+            code = self.bots.index(str(bot_id))
+        except ValueError:
+            return self.select(np.zeros(len(self), dtype=bool))
+        return self.select(self.bot == code)
+
+    def save(self, path: str) -> None:
+        """Writes the table to a compressed .npz file"""
+        np.savez_compressed(
+            path,
+            bots=np.array(self.bots, dtype=str),
+            chats=np.array(self.chats, dtype=str),
+            states=np.array(self.states, dtype=str),
+            **{name: getattr(self, name) for name in _COLUMNS},
+        )
+
+    @classmethod
+    def load(cls, path: str) -> Turns:
+        """Reads a table written by `save`"""
+        with np.load(path) as data:
+            columns = {name: data[name] for name in _COLUMNS}
+            return cls(
+                columns, data["bots"].tolist(), data["chats"].tolist(), data["states"].tolist()
+            )
+
+    @classmethod
+    def concat(cls, parts: Sequence[Turns]) -> Turns:
+        """Joins tables, re-encoding their dictionaries into shared ones"""
+        if len(parts) == 1:
+            return parts[0]
+        dictionaries: Dict[str, Dict[str, int]] = {
+            "bot": {},
+            "chat": {},
+            "state": {UNMATCHED: 0},
+        }
+        columns: Dict[str, List[np.ndarray]] = {name: [] for name in _COLUMNS}
+        for part in parts:
+            mappings = {}
+            for column, values in (
+                ("bot", part.bots),
+                ("chat", part.chats),
+                ("state", part.states),
+            ):
+                codes = dictionaries[column]
+                mappings[column] = np.array(
+                    [codes.setdefault(value, len(codes)) for value in values], dtype="i4"
+                )
+            mappings["next_state"] = mappings["state"]
+            for name in _COLUMNS:
+                values = getattr(part, name)
+                columns[name].append(mappings[name][values] if name in mappings else values)
+        return cls(
+            {name: np.concatenate(values) for name, values in columns.items()},
+            list(dictionaries["bot"]),
+            list(dictionaries["chat"]),
+            list(dictionaries["state"]),
+        )
+
+
+def _parse(paths: Union[str, Iterable[str]], chat_paths: Sequence[str] = CHAT_PATHS) -> Turns:
+    """Parses NDJSON logs into a `Turns` table, skipping records that are not chat turns"""
+    chat_paths = frozenset(chat_paths)
+    columns = {name: array("d" if dtype[0] == "f" else "i") for name, dtype in _COLUMNS.items()}
+    ts, latency, status = columns["ts"].append, columns["latency"].append, columns["status"].append
+    bot, chat = columns["bot"].append, columns["chat"].append
+    state, next_state = columns["state"].append, columns["next_state"].append
+    bots: Dict[str, int] = {}
+    chats: Dict[str, int] = {}
+    states: Dict[str, int] = {UNMATCHED: 0}
+
+    for record in read_log(paths):
+        if record.get("path") not in chat_paths:
+            continue
+        code = record.get("status") or 0
+        response = record.get("response")
+        if not isinstance(response, dict):
+            response = {}
+        if code < 400 and "next_state" not in response:
+            continue  # media acknowledgements do not move the flow
+        request = record.get("request") or {}
+        bot_id = str(request.get("bot_id", ""))
+        chat_id = str(request.get("chat_id", ""))
+        answered = response.get("current_state") or UNMATCHED
+        waiting = response.get("next_state") or (UNMATCHED if code >= 400 else END_STATE)
+        ts(record.get("ts", 0.0))
+        latency(record.get("latency", 0.0))
+        status(code)
+        bot(bots.setdefault(bot_id, len(bots)))
+        chat(chats.setdefault(chat_id, len(chats)))
+        state(states.setdefault(answered, len(states)))
+        next_state(states.setdefault(waiting, len(states)))
+
+    return Turns(
+        {name: np.frombuffer(values, dtype=values.typecode) for name, values in columns.items()},
+        list(bots),
+        list(chats),
+        list(states),
+    )
+
+
+def load_turns(
+    paths: Union[str, Iterable[str]],
+    workers: int = 1,
+    chat_paths: Sequence[str] = CHAT_PATHS,
+) -> Turns:
+    """load_turns
+
+    Reads recorded chat turns from NDJSON logs into a columnar table
+
+    Args:
+        paths (Union[str, Iterable[str]]): Log file(s), gzip compressed ones end in .gz
+        workers (int, optional): Processes parsing files in parallel (one file each). Defaults to 1.
+        chat_paths (Sequence[str], optional): API paths counted as chat turns. Defaults to the chat endpoints.
+
+    Returns:
+        Turns: The turns of all logs
+    """
+    paths = [paths] if isinstance(paths, str) else list(paths)
+    if workers <= 1 or len(paths) <= 1:
+        return _parse(paths, chat_paths)
+    with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as pool:
+        parts = list(pool.map(_parse, paths, [chat_paths] * len(paths)))
+    return Turns.concat(parts)
+
+
+def _chat_order(turns: Turns) -> np.ndarray:
+    """Row order by bot, chat and time"""
+    n = len(turns)
+    if len(turns.bots) * len(turns.chats) * n >= 1 << 62:
+        return np.lexsort((turns.ts, turns.chat, turns.bot))
+    # one int64 key sorts much faster than lexsort over three columns
+    by_time = None if np.all(turns.ts[1:] >= turns.ts[:-1]) else np.argsort(turns.ts, kind="stable")
+    chat = turns.bot.astype(np.int64) * len(turns.chats) + turns.chat
+    if by_time is None:
+        return np.argsort(chat * n + np.arange(n))
+    return by_time[np.argsort(chat[by_time] * n + np.arange(n))]
+
+
+class _Sessions(object):
+    """Successful turns ordered by bot, chat and time, with session boundaries"""
+
+    def __init__(self, turns: Turns, session_timeout: float) -> None:
+        order = _chat_order(turns)
+        order = order[turns.status[order] < 400]  # failed requests did not move the flow
+        self.ts = turns.ts[order]
+        self.state = turns.state[order]
+        self.next_state = turns.next_state[order]
+        bot, chat = turns.bot[order], turns.chat[order]
+        end = turns.state_code(END_STATE)
+
+        # first turn of a chat, or the flow had ended: the message matched an intent
+        self.fresh = np.ones(len(order), dtype=bool)
+        self.fresh[1:] = (bot[1:] != bot[:-1]) | (chat[1:] != chat[:-1])
+        if end >= 0:
+            self.fresh[1:] |= self.next_state[:-1] == end
+        self.first = self.fresh.copy()
+        self.first[1:] |= np.diff(self.ts) > session_timeout
+        self.last = np.ones(len(order), dtype=bool)
+        self.last[:-1] = self.first[1:]
+        self.id = np.cumsum(self.first) - 1
+        self.count = int(self.id[-1]) + 1 if len(order) else 0
+        self.end = end
+
+
+def _rank_select(
+    values: np.ndarray, by_value: np.ndarray, groups: np.ndarray, n_groups: int, pcts: Sequence[float]
+) -> Dict[str, np.ndarray]:
+    """Nearest-rank percentiles of values per group code, like `stats.percentile`
+
+    `by_value` is the order sorting the values, a stable sort of the group
+    codes on top of it orders by group then value. Small codes are sorted
+    as int16, which numpy radix sorts.
+    """
+    if n_groups > 1:
+        codes = groups[by_value]
+        if n_groups < 1 << 15:
+            codes = codes.astype(np.int16)
+        by_value = by_value[np.argsort(codes, kind="stable")]
+    ordered = values[by_value]
+    counts = np.bincount(groups, minlength=n_groups)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    result = {}
+    for pct in pcts:
+        rank = starts + np.rint(pct / 100.0 * np.maximum(counts - 1, 0)).astype(np.int64)
+        picked = ordered[np.minimum(rank, max(len(ordered) - 1, 0))] if len(ordered) else rank * 0.0
+        result[f"p{pct:g}"] = np.where(counts > 0, picked, 0.0)
+    result["count"] = counts
+    return result
+
+
+def latency_percentiles(
+    turns: Turns, by: Optional[str] = None, pcts: Sequence[float] = (50, 95, 99)
+) -> Dict[str, Dict[str, float]]:
+    """latency_percentiles
+
+    Latency percentiles in seconds, over all turns or per bot/state
+
+    Args:
+        turns (Turns): Recorded turns
+        by (str, optional): "bot" or "state" (the state a turn was answered from),
+            None for all turns together. Defaults to None.
+        pcts (Sequence[float], optional): Percentiles to compute. Defaults to (50, 95, 99).
+
+    Returns:
+        Dict[str, Dict[str, float]]: count and percentiles per group ("all" without `by`)
+    """
+    latency = turns.latency.astype("f8")
+    if by is None:
+        groups, names = np.zeros(len(turns), dtype="i4"), ["all"]
+    elif by in ("bot", "state"):
+        groups, names = getattr(turns, by), turns.bots if by == "bot" else turns.states
+    else:
+        raise ValueError(f"cannot group latency by {by}")
+    picked = _rank_select(latency, turns._latency_order(), groups, len(names), pcts)
+    counts = picked.pop("count")
+    result = {}
+    for code, name in enumerate(names):
+        if counts[code]:
+            entry: Dict[str, float] = {"count": int(counts[code])}
+            entry.update((key, round(float(values[code]), 6)) for key, values in picked.items())
+            result[name] = entry
+    return result
+
+
+def intent_frequency(turns: Turns, session_timeout: float = SESSION_TIMEOUT) -> Dict[str, int]:
+    """Sessions started per intent (most frequent first), UNMATCHED counts fallback replies"""
+    sessions = turns._sessions(session_timeout)
+    counts = np.bincount(sessions.state[sessions.fresh], minlength=len(turns.states))
+    order = np.argsort(-counts, kind="stable")
+    return {turns.states[code]: int(counts[code]) for code in order if counts[code]}
+
+
+def transitions(turns: Turns, session_timeout: float = SESSION_TIMEOUT) -> List[Dict[str, Any]]:
+    """Transition counts between the states consecutive turns of a session were answered from
+
+    Session starts come from `START`. Sorted by count, most frequent first.
+    """
+    sessions = turns._sessions(session_timeout)
+    size = len(turns.states) + 1
+    source = np.zeros(len(sessions.state), dtype=np.int64)
+    source[1:] = sessions.state[:-1].astype(np.int64) + 1
+    source[sessions.first] = 0  # START
+    pairs = source * size + sessions.state + 1
+    if size * size <= max(1 << 22, 4 * len(pairs)):
+        counts = np.bincount(pairs, minlength=size * size)
+        keys = np.flatnonzero(counts)
+        counts = counts[keys]
+    else:
+        keys, counts = np.unique(pairs, return_counts=True)
+    order = np.argsort(-counts, kind="stable")
+    names = [START] + turns.states
+    return [
+        {
+            "from": names[int(keys[index]) // size],
+            "to": names[int(keys[index]) % size],
+            "count": int(counts[index]),
+        }
+        for index in order
+    ]
+
+
+def drop_off(turns: Turns, session_timeout: float = SESSION_TIMEOUT) -> List[Dict[str, Any]]:
+    """drop_off
+
+    Per state count of sessions left waiting in it for good. A state is
+    entered each time a reply leaves a chat waiting in it, a session is
+    dropped there when it ended (idle for `session_timeout`) before the
+    flow reached `end`. Sessions still active at the end of the log are not
+    counted as dropped.
+
+    Args:
+        turns (Turns): Recorded turns
+        session_timeout (float, optional): Idle seconds ending a session. Defaults to 30 minutes.
+
+    Returns:
+        List[Dict[str, Any]]: state, entered, dropped and rate, most dropped first
+    """
+    if not len(turns):
+        return []
+    sessions = turns._sessions(session_timeout)
+    waiting = sessions.next_state != sessions.end
+    finished = sessions.ts <= sessions.ts.max() - session_timeout
+    dropped = np.bincount(
+        sessions.next_state[sessions.last & waiting & finished], minlength=len(turns.states)
+    )
+    entered = np.bincount(sessions.next_state[waiting], minlength=len(turns.states))
+    order = np.lexsort((-entered, -dropped))
+    return [
+        {
+            "state": turns.states[code],
+            "entered": int(entered[code]),
+            "dropped": int(dropped[code]),
+            "rate": round(float(dropped[code]) / float(entered[code]), 4),
+        }
+        for code in order
+        if entered[code]
+    ]
+
+
+def funnel(
+    turns: Turns, steps: Sequence[str], session_timeout: float = SESSION_TIMEOUT
+) -> List[Dict[str, Any]]:
+    """funnel
+
+    Sessions reaching each step of an ordered path of states, a step counts
+    once the session is answered from it after every previous step
+
+    Args:
+        turns (Turns): Recorded turns
+        steps (Sequence[str]): State names in funnel order
+        session_timeout (float, optional): Idle seconds ending a session. Defaults to 30 minutes.
+
+    Returns:
+        List[Dict[str, Any]]: state, sessions reaching it and conversion from the previous step
+    """
+    sessions = turns._sessions(session_timeout)
+    position = np.arange(len(sessions.state))
+    never = len(position)
+    reached = np.full(sessions.count, -1, dtype=np.int64)  # position of the last step reached
+    result, previous = [], None
+    for step in steps:
+        code = turns.state_code(step)
+        mask = sessions.state == code
+        if previous is not None:
+            mask &= position > reached[sessions.id]
+        ids = sessions.id[mask]
+        first = np.ones(len(ids), dtype=bool)  # ids ascend, the first row of each is its earliest
+        first[1:] = ids[1:] != ids[:-1]
+        reached = np.full(sessions.count, never, dtype=np.int64)
+        reached[ids[first]] = position[mask][first]
+        count = int(np.count_nonzero(first))
+        result.append(
+            {
+                "state": step,
+                "sessions": count,
+                "conversion": round(count / previous, 4) if previous else (1.0 if count else 0.0),
+            }
+        )
+        previous = count
+    return result
+
+
+def analyze(
+    turns: Turns,
+    funnels: Iterable[Sequence[str]] = (),
+    top: int = 20,
+    session_timeout: float = SESSION_TIMEOUT,
+    pcts: Sequence[float] = (50, 95, 99),
+) -> Dict[str, Any]:
+    """analyze
+
+    Compact report of recorded traffic: volumes, latency percentiles overall
+    and per state/bot, intent frequency, drop-off, top transitions and funnels
+
+    Args:
+        turns (Turns): Recorded turns
+        funnels (Iterable[Sequence[str]], optional): Ordered state paths to report funnels for. Defaults to ().
+        top (int, optional): Entries kept in ranked sections. Defaults to 20.
+        session_timeout (float, optional): Idle seconds ending a session. Defaults to 30 minutes.
+        pcts (Sequence[float], optional): Latency percentiles. Defaults to (50, 95, 99).
+
+    Returns:
+        Dict[str, Any]: JSON serializable report
+    """
+    sessions = turns._sessions(session_timeout)
+    by_state = latency_percentiles(turns, by="state", pcts=pcts)
+    slowest = sorted(by_state.items(), key=lambda item: -item[1][f"p{pcts[-1]:g}"])
+    intents = intent_frequency(turns, session_timeout)
+    matched = sum(count for intent, count in intents.items() if intent != UNMATCHED)
+    report = {
+        "turns": len(turns),
+        "sessions": sessions.count,
+        "chats": int(np.count_nonzero(np.bincount(turns.chat, minlength=len(turns.chats)))),
+        "bots": len(turns.bots),
+        "span": [float(turns.ts.min()), float(turns.ts.max())] if len(turns) else None,
+        "errors": int(np.count_nonzero(turns.status >= 400)),
+        "latency": latency_percentiles(turns, pcts=pcts).get("all", {}),
+        "latency_by_state": dict(slowest[:top]),
+        "latency_by_bot": latency_percentiles(turns, by="bot", pcts=pcts),
+        "intents": dict(list(intents.items())[:top]),
+        "unmatched_rate": round(
+            intents.get(UNMATCHED, 0) / max(matched + intents.get(UNMATCHED, 0), 1), 4
+        ),
+        "drop_off": drop_off(turns, session_timeout)[:top],
+        "transitions": transitions(turns, session_timeout)[:top],
+        "funnels": {
+            " > ".join(steps): funnel(turns, steps, session_timeout) for steps in funnels
+        },
+    }
+    return report
+
+
+def write_report(report: Dict[str, Any], path: str) -> None:
+    """Writes a report as compact JSON, gzip compressed when the path ends in .gz"""
+    data = json.dumps(report, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "wb") as stream:
+        stream.write(data)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m sarufi.analytics",
+        description="Conversation analytics over logs written by sarufi.Recorder",
+    )
+    parser.add_argument("logs", nargs="+", help="NDJSON logs (or one .npz table), oldest first")
+    parser.add_argument("--funnel", action="append", default=[], help="comma separated states")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--session-timeout", type=float, default=SESSION_TIMEOUT)
+    parser.add_argument("--bot-id", help="only turns of this bot")
+    parser.add_argument("--workers", type=int, default=1, help="processes parsing logs")
+    parser.add_argument("--save-turns", help="cache the parsed turns to this .npz file")
+    parser.add_argument("-o", "--output", help="report file, printed when left out")
+    args = parser.parse_args(argv)
+
+    if len(args.logs) == 1 and args.logs[0].endswith(".npz"):
+        turns = Turns.load(args.logs[0])
+    else:
+        turns = load_turns(args.logs, workers=args.workers)
+    if args.save_turns:
+        turns.save(args.save_turns)
+    if args.bot_id:
+        turns = turns.for_bot(args.bot_id)
+    report = analyze(
+        turns,
+        funnels=[steps.split(",") for steps in args.funnel],
+        top=args.top,
+        session_timeout=args.session_timeout,
+    )
+    if args.output:
+        write_report(report, args.output)
+    else:
+        json.dump(report, sys.stdout, indent=2, ensure_ascii=False)
+        sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+"""Streaming export and import of whole accounts
+
+`export_bots` writes every bot's full definition (metadata, intents and
+flows) to an NDJSON file, one bot per line. The definitions come from the
+`chatbots` listing, which is streamed and decoded one bot at a time and
+each bot written as it is decoded, so a bot is downloaded once and only a
+bounded number of bots is held in memory, whatever the account size. Bots the listing does
+not fully describe are downloaded on their own. `import_bots` streams an
+export file back through create or update with bounded concurrency.
+Paths ending in `.gz` are gzip compressed.
+
+Examples:
+
+>>> from sarufi import Sarufi
+>>> source = Sarufi(api_key="OLD_ACCOUNT_KEY")
+>>> source.export_bots("backup.ndjson.gz")
+>>> target = Sarufi(api_key="NEW_ACCOUNT_KEY")
+>>> results = target.import_bots("backup.ndjson.gz", checkpoint="import.ndjson")
+"""
+from __future__ import annotations
+import gzip
+import json
+import codecs
+import logging
+import threading
+from pathlib import Path
+from contextlib import closing
+from itertools import chain
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, List, Union
+
+from .bulk import BulkResult, run_bulk
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+# bot document field -> create_bot / update_bot keyword
+_FIELDS = {
+    "name": "name",
+    "description": "description",
+    "industry": "industry",
+    "intents": "intents",
+    "flows": "flow",
+    "webhook_url": "webhook_url",
+    "webhook_trigger_intents": "webhook_trigger_intents",
+    "visible_on_community": "visible_on_community",
+}
+# fields a listed bot needs to be exported without downloading it on its own
+_COMPLETE = ("id", "name", "intents", "flows")
+
+
+def _open(path: Union[Path, str], mode: str) -> IO[str]:
+    if str(path).endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def read_bots(path: Union[Path, str]) -> Iterator[Dict[str, Any]]:
+    """Streams bot documents from an export file"""
+    with _open(path, "r") as stream:
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_json_array(chunks: Iterable[bytes]) -> Iterator[Any]:
+    """iter_json_array
+
+    Decodes the elements of a JSON array from chunks of UTF-8 bytes, one element at a time
+
+    Args:
+        chunks (Iterable[bytes]): The encoded array, split anywhere
+
+    Raises:
+        ValueError: If the chunks are not one JSON array
+
+    Returns:
+        Iterator[Any]: The elements, each yielded as soon as it is complete
+    """
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    opened = False
+    for chunk in chain(chunks, [None]):
+        final = chunk is None
+        buffer += text.decode(b"" if final else chunk, final)
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if position == len(buffer):
+                break
+            if not opened:
+                if buffer[position] != "[":
+                    raise ValueError("expected a JSON array")
+                opened = True
+                position += 1
+                continue
+            if buffer[position] == "]":
+                return
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                break  # the element continues in the next chunk
+            if (
+                not final
+                and not isinstance(value, (dict, list, str))
+                and (end == len(buffer) or buffer[end] not in " \t\r\n,]")
+            ):
+                break  # a number cut at the chunk end (1 of 1.5) continues in the next one
+            yield value
+            position = end
+        buffer = buffer[position:]
+    raise ValueError("invalid or truncated JSON array")
+
+
+def _chunks(response: Any) -> Iterator[bytes]:
+    """Body chunks of a streamed response, from requests or httpx"""
+    if hasattr(response, "iter_content"):
+        return response.iter_content(CHUNK_SIZE)
+    return response.iter_bytes(CHUNK_SIZE)
+
+
+def export_bots(
+    client,
+    path: Union[Path, str],
+    max_workers: int = 4,
+    progress: Callable = None,
+) -> List[BulkResult]:
+    """export_bots
+
+    Writes every bot of the account to an NDJSON line as it is decoded from the bot listing
+
+    Args:
+        client (Sarufi): Client of the account to export
+        path (Union[Path, str]): Output file, gzip compressed when it ends in .gz
+        max_workers (int, optional): Concurrent downloads of bots the listing does not
+            fully describe. Defaults to 4.
+        progress (Callable, optional): Called with (finished, failed, result) after each bot. Defaults to None.
+
+    Raises:
+        RuntimeError: If the list of bots cannot be fetched
+        ValueError: If the list of bots is not a JSON array
+
+    Returns:
+        List[BulkResult]: Per bot result keyed by bot id
+    """
+    listing = client._get_req(url=client._BASE_URL + "chatbots", stream=True)
+    if listing.status_code != 200:
+        try:
+            raise RuntimeError(f"Could not list bots: {listing.json()}")
+        finally:
+            listing.close()
+    logger.info(f"Exporting bots to {path}")
+
+    lock = threading.Lock()
+    with closing(listing), _open(path, "w") as stream:
+
+        def export(bot: Dict[str, Any]):
+            if not all(field in bot for field in _COMPLETE):
+                response = client._download_bot(bot["id"])
+                if response.status_code != 200:
+                    return False, response.json()
+                bot = response.json()
+            else:
+                client._cached(bot)
+            line = json.dumps(bot, ensure_ascii=False) + "\n"
+            with lock:
+                stream.write(line)
+            return True, bot["id"]
+
+        return run_bulk(
+            export,
+            iter_json_array(_chunks(listing)),
+            lambda bot: bot["id"],
+            max_workers=max_workers,
+            progress=progress,
+        )
+
+
+def import_bots(
+    client,
+    path: Union[Path, str],
+    update: bool = False,
+    max_workers: int = 4,
+    progress: Callable = None,
+    checkpoint: Union[Path, str] = None,
+) -> List[BulkResult]:
+    """import_bots
+
+    Streams an export file back through `create_bot` (or `update_bot`)
+
+    Args:
+        client (Sarufi): Client of the target account
+        path (Union[Path, str]): Export file, gzip compressed when it ends in .gz
+        update (bool, optional): Update the bots with the same ids instead of creating new ones. Defaults to False.
+        max_workers (int, optional): Concurrent uploads. Defaults to 4.
+        progress (Callable, optional): Called with (finished, failed, result) after each bot. Defaults to None.
+        checkpoint (Union[Path, str], optional): File recording progress to resume from. Defaults to None.
+
+    Returns:
+        List[BulkResult]: Per bot result keyed by the exported bot id, with the new bot id on success
+    """
+
+    def upload(document: Dict[str, Any]):
+        kwargs = {
+            keyword: document[field]
+            for field, keyword in _FIELDS.items()
+            if document.get(field) is not None
+        }
+        if update:
+            bot = client.update_bot(id=document["id"], **kwargs)
+        else:
+            bot = client.create_bot(**kwargs)
+        if isinstance(bot, dict):
+            return False, bot
+        return True, bot.id
+
+    return run_bulk(
+        upload,
+        read_bots(path),
+        lambda document: document.get("id"),
+        max_workers=max_workers,
+        progress=progress,
+        checkpoint=checkpoint and str(checkpoint),
+        checkpoint_extra=lambda result: {"id": result.value} if result.ok else {},
+    )
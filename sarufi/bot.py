@@ -0,0 +1,630 @@
+"""Bot object returned by the `Sarufi` client
+
+A `Bot` can be shared by many threads. Its data is held in an immutable
+snapshot that updates replace atomically instead of modifying, so readers
+never lock and never see half applied updates. Updates are pushed to the
+API in order by a per bot worker thread, either waited for or in the
+background with a `Future`. An update the API rejects is rolled back to
+the last snapshot the API confirmed (unless newer updates are queued
+behind it) and kept in `Bot.update_error`.
+"""
+from __future__ import annotations
+import logging
+import threading
+from uuid import uuid4
+from contextvars import Context, copy_context
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Deque, Dict, Any, List, Tuple, Union
+
+from .client import Sarufi
+
+logger = logging.getLogger(__name__)
+
+# update_bot keyword -> bot data field
+_FIELDS = {"flow": "flows"}
+
+# pushes updates of every bot, each bot's updates still run one at a time in order
+_update_pool = None
+_update_pool_lock = threading.Lock()
+
+
+def _updates() -> ThreadPoolExecutor:
+    global _update_pool
+    if _update_pool is None:
+        with _update_pool_lock:
+            if _update_pool is None:
+                _update_pool = ThreadPoolExecutor(
+                    max_workers=8, thread_name_prefix="sarufi-bot-update"
+                )
+    return _update_pool
+
+
+class FrozenDict(dict):
+    """Read only dict holding a bot snapshot, still serializes as JSON"""
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError(
+            "bot data is a read only snapshot, use the Bot setters or Bot.update"
+        )
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        return FrozenDict, (dict(self),)
+
+
+def freeze(value: Any) -> Any:
+    """Read only deep copy of JSON data: dicts become FrozenDicts and lists tuples"""
+    if isinstance(value, FrozenDict):
+        return value
+    if isinstance(value, dict):
+        return FrozenDict((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+class Bot(Sarufi):
+    """
+    BOT OBJECT
+
+    has `Helper` functions to access bot data in easy way
+
+    Examples:
+
+    >>> from sarufi import Sarufi
+    >>> sarufi = Sarufi(api_key='Your API KEY')
+    >>> bot = sarufi.get_bot(4)
+
+    ### Get bot name
+    >>> bot.name
+    'iBank'
+
+    ### Get bot description
+    >>> bot.description
+    'I simulate a bank chatbot'
+
+    ### Get bot industry
+    >>> bot.industry
+
+    ### Get bot intents
+    >>> bot.intents
+
+    ### Get bot flow
+    >>> bot.flow
+
+    ### Get bot id
+    >>> bot.id
+    32
+
+    ## You can also get bot data as a dict
+
+    >>> bot.data
+    {...}
+
+    You can also quickly update bot data from name to intents and flows
+
+    ### Update bot name
+    >>> bot.name = 'New name'
+
+    ### Update bot description
+    >>> bot.description = 'New description'
+
+    ### Update in the background
+    >>> future = bot.update(name='New name', description='New description', background=True)
+    >>> future.result()
+    Bot(id=32, name=New name)
+
+    `bot.data` (and `bot.intents`, `bot.flow`) are read only snapshots,
+    updates replace them rather than modifying them. Set
+    `background_updates = True` to make the setters return without waiting
+    for the API. A rejected update is rolled back and its error (the API's
+    error dict or the exception) kept in `update_error` until an update succeeds.
+    """
+
+    background_updates: bool = False
+
+    def __init__(self, data: Dict, api_key=None, **kwargs):
+        super().__init__(api_key=api_key, **kwargs)
+        self._write_lock = threading.Lock()
+        self._version = 0
+        self._pending: Deque[Tuple[int, Dict[str, Any], Future, Context]] = deque()
+        self._draining = False
+        self._last_update = None
+        self._data = freeze(data)
+        self._confirmed = self._data  # last snapshot known to match the API
+        self.update_error: Any = None
+        self._predictor = None
+        self.chat_id = str(uuid4())
+
+    @property
+    def data(self) -> FrozenDict:
+        """Current snapshot of the bot data, read only"""
+        return self._data
+
+    @data.setter
+    def data(self, data: Dict) -> None:
+        with self._write_lock:
+            self._data = self._confirmed = freeze(data)
+            self._version += 1
+
+    def _modify(
+        self, changes_for: Callable[[FrozenDict], Dict[str, Any]], background: bool
+    ) -> Union[Future, type[Bot], Dict[Any, Any]]:
+        """Publishes a new snapshot and queues pushing the changes to the API
+
+        `changes_for` gets the current snapshot and returns `update_bot`
+        keyword arguments. It runs under the write lock, so read-modify-write
+        updates such as `add_intent` never lose a concurrent update.
+        """
+        with self._write_lock:
+            changes = {
+                key: freeze(value) for key, value in changes_for(self._data).items()
+            }
+            fields = {_FIELDS.get(key, key): value for key, value in changes.items()}
+            self._data = FrozenDict(self._data, **fields)
+            self._version += 1
+            future = Future()
+            # pushed in the caller's context, e.g a scheduler priority it set
+            self._pending.append((self._version, changes, future, copy_context()))
+            self._last_update = future
+            start_drain = not self._draining
+            self._draining = True
+        if start_drain:
+            _updates().submit(self._drain)
+        if background:
+            return future
+        return future.result()
+
+    def _drain(self) -> None:
+        """Pushes queued updates one at a time, in the order they were made"""
+        while True:
+            with self._write_lock:
+                if not self._pending:
+                    self._draining = False
+                    return
+                version, changes, future, context = self._pending.popleft()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(context.run(self._push, version, changes))
+            except BaseException as error:
+                future.set_exception(error)
+
+    def _push(
+        self, version: int, changes: Dict[str, Any]
+    ) -> Union[type[Bot], Dict[Any, Any]]:
+        try:
+            result = self.update_bot(self.id, **changes)
+        except BaseException as error:
+            self._rejected(version, error)
+            raise
+        if not isinstance(result, Bot):
+            self._rejected(version, result)
+            return result
+        logger.info(result)
+        with self._write_lock:
+            self._confirmed = result.data
+            self.update_error = None
+            # a newer local update is queued behind this one and brings the final state
+            if self._version == version:
+                self._data = result.data
+        return result
+
+    def _rejected(self, version: int, error: Any) -> None:
+        """Rolls a failed update back unless a newer one was made since, that one settles the state"""
+        logger.error(f"Update of bot {self.id} failed: {error}")
+        with self._write_lock:
+            self.update_error = error
+            if self._version == version:
+                self._data = self._confirmed
+                self._version += 1
+
+    def update(
+        self, background: bool = False, **changes
+    ) -> Union[Future, type[Bot], Dict[Any, Any]]:
+        """update
+
+        Updates several bot fields at once, see `update_bot` for the fields
+
+        Args:
+            background (bool, optional): Return a Future instead of waiting for the API. Defaults to False.
+            **changes: `update_bot` keyword arguments (name, description, intents, flow, ...)
+
+        Returns:
+            Union[Future, Bot, Dict]: The updated Bot or error dict, or a Future of it when `background`
+
+        Examples:
+
+        >>> future = bot.update(intents=intents, flow=flow, background=True)
+        >>> future.add_done_callback(lambda done: print(done.result()))
+        """
+        return self._modify(lambda data: changes, background)
+
+    def wait_for_updates(self, timeout: float = None) -> None:
+        """Waits until every queued update has been pushed to the API"""
+        future = self._last_update
+        if future is not None:
+            future.result(timeout)
+
+    # Getter only
+    @property
+    def id(self):
+        return self.data.get("id")
+
+    @property
+    def evaluation_metrics(self) -> Dict:
+        """
+        Returns the evaluation metrics of bot
+
+        Returns(Dict): Evaluation Metrics of a bot
+
+        Examples:
+
+        >>> from sarufi import Sarufi
+        >>> sarufi = Sarufi(api_key='Your API KEY')
+        >>> mybot = sarufi.get_bot(bot_id)
+        >>> mybot.evaluation_metrics
+        ... None
+        """
+        return self.data.get("evaluation_metrics")
+
+    # Getter and setters
+
+    # Name attribute
+    @property
+    def name(self):
+        return self.data.get("name")
+
+    @name.setter
+    def name(self, name: str):
+        if isinstance(name, str):
+            self.update(name=name, background=self.background_updates)
+        else:
+            raise TypeError("name must be a string")
+
+    # Industry attribute
+    @property
+    def industry(self):
+        return self.data.get("industry")
+
+    @industry.setter
+    def industry(self, industry: str):
+        if isinstance(industry, str):
+            self.update(industry=industry, background=self.background_updates)
+        else:
+            raise TypeError("industry must be a string")
+
+    # Description attribute
+    @property
+    def description(self):
+        return self.data.get("description")
+
+    @description.setter
+    def description(self, description: str):
+        if isinstance(description, str):
+            self.update(description=description, background=self.background_updates)
+        else:
+            raise TypeError("description must be a string")
+
+    # visible_on_community attribute
+    @property
+    def visible_on_community(self):
+        return self.data.get("visible_on_community")
+
+    @visible_on_community.setter
+    def visible_on_community(self, visible_on_community: bool):
+        if isinstance(visible_on_community, bool):
+            self.update(
+                visible_on_community=visible_on_community,
+                background=self.background_updates,
+            )
+        else:
+            raise TypeError("visible_on_community must be a boolean")
+
+    # intents attribute
+    @property
+    def intents(self):
+        return self.data.get("intents")
+
+    @intents.setter
+    def intents(self, intents: Dict):
+        if isinstance(intents, dict):
+            self.update(intents=intents, background=self.background_updates)
+        else:
+            raise TypeError("intents must be a Dictionary")
+
+    def add_intent(self, intents: Dict[str, List[str]], background: bool = False):
+        """add_intent
+
+        Appends an intent to the bot's intents
+
+        Args:
+            intents (Dict[str, List[str]]): The intents to add
+            background (bool, optional): Return a Future instead of waiting for the API. Defaults to False.
+
+        Raises:
+            TypeError: If intent is not a dictionary
+
+        Examples:
+
+        >>> from sarufi import Sarufi
+        >>> sarufi = Sarufi(api_key='Your API KEY')
+        >>> chatbot = sarufi.get_bot(1)
+        >>> chatbot.add_intent({'greeting': ['hello', 'hi']})
+        """
+        if isinstance(intents, dict):
+            result = self._modify(
+                lambda data: {"intents": {**(data.get("intents") or {}), **intents}},
+                background or self.background_updates,
+            )
+            logger.info(f'A new intents "{list(intents.keys())}" has been added')
+            return result
+        else:
+            raise TypeError("intent must be a dictionary {intent_name: [utterances]}")
+
+    # flow attribute
+    @property
+    def flow(self):
+        return self.data.get("flows")
+
+    @flow.setter
+    def flow(self, flow: Dict):
+        if isinstance(flow, dict):
+            self.update(flow=flow, background=self.background_updates)
+        else:
+            raise TypeError("flow must be a Dictionary")
+
+    def add_flow(self, flow: Dict[str, Any], background: bool = False):
+        """add_flow
+
+        Appends a flow to the bot's flows
+
+        Args:
+            flow (Dict[str, Any]): The flow to add
+            background (bool, optional): Return a Future instead of waiting for the API. Defaults to False.
+
+        Raises:
+            TypeError: If flow is not a dictionary
+
+        Examples:
+
+        >>> from sarufi import Sarufi
+        >>> sarufi = Sarufi(api_key='Your API KEY')
+        >>> sarufi.get_bot(1)
+        >>> chatbot.add_flow({'greeting': {'message': ['hello'], 'next_state': 'greeting'}})
+        """
+        if isinstance(flow, dict):
+            result = self._modify(
+                lambda data: {"flow": {**(data.get("flows") or {}), **flow}},
+                background or self.background_updates,
+            )
+            logger.info(f'A new flow "{list(flow.keys())}" has been added')
+            return result
+        else:
+            raise TypeError("flow must be a dictionary {flow_name: flow_data}")
+
+    # webhooh_url attribute
+    @property
+    def webhook_url(self) -> str:
+        """
+        Returns the Webhook to be triggered by the chatbot
+
+        Returns(str): The Webhook of a chatbot
+
+        Examples:
+
+        >>> from sarufi import Sarufi
+        >>> sarufi = Sarufi(api_key='Your API KEY')
+        >>> mybot = sarufi.get_bot(bot_id)
+        >>> mybot.webhook_url
+        ... https://www.xyz.com/hook
+        """
+        return self.data.get("webhook_url")
+
+    @webhook_url.setter
+    def webhook_url(self, url: str) -> str:
+        """Set up a new webhook URL for the chatbot
+
+        Args:
+            url (str): The new webhook URL (eg. https://www.xyx.com/hook)
+
+        Returns:
+            str: The updated Webhook URL for the chatbot
+
+        >>> from sarufi import Sarufi
+        >>> sarufi = Sarufi(api_key='Your API KEY')
+        >>> mybot = sarufi.get_bot(bot_id)
+        >>> mybot.webhook_url = "https://www.xyx.com/hook"
+        ...https://www.xyz.com/hook"
+        """
+        if isinstance(url, str):
+            self.update(webhook_url=url, background=self.background_updates)
+        else:
+            raise TypeError("webhook_url must be a string")
+
+    # webhook_trigger_intents attribute
+    @property
+    def webhook_trigger_intents(self) -> List[str]:
+        """
+        Returns Intents that trigger the webhook
+
+        Returns(List[str]): List of intents that trigger the webhook
+
+        Examples:
+        >>> from sarufi import Sarufi
+        >>> sarufi = Sarufi(api_key='Your API KEY')
+        >>> mybot = sarufi.get_bot(bot_id)
+        >>> mybot.webhook_trigger_intents
+        ... ['greeting']
+        """
+        return self.data.get("webhook_trigger_intent")
+
+    @webhook_trigger_intents.setter
+    def webhook_trigger_intents(self, intents: List[str]) -> List[str]:
+        if isinstance(intents, list):
+            self.update(
+                webhook_trigger_intents=intents, background=self.background_updates
+            )
+        else:
+            raise TypeError("intents Trigger must be a list of strings")
+
+    # Get response from a bot
+    def respond(
+        self,
+        message: str,
+        message_type: str = "text",
+        channel: str = "general",
+        chat_id: str = None,
+        timeout_budget: float = None,
+    ) -> Dict | None:
+        """respond to a message
+
+        Args:
+            message (str): The message to send
+            message_type (str, optional): The type of message. Defaults to "text".
+            channel (str, optional): The channel to send the message to. Defaults to "general".
+            chat_id (str, optional): The chat id to send the message to. Defaults to None.
+            timeout_budget (float, optional): Seconds the call may take, retries included. Defaults to None.
+
+        Returns:
+            Dict | None: The response from the bot
+
+        Examples:
+
+        >>> from sarufi import Sarufi
+        >>> sarufi = Sarufi(api_key='Your API KEY')
+        >>> chatbot = sarufi.get_bot(1)
+        >>> chatbot.respond('hello')
+        {'message': ['Hello, how can I help you?'], 'next_state': 'greeting'}
+        """
+        return self.chat(
+            bot_id=self.id,
+            chat_id=chat_id or self.chat_id,
+            message=message,
+            message_type=message_type,
+            channel=channel,
+            timeout_budget=timeout_budget,
+        )
+
+    def local_predictor(self):
+        """local_predictor
+
+        The local intent predictor of the bot's current intents, rebuilt only
+        when the intents change
+
+        Returns:
+            IntentPredictor: Predictor answering like `predict_intent`, see `sarufi.predictor`
+        """
+        from .predictor import IntentPredictor
+
+        intents = self.data.get("intents") or {}
+        predictor = self._predictor
+        if predictor is None or predictor.intents is not intents:
+            predictor = IntentPredictor(intents)
+            self._predictor = predictor
+        return predictor
+
+    def predict_intent(
+        self,
+        message: str,
+        local: bool = False,
+        threshold: float = None,
+    ) -> Dict[bool, str, float]:
+        """predict an intent of a message
+
+        Gets an intent prediction on the message provided. With `local` the
+        message is classified on the client first by `local_predictor()`, and
+        the API is only asked when the local confidence is below `threshold`.
+        When the API is then unreachable or failing, the local prediction is
+        returned instead.
+
+        Args:
+            message (str): the message you want to predict
+            local (bool, optional): Predict locally first. Defaults to False.
+            threshold (float, optional): Local confidence needed to skip the API. Defaults to 0.5.
+
+        Returns:
+            Dict[bool, str, float]: An object containing the intent, status and the confidence of prediction
+
+        Examples:
+
+        >>> from sarufi import Sarufi
+        >>> sarufi = Sarufi(api_key='Your API KEY')
+        >>> bot = sarufi.get_bot(id=5)
+        >>> print(bot.predict_intent("your message"))
+        {
+            intent: "an_intent",
+            status: true
+            confidence: 0.75,
+        }
+        >>> bot.predict_intent("your message", local=True, threshold=0.6)
+        """
+
+        url = self._BASE_URL + "predict/intent"
+        if not local:
+            response = self._post_req(url, {"bot_id": self.id, "message": message})
+            return response.json()
+
+        prediction = self.local_predictor().predict(message, threshold)
+        if prediction["status"]:
+            return prediction
+        try:
+            response = self._post_req(url, {"bot_id": self.id, "message": message})
+        except Exception as error:
+            if not (self._transport.retryable(error) or self._transport.timed_out(error)):
+                raise
+            logger.warning(f"predict/intent failed ({error!r}), using the local prediction")
+            return prediction
+        if response.status_code >= 500:
+            logger.warning(
+                f"predict/intent failed with {response.status_code}, using the local prediction"
+            )
+            return prediction
+        return response.json()
+
+    def chat_state(
+        self, chat_id: str, timeout_budget: float = None
+    ) -> Union[Dict, None]:
+        """chat_state
+
+        Returns the current state and the next state of the chat
+
+        Args:
+            chat_id (str): The chat id to get the state of
+            timeout_budget (float, optional): Seconds the call may take, retries included. Defaults to None.
+
+        Returns:
+            Union[Dict, None]: The state of the chat
+
+        Examples:
+            >>> from sarufi import Sarufi
+            >>> sarufi = Sarufi(api_key='Your API KEY')
+            >>> chatbot = sarufi.get_bot(1)
+            >>> chatbot.chat_state('chat_id')
+            >>> {'current_state': 'greeting', 'next_state': 'main_menu'}
+        """
+        return self.chat_status(
+            bot_id=self.id, chat_id=chat_id, timeout_budget=timeout_budget
+        )
+
+    def delete(self):
+        """
+        delete the bot with the given id
+
+        Examples:
+
+        >>> from sarufi import Sarufi
+        >>> sarufi = Sarufi(api_key='Your API KEY')
+        >>> chatbot = sarufi.get_bot(1)
+        >>> chatbot.delete()
+        """
+        return self.delete_bot(self.id)
+
+    def __str__(self) -> str:
+        return f"Bot(id={self.id}, name={self.name})"
+
+    def __repr__(self) -> str:
+        return self.__str__()
@@ -0,0 +1,172 @@
+"""Concurrent bulk operations with per item results and resumable progress
+
+`run_bulk` applies a function to many items on a bounded thread pool. It
+pulls items lazily from the input iterable, so only a bounded number are in
+memory at a time. It reports progress through a callback and returns a
+`BulkResult` per item. With a checkpoint file every finished item is
+appended to it as one NDJSON line, and items recorded as successful there
+are skipped on the next run, so a crashed job resumes where it stopped.
+
+The `Sarufi.bulk_create`, `bulk_update` and `bulk_delete` methods are built
+on it.
+"""
+from __future__ import annotations
+import os
+import json
+import time
+import logging
+import threading
+from contextvars import copy_context
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+OK = "ok"
+ERROR = "error"
+SKIPPED = "skipped"
+
+
+class BulkResult(NamedTuple):
+    """Outcome of one item
+
+    Attributes:
+        key (str): Item key (position in the input for creates, bot id otherwise)
+        status (str): "ok", "error" or "skipped" (already done according to the checkpoint)
+        value (Any): Bot id or response body on success
+        error (Any): Error body returned by the API or the exception raised
+    """
+
+    key: str
+    status: str
+    value: Any = None
+    error: Any = None
+
+    @property
+    def ok(self) -> bool:
+        return self.status != ERROR
+
+
+class Checkpoint(object):
+    """Append-only NDJSON record of finished items"""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self.done: Set[str] = set()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as stream:
+                for line in stream:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line after a crash
+                    if entry.get("status") == OK:
+                        self.done.add(str(entry["key"]))
+        self._stream = open(path, "a", encoding="utf-8")
+
+    def write(self, result: BulkResult, extra: Optional[dict] = None) -> None:
+        entry = {"key": result.key, "status": result.status}
+        entry.update(extra or {})
+        with self._lock:
+            self._stream.write(json.dumps(entry) + "\n")
+            self._stream.flush()
+
+    def close(self) -> None:
+        self._stream.close()
+
+
+class RateLimiter(object):
+    """Spaces calls shared by many threads to at most `rate` per second
+
+    Args:
+        rate (float): Calls per second, None or 0 does not limit
+    """
+
+    def __init__(self, rate: Optional[float]) -> None:
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        """Blocks until the caller may make its call"""
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(self._next, now)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def run_bulk(
+    func: Callable[[Any], Tuple[bool, Any]],
+    items: Iterable[Any],
+    key: Callable[[Any], Any],
+    max_workers: int = 8,
+    progress: Optional[Callable[[int, int, BulkResult], None]] = None,
+    checkpoint: Optional[str] = None,
+    checkpoint_extra: Optional[Callable[[BulkResult], dict]] = None,
+) -> List[BulkResult]:
+    """run_bulk
+
+    Runs `func` over items on a bounded thread pool
+
+    Args:
+        func (Callable[[Any], Tuple[bool, Any]]): Does one item, returns (succeeded, value or error body)
+        items (Iterable[Any]): Items, consumed lazily
+        key (Callable[[Any], Any]): Identifies an item in results and in the checkpoint
+        max_workers (int, optional): Concurrent calls. Defaults to 8.
+        progress (Callable[[int, int, BulkResult], None], optional): Called after each item
+            with (finished, failed, result). Defaults to None.
+        checkpoint (str, optional): NDJSON file to record progress in and resume from. Defaults to None.
+        checkpoint_extra (Callable[[BulkResult], dict], optional): Extra fields saved per item. Defaults to None.
+
+    Returns:
+        List[BulkResult]: One result per item in completion order
+    """
+    record = Checkpoint(checkpoint) if checkpoint else None
+    results: List[BulkResult] = []
+    failed = 0
+
+    def finish(result: BulkResult) -> None:
+        nonlocal failed
+        results.append(result)
+        if result.status == ERROR:
+            failed += 1
+        if record is not None and result.status != SKIPPED:
+            record.write(result, checkpoint_extra(result) if checkpoint_extra else None)
+        if progress is not None:
+            progress(len(results), failed, result)
+
+    def call(item: Any, item_key: str) -> BulkResult:
+        try:
+            succeeded, value = func(item)
+        except Exception as error:
+            logger.warning(f"Bulk item {item_key} failed: {error}")
+            return BulkResult(item_key, ERROR, error=error)
+        if succeeded:
+            return BulkResult(item_key, OK, value=value)
+        return BulkResult(item_key, ERROR, error=value)
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sarufi-bulk") as pool:
+            pending = set()
+            for item in items:
+                item_key = str(key(item))
+                if record is not None and item_key in record.done:
+                    finish(BulkResult(item_key, SKIPPED))
+                    continue
+                # in the caller's context, e.g a scheduler priority it set
+                pending.add(pool.submit(copy_context().run, call, item, item_key))
+                if len(pending) >= max_workers * 2:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        finish(future.result())
+            for future in wait(pending).done:
+                finish(future.result())
+    finally:
+        if record is not None:
+            record.close()
+    return results
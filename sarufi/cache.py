@@ -0,0 +1,198 @@
+"""Persistent on-disk cache of bot definitions
+
+Worker processes that call `get_bot` at startup can share a local SQLite
+cache instead of all downloading the same (large) bot documents. A cached
+bot is returned immediately and revalidated against the API in a background
+thread, so new workers start from disk and still converge on the latest
+version.
+
+Each entry is versioned by the bot's `updated_at` field when the API returns
+one, or by a hash of its content otherwise. The database runs in WAL mode
+and every process (and thread) opens its own connection, so prefork servers
+can share one file safely.
+
+Examples:
+
+>>> from sarufi import Sarufi
+>>> from sarufi.cache import BotCache
+>>> sarufi = Sarufi(api_key="YOUR_API_KEY", cache=BotCache("/var/cache/sarufi/bots.db"))
+>>> bot = sarufi.get_bot(5)  # served from disk when cached, refreshed in background
+"""
+from __future__ import annotations
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from contextvars import copy_context
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = os.path.join(os.path.expanduser("~"), ".cache", "sarufi", "bots.db")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS bots (
+    bot_id TEXT PRIMARY KEY,
+    version TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    data TEXT NOT NULL
+)
+"""
+
+
+def bot_version(data: Dict[str, Any]) -> str:
+    """Version of a bot document, its update timestamp or a content hash"""
+    for key in ("updated_at", "modified_at"):
+        if data.get(key) is not None:
+            return f"{key}:{data[key]}"
+    encoded = json.dumps(data, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return "sha256:" + hashlib.sha256(encoded).hexdigest()
+
+
+class BotCache(object):
+    """SQLite backed cache of bot documents keyed by bot id
+
+    Args:
+        path (str, optional): Database file. Defaults to ~/.cache/sarufi/bots.db.
+        revalidate_after (float, optional): Seconds an entry is trusted before a cache hit
+            triggers a background refresh. Defaults to 60.
+    """
+
+    def __init__(self, path: str = DEFAULT_PATH, revalidate_after: float = 60.0) -> None:
+        self.path = path
+        self.revalidate_after = revalidate_after
+        self._local = threading.local()
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._refreshing = set()
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connection() as connection:
+            connection.execute(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._pid != os.getpid():
+            # forked while a refresh ran: its thread is gone in the child and may have held the lock
+            self._pid = os.getpid()
+            self._lock = threading.Lock()
+            self._refreshing = set()
+        # a connection must never cross a fork, nor be shared between threads
+        connection = getattr(self._local, "connection", None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _row(self, bot_id: Any):
+        return (
+            self._connection()
+            .execute("SELECT data, fetched_at FROM bots WHERE bot_id = ?", (str(bot_id),))
+            .fetchone()
+        )
+
+    def get(self, bot_id: Any) -> Optional[Dict[str, Any]]:
+        """get
+
+        Args:
+            bot_id (Any): ID of the bot
+
+        Returns:
+            Optional[Dict[str, Any]]: The cached bot document, None on a miss
+        """
+        row = self._row(bot_id)
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, bot_id: Any, data: Dict[str, Any]) -> str:
+        """put
+
+        Stores (or refreshes) a bot document
+
+        Args:
+            bot_id (Any): ID of the bot
+            data (Dict[str, Any]): Bot document as returned by the API
+
+        Returns:
+            str: Version of the stored document
+        """
+        version = bot_version(data)
+        with self._connection() as connection:
+            connection.execute(
+                "INSERT INTO bots (bot_id, version, fetched_at, data) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(bot_id) DO UPDATE SET fetched_at = excluded.fetched_at, "
+                "version = excluded.version, "
+                "data = CASE WHEN bots.version = excluded.version THEN bots.data "
+                "ELSE excluded.data END",
+                (str(bot_id), version, time.time(), json.dumps(data)),
+            )
+        return version
+
+    def delete(self, bot_id: Any) -> None:
+        with self._connection() as connection:
+            connection.execute("DELETE FROM bots WHERE bot_id = ?", (str(bot_id),))
+
+    def clear(self) -> None:
+        with self._connection() as connection:
+            connection.execute("DELETE FROM bots")
+
+    def is_stale(self, bot_id: Any) -> bool:
+        row = self._row(bot_id)
+        return row is None or time.time() - row[1] >= self.revalidate_after
+
+    def revalidate(self, bot_id: Any, fetch: Callable[[Any], Any]) -> Optional[threading.Thread]:
+        """revalidate
+
+        Refreshes a stale entry in a background thread, at most one refresh
+        per bot is in flight in a process and fresh entries are left alone
+        (e.g when another worker just refreshed them)
+
+        Args:
+            bot_id (Any): ID of the bot
+            fetch (Callable[[Any], Any]): Downloads the bot and updates this cache
+
+        Returns:
+            Optional[threading.Thread]: The refresh thread, None when no refresh was needed
+        """
+        if not self.is_stale(bot_id):
+            return None
+        with self._lock:
+            if bot_id in self._refreshing:
+                return None
+            self._refreshing.add(bot_id)
+
+        def refresh():
+            try:
+                fetch(bot_id)
+                with self._lock:
+                    self.revalidations += 1
+            except Exception as error:
+                logger.warning(f"Could not revalidate cached bot {bot_id}: {error}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(bot_id)
+
+        thread = threading.Thread(
+            target=copy_context().run, args=(refresh,), name=f"sarufi-cache-{bot_id}", daemon=True
+        )
+        thread.start()
+        return thread
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidations": self.revalidations,
+        }
@@ -0,0 +1,177 @@
+"""Sampled capture of full request/response pairs for production debugging
+
+`Capture` plugs into the request layer of a client like `Recorder`, but
+keeps the last `size` request/response pairs in an in-memory ring buffer
+instead of writing a log. A sampled fraction of
+calls is captured, plus every call answered with an error status or
+failing with an exception. Calls that are not captured cost one random
+number. Captured pairs are redacted when they are captured: the
+`Authorization` header and the configured header and JSON body fields
+never reach the buffer. `dump` returns or writes the buffer on demand,
+`dump_on_signal` does it when the process gets a signal.
+
+Examples:
+
+>>> from sarufi import Sarufi
+>>> from sarufi.capture import Capture
+>>> capture = Capture(size=200, sample_rate=0.01, redact=("phone", "password"))
+>>> sarufi = Sarufi(api_key="YOUR_API_KEY", capture=capture)
+>>> capture.dump_on_signal("/tmp/sarufi-capture.ndjson")  # kill -USR1 <pid>
+>>> capture.dump()[-1]
+{'ts': 1720000000.1, 'method': 'POST', 'url': '.../conversation', 'status': 400, 'error': None, ...}
+"""
+from __future__ import annotations
+import json
+import time
+import random
+import signal
+import logging
+import threading
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+REDACTED = "[redacted]"
+MAX_BODY = 64 * 1024
+
+
+class Capture(object):
+    """Ring buffer of sampled and failed request/response pairs
+
+    Args:
+        size (int, optional): Pairs kept, the oldest are dropped. Defaults to 256.
+        sample_rate (float, optional): Fraction of successful calls captured. Defaults to 0.01.
+        errors (bool, optional): Always capture 4xx/5xx answers and exceptions. Defaults to True.
+        redact (Iterable[str], optional): JSON body fields (at any depth) whose values are
+            replaced, case insensitive. Defaults to ().
+        redact_headers (Iterable[str], optional): Headers whose values are replaced, besides
+            Authorization. Defaults to ().
+        max_body (int, optional): Characters of a response body kept. Defaults to 64 KiB.
+    """
+
+    def __init__(
+        self,
+        size: int = 256,
+        sample_rate: float = 0.01,
+        errors: bool = True,
+        redact: Iterable[str] = (),
+        redact_headers: Iterable[str] = (),
+        max_body: int = MAX_BODY,
+    ) -> None:
+        self.size = size
+        self.sample_rate = sample_rate
+        self.errors = errors
+        self.redact = frozenset(field.lower() for field in redact)
+        self.redact_headers = frozenset(
+            header.lower() for header in ("authorization", *redact_headers)
+        )
+        self.max_body = max_body
+        self.captured = 0
+        self._buffer: Deque[Dict[str, Any]] = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def wants(self, status: Optional[int]) -> bool:
+        """Cheap check deciding whether a call is captured, status None means it raised"""
+        if self.errors and (status is None or status >= 400):
+            return True
+        return random.random() < self.sample_rate
+
+    def record(
+        self,
+        method: str,
+        url: str,
+        headers: Optional[Dict[str, str]],
+        body: Any,
+        response: Any,
+        latency: float,
+        attempts: int = 1,
+        error: Optional[BaseException] = None,
+        streamed: bool = False,
+    ) -> None:
+        """Captures one call if it is sampled or failed, without the body of a streamed response"""
+        status = None if response is None else response.status_code
+        if not self.wants(status):
+            return
+        entry = {
+            "ts": round(time.time(), 6),
+            "method": method,
+            "url": url,
+            "request_headers": self._headers(headers),
+            "request": self._redact(body),
+            "status": status,
+            "latency": round(latency, 6),
+            "attempts": attempts,
+            "error": None if error is None else repr(error),
+        }
+        if response is not None:
+            entry["response_headers"] = self._headers(response.headers)
+            entry["response"] = "<stream>" if streamed else self._body(response)
+        with self._lock:
+            self._buffer.append(entry)
+            self.captured += 1
+
+    def _headers(self, headers: Optional[Dict[str, str]]) -> Dict[str, str]:
+        return {
+            name: REDACTED if name.lower() in self.redact_headers else value
+            for name, value in (headers or {}).items()
+        }
+
+    def _redact(self, value: Any) -> Any:
+        """Copy of a JSON value with the redacted fields replaced"""
+        if isinstance(value, dict):
+            return {
+                key: REDACTED if str(key).lower() in self.redact else self._redact(item)
+                for key, item in value.items()
+            }
+        if isinstance(value, (list, tuple)):
+            return [self._redact(item) for item in value]
+        return value
+
+    def _body(self, response: Any) -> Any:
+        try:
+            return self._redact(response.json())
+        except ValueError:
+            text = response.text
+            return text if len(text) <= self.max_body else text[: self.max_body] + "...[truncated]"
+
+    def dump(self, path: str = None) -> List[Dict[str, Any]]:
+        """dump
+
+        The captured pairs, oldest first
+
+        Args:
+            path (str, optional): Also write them to this NDJSON file. Defaults to None.
+
+        Returns:
+            List[Dict[str, Any]]: The captured pairs
+        """
+        with self._lock:
+            entries = list(self._buffer)
+        if path is not None:
+            with open(path, "w", encoding="utf-8") as stream:
+                for entry in entries:
+                    stream.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+            logger.info(f"Dumped {len(entries)} captured calls to {path}")
+        return entries
+
+    def dump_on_signal(self, path: str, signum: int = getattr(signal, "SIGUSR1", None)) -> None:
+        """Writes the buffer to `path` whenever the process gets `signum` (SIGUSR1 by default)
+
+        Must be called from the main thread.
+        """
+        if signum is None:
+            raise ValueError("this platform has no SIGUSR1, pass another signal")
+
+        def handler(_signum, _frame) -> None:
+            # the dump may take a moment, keep the interrupted thread going
+            threading.Thread(target=self.dump, args=(path,), daemon=True).start()
+
+        signal.signal(signum, handler)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._buffer.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"captured": self.captured, "buffered": len(self._buffer)}
@@ -0,0 +1,1384 @@
+"""Sarufi API client"""
+from __future__ import annotations
+import time
+import random
+import logging
+import threading
+from uuid import uuid4
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, Any, Iterable, List, Optional, Tuple, Union
+
+from .files import read_file
+from .deadline import Deadline, DeadlineExceeded
+from .transport import DEFAULT_TIMEOUT, Transport, strip_of_nones
+
+if TYPE_CHECKING:
+    from .bot import Bot
+    from .bulk import BulkResult
+    from .cache import BotCache
+    from .capture import Capture
+    from .coalescing import Coalescer
+    from .endpoints import Endpoints
+    from .hedging import Hedger
+    from .media import MediaSource
+    from .outbox import Outbox
+    from .recorder import Recorder
+    from .tenants import Tenant
+
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = (429, 502, 503)
+# 502/503 may come after the server acted on the request, only these are resent then
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+# seconds, doubled on every retry
+RETRY_BACKOFF = 0.1
+QUEUED = 202  # status of the receipt for a call queued in the outbox
+
+
+class Sarufi(object):
+    """Sarufi Class"""
+
+    _BASE_URL: str = "https://developers.sarufi.io/"
+
+    def __init__(
+        self,
+        api_key: str,
+        transport: Transport = None,
+        cache: BotCache = None,
+        recorder: Recorder = None,
+        tenant: Tenant = None,
+        hedger: Hedger = None,
+        retries: int = 0,
+        coalescer: Coalescer = None,
+        outbox: Outbox = None,
+        endpoints: Endpoints = None,
+        capture: Capture = None,
+    ) -> None:
+        """Initialize the Sarufi class with API Key
+
+
+        Args:
+            api_key (str): API Key for the Sarufi account
+            transport (Transport, optional): HTTP transport to share with other clients. Defaults to a new one.
+            cache (BotCache, optional): Persistent cache `get_bot` serves bots from. Defaults to None.
+            recorder (Recorder, optional): Records sampled chat traffic to a log. Defaults to None.
+            tenant (Tenant, optional): Concurrency limit and metrics of the account, see `ClientRegistry`. Defaults to None.
+            hedger (Hedger, optional): Hedges slow `get_bot` and `chat_status` calls. Defaults to None.
+            retries (int, optional): Retries of requests failing to connect or answered 429 (or
+                502/503 for idempotent methods), within the call's deadline if it has one. Defaults to 0.
+            coalescer (Coalescer, optional): Merges text messages a chat sends in quick
+                succession into one `chat` call. Defaults to None.
+            outbox (Outbox, optional): Queues `chat` and `update_conversation_state` calls on disk
+                while the API is unreachable and replays them later. Defaults to None.
+            endpoints (Endpoints, optional): Base URLs requests are routed over by latency and
+                health, failing over on connect errors. Defaults to None.
+            capture (Capture, optional): Keeps sampled and failed request/response pairs in
+                memory for debugging. Defaults to None.
+
+        Examples:
+
+        >>> sarufi = Sarufi(api_key="YOUR_API_KEY")
+        >>> dir(sarufi)
+                [
+                    "...",
+                    "bots",
+                    "chat",
+                    "create_bot",
+                    "create_from_file",
+                    "delete_bot",
+                    "_fetch_response",
+                    "get_bot",
+                    "headers",
+                    "token",
+                    "update_bot",
+                    "update_from_file",
+                ]
+        """
+        self.token = api_key
+        self._transport = transport or Transport()
+        self._cache = cache
+        self._recorder = recorder
+        self._tenant = tenant
+        self._hedger = hedger
+        self.retries = retries
+        self._coalescer = coalescer
+        self._outbox = outbox.bind(self) if outbox is not None else None
+        self._capture = capture
+        self._endpoints = endpoints
+        if endpoints is not None:
+            self._BASE_URL = endpoints.primary
+            endpoints.start(self._transport)
+        self._headers = None
+        self._headers_token = None
+
+    @staticmethod
+    def _read_file(_file: Union[Path, str]) -> Dict[Any, Any]:
+        """_read_file
+            Reads a file and returns the contents as a dict, see `sarufi.files.read_file`
+        """
+        return read_file(_file)
+
+    def _bot(self, data: Dict[str, Any]) -> Bot:
+        """Creates a Bot sharing this client's credentials, transport and settings"""
+        from .bot import Bot
+
+        bot = Bot(
+            data=data,
+            api_key=self.token,
+            transport=self._transport,
+            cache=self._cache,
+            recorder=self._recorder,
+            tenant=self._tenant,
+            hedger=self._hedger,
+            retries=self.retries,
+            coalescer=self._coalescer,
+            outbox=self._outbox,
+            endpoints=self._endpoints,
+            capture=self._capture,
+        )
+        bot._BASE_URL = self._BASE_URL
+        return bot
+
+    def _cached(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Stores a bot document in the persistent cache (if any) and returns it"""
+        if self._cache is not None and data.get("id") is not None:
+            self._cache.put(data["id"], data)
+        return data
+
+    @staticmethod
+    def _validate(intents: Dict[str, List[str]], flow: Dict[str, Any]) -> None:
+        """Validates intents and flow locally, raises FlowValidationError on errors"""
+        from .validation import FlowValidationError, validate_bot
+
+        report = validate_bot(intents, flow)
+        for warning in report.warnings:
+            logger.warning(str(warning))
+        if not report.ok:
+            raise FlowValidationError(report)
+
+    @staticmethod
+    def _dedupe(intents: Dict[str, List[str]]) -> Dict[str, List[str]]:
+        """Drops duplicate utterances and logs cross-intent conflicts, see `sarufi.utterances`"""
+        from .utterances import dedupe_intents
+
+        report = dedupe_intents(intents)
+        logger.info(report.summary())
+        for utterance, owners in report.conflicts.items():
+            logger.warning(f"Utterance '{utterance}' appears under intents {owners}")
+        for pair in report.cross_intent_near_duplicates:
+            logger.warning(
+                f"'{pair.utterance}' ({pair.intent}) is similar to "
+                f"'{pair.other_utterance}' ({pair.other_intent})"
+            )
+        return report.intents
+
+    @property
+    def headers(self):
+        """headers
+        Creates a header with the Bearer token using the token property,
+        built once per token rather than on every request
+        """
+        if self._headers_token != self.token:
+            self._headers = {
+                "Authorization": "Bearer " + self.token,
+                "Content-Type": "application/json",
+            }
+            self._headers_token = self.token
+        return self._headers
+
+    def _request(
+        self,
+        method: str,
+        url: str,
+        body: Dict[str, Any] = None,
+        _headers: Dict[str, str] = None,
+        data: Any = None,
+        deadline: Deadline = None,
+        stream: bool = False,
+    ):
+        """_request
+
+        Sends a request through the client transport, every request helper goes through here
+
+        Failed connects and 429 answers are retried up to `retries` times
+        with jittered exponential backoff, 502/503 answers only for
+        idempotent methods. Under a deadline every
+        attempt gets connect and read timeouts out of the remaining budget,
+        and no retry is started that the budget cannot cover.
+
+        Args:
+            method (str): HTTP method
+            url (str): URL to make the request to
+            body (Dict[str, Any], optional): JSON body, None values are removed. Defaults to None.
+            _headers (Dict[str, str], optional): Request headers. Defaults to None.
+            data (Any, optional): Already encoded body (e.g a streamed upload) sent instead of `body`,
+                such requests are neither retried nor recorded. Defaults to None.
+            deadline (Deadline, optional): Time budget of the whole call. Defaults to None.
+            stream (bool, optional): Leave the body unread, see `Transport.request`. Streamed
+                responses are neither recorded nor captured with their body. Defaults to False.
+
+        Raises:
+            DeadlineExceeded: If the deadline passes before a response arrives
+        """
+        body = None if body is None else strip_of_nones(body)
+        headers = _headers or self.headers
+        retries = 0 if data is not None else self.retries
+        started = time.perf_counter()
+        attempt = 0
+        try:
+            for attempt in range(retries + 1):
+                timeout = DEFAULT_TIMEOUT if deadline is None else deadline.timeouts(url)
+                try:
+                    response = self._send(
+                        method, url, headers, data, body, timeout, stream, deadline
+                    )
+                    failure = None
+                except Exception as error:
+                    retryable = self._transport.retryable(error)
+                    if (
+                        deadline is not None
+                        and self._transport.timed_out(error)
+                        # a connect timeout gets a third of the budget, retry it while budget is left
+                        and (not retryable or deadline.expired)
+                    ):
+                        raise DeadlineExceeded(
+                            f"{method} {url} exceeded its {deadline.budget:g}s budget"
+                        ) from error
+                    if attempt == retries or not retryable:
+                        raise
+                    failure = error
+                    logger.debug(f"Retrying {method} {url} after {error!r}")
+                else:
+                    if attempt == retries or not self._retry_status(method, response.status_code):
+                        break
+                    logger.debug(f"Retrying {method} {url} after {response.status_code}")
+                    if stream:
+                        response.close()
+                backoff = random.uniform(0, RETRY_BACKOFF * 2**attempt)
+                if deadline is not None and deadline.remaining() <= backoff:
+                    if failure is None:
+                        break  # no budget left to retry, hand back the last answer
+                    raise DeadlineExceeded(
+                        f"{method} {url} has no budget left to retry"
+                    ) from failure
+                time.sleep(backoff)
+        except Exception as error:
+            if self._capture is not None:
+                self._capture.record(
+                    method,
+                    url,
+                    headers,
+                    body if data is None else "<stream>",
+                    None,
+                    time.perf_counter() - started,
+                    attempts=attempt + 1,
+                    error=error,
+                )
+            raise
+
+        if self._capture is not None:
+            self._capture.record(
+                method,
+                url,
+                headers,
+                body if data is None else "<stream>",
+                response,
+                time.perf_counter() - started,
+                attempts=attempt + 1,
+                streamed=stream,
+            )
+        if self._recorder is not None and data is None and not stream:
+            self._recorder.record(
+                method, url, body, response, time.perf_counter() - started
+            )
+        if response.status_code == 400 and not stream:
+            logger.debug(response.json())
+        return response
+
+    @staticmethod
+    def _retry_status(method: str, status: int) -> bool:
+        """Whether an answer is retried, 429 means the request was not processed"""
+        if status == 429:
+            return True
+        return status in RETRY_STATUSES and method.upper() in IDEMPOTENT_METHODS
+
+    def _send(
+        self,
+        method: str,
+        url: str,
+        headers: Dict[str, str],
+        data: Any,
+        body: Optional[Dict[str, Any]],
+        timeout: Any,
+        stream: bool = False,
+        deadline: Deadline = None,
+    ):
+        """One attempt of a request, routed over the endpoints (if any)"""
+        path = url[len(self._BASE_URL) :] if url.startswith(self._BASE_URL) else None
+        if self._endpoints is not None and path is not None:
+            return self._endpoints.send(
+                path,
+                lambda url: self._transmit(
+                    method, url, headers, data, body, timeout, stream, deadline, path
+                ),
+                self._transport.retryable,
+            )
+        return self._transmit(method, url, headers, data, body, timeout, stream, deadline, path)
+
+    def _transmit(
+        self,
+        method: str,
+        url: str,
+        headers: Dict[str, str],
+        data: Any,
+        body: Optional[Dict[str, Any]],
+        timeout: Any,
+        stream: bool = False,
+        deadline: Deadline = None,
+        path: str = None,
+    ):
+        """Sends a request within the tenant's concurrency limit (if any), waiting for a
+        slot at most until the deadline"""
+        if self._tenant is None:
+            return self._transport.request(
+                method,
+                url,
+                headers=headers,
+                data=data,
+                json=body,
+                timeout=timeout,
+                stream=stream,
+                path=path,
+            )
+        with self._tenant.slot(deadline):
+            started = time.perf_counter()
+            try:
+                response = self._transport.request(
+                    method,
+                    url,
+                    headers=headers,
+                    data=data,
+                    json=body,
+                    timeout=timeout,
+                    stream=stream,
+                    path=path,
+                )
+            except Exception:
+                self._tenant.observe(time.perf_counter() - started, error=True)
+                raise
+        self._tenant.observe(
+            time.perf_counter() - started, error=response.status_code >= 400
+        )
+        return response
+
+    def _hedged(self, key: str, func: Callable[[], Any], deadline: Deadline = None):
+        """Runs an idempotent request through the hedger, if there is one"""
+        if self._hedger is None:
+            return func()
+        return self._hedger.call(key, func, deadline)
+
+    def _get_req(
+        self,
+        url: str,
+        _headers: Dict[str, str] = None,
+        deadline: Deadline = None,
+        stream: bool = False,
+    ):
+        """get
+
+        Simplifies making get requests
+
+        Args:
+            url (str): _description_
+            _headers (Dict[str, str], optional): Authenticated header with Bearer token. Defaults to None.
+            deadline (Deadline, optional): Time budget of the call. Defaults to None.
+            stream (bool, optional): Leave the body to be streamed, see `Transport.request`. Defaults to False.
+        """
+        return self._request("GET", url, _headers=_headers, deadline=deadline, stream=stream)
+
+    def _post_req(
+        self,
+        url: str,
+        body: Dict[str, Any],
+        _headers: Dict[str, str] = None,
+        deadline: Deadline = None,
+    ) -> Union[type[Bot], Dict[Any, Any]]:
+        """post
+
+        Simplifies the process of making a post request to sarufi engine
+
+        Args:
+            url (str): URL to make the request to
+            body (Dict[str, Any]): Body of the request
+            _headers (Dict[str, str], optional): Request headers. Defaults to None.
+            deadline (Deadline, optional): Time budget of the call. Defaults to None.
+
+        Returns:
+            Union[type[Bot], Dict[Any, Any]]: Bot object if request is successful otherwise dict with error message
+        """
+        return self._request(
+            "POST", url, body=body, _headers=_headers, deadline=deadline
+        )
+
+    def _post_deferrable(self, path: str, body: Dict[str, Any], deadline: Deadline = None):
+        """POSTs a chat message or state update, through the outbox if there is one
+
+        Returns the response, or the outbox's 202 receipt when the call was queued
+        """
+        if self._outbox is None:
+            return self._post_req(url=self._BASE_URL + path, body=body, deadline=deadline)
+        return self._outbox.post(self, path, body, deadline=deadline)
+
+    def _put_req(
+        self,
+        url: str,
+        body: Dict[str, Any],
+        _headers: Dict[str, str] = None,
+    ) -> Union[type[Bot], Dict[Any, Any]]:
+        """put
+
+        Simplifies the process of making a put request to sarufi engine
+
+        Args:
+            url (str): URL to make the request to
+            body (Dict[str, Any]): Body of the request
+            _headers (Dict[str, str], optional): Request headers. Defaults to None.
+
+        Returns:
+            Union[type[Bot], Dict[Any, Any]]: Bot object if request is successful otherwise dict with error message
+        """
+        return self._request("PUT", url, body=body, _headers=_headers)
+
+    def _delete_req(
+        self,
+        url: str,
+        _headers: Dict[str, str] = None,
+    ) -> Union[type[Bot], Dict[Any, Any]]:
+        """delete
+
+        Simplifies the process of making a delete request to sarufi engine
+
+        Args:
+            url (str): URL to make the request to
+            _headers (Dict[str, str], optional): Request headers. Defaults to None.
+
+        Returns:
+            Union[type[Bot], Dict[Any, Any]]: Bot object if request is successful otherwise dict with error message
+        """
+        return self._request("DELETE", url, _headers=_headers)
+
+    def create_bot(
+        self,
+        name: str,
+        description: str = None,
+        industry: str = None,
+        flow: Dict[str, Any] = None,
+        intents: Dict[str, List[str]] = None,
+        webhook_url: str = None,
+        webhook_trigger_intents: List[str] = None,
+        visible_on_community: bool = None,
+    ) -> Union[type[Bot], Dict[Any, Any]]:
+        """create_bot
+
+        Creates a new chatbot using `sarufi API`
+
+        Args:
+            name (str): Name of the chatbot
+            description (_type_, optional): description about what the chabot does. Defaults to None.
+            flow (_type_, optional): Flow to control execution of the chatbot. Defaults to None.
+            intents (_type_, optional): Intents to train the chatbot. Defaults to None.
+
+        Returns:
+            Union[Bot, Dict]: Chatbot object if bot created successfully otherwise dict with error message
+
+        Examples:
+
+        >>> from sarufi import Sarufi
+        >>> sarufi = Sarufi(api_key='YOUR_API_KEY')
+        2022-08-23 15:03:00,928 - root - INFO - Getting token
+        >>> bot = sarufi.create_bot(name='Maria')
+        2022-08-23 15:03:09,891 - root - INFO - Creating bot
+        >>> bot
+        Bot(id=5, name=Maria, description=PUT DESCRIPTION HERE)
+        """
+
+        logger.info("Creating bot")
+        url = self._BASE_URL + "chatbot"
+        data = {
+            "name": name,
+            "description": description,
+            "intents": intents,
+            "flows": flow,
+            "industry": industry,
+            "webhook_url": webhook_url,
+            "webhook_trigger_intents": webhook_trigger_intents,
+            "visible_on_community": visible_on_community,
+        }
+        response = self._post_req(body=data, url=url)
+        if response.status_code == 200:
+            return self._bot(self._cached(response.json()))
+        return response.json()
+
+    def create_from_file(
+        self,
+        intents: Union[Path, str] = None,
+        flow: Union[Path, str] = None,
+        metadata: Union[Path, str] = None,
+        validate: bool = False,
+        dedupe: bool = False,
+    ) -> Union[type[Bot], Dict[Any, Any]]:
+        """create_from_file
+
+        Creates a new chatbot using sarufi engine from a file
+
+        Args:
+            intents (Union[Path, str], optional): Intent file. Defaults to None.
+            flow (Union[Path, str], optional): Flow file. Defaults to None.
+            metadata (Union[Path, str], optional): Metadata file. Defaults to None.
+            validate (bool, optional): Validate intents and flow locally before uploading. Defaults to False.
+            dedupe (bool, optional): Drop duplicate utterances before uploading. Defaults to False.
+
+        Raises:
+            FlowValidationError: If `validate` is True and the intents or flow have errors
+
+        Returns:
+            Union[type[Bot], Dict[Any, Any]]: Chatbot object if bot created successfully otherwise dict with error message
+
+        Examples:
+
+        >>> from sarufi import Sarufi
+        >>> sarufi = Sarufi(api_key='Your API KEY')
+        >>> bot = sarufi.create_from_file(
+        ...     intents='data/intents.json',
+        ...     flow='data/flow.json',
+        ...     metadata='data/metadata.json'
+            )"""
+
+        if intents:
+            intents = self._read_file(intents)
+            if dedupe:
+                intents = self._dedupe(intents)
+        if flow:
+            flow = self._read_file(flow)
+        if validate:
+            self._validate(intents, flow)
+        if metadata:
+            metadata = self._read_file(metadata)
+        else:
+            metadata = {}
+        return self.create_bot(
+            metadata.get("name", "put name here"),
+            description=metadata.get("description"),
+            industry=metadata.get("industry"),
+            webhook_url=metadata.get("webhook_url"),
+            webhook_trigger_intents=metadata.get("webhook_trigger_intents"),
+            visible_on_community=metadata.get("visible_on_community"),
+            intents=intents,
+            flow=flow,
+        )
+
+    def update_bot(
+        self,
+        id: int,
+        name: str = None,
+        industry: str = None,
+        description: str = None,
+        intents: Dict[str, List[str]] = None,
+        flow: Dict[str, Any] = None,
+        webhook_url: str = None,
+        webhook_trigger_intents: List[str] = None,
+        visible_on_community: bool = None,
+    ) -> Union[type[Bot], Dict[Any, Any]]:
+        """update_bot
+
+        Updates a chatbot with a specified (id) from sarufi engine
+
+        Args:
+            id (int): The ID of the chatbot to update
+            name (str, optional): new chatbot name. Defaults to None.
+            description (str, optional):new chatbot description . Defaults to None.
+            intents (Dict[str, List[str]], optional): updated intents . Defaults to None.
+            flow (Dict[str, Any], optional): updated flow . Defaults to None.
+            webhook_url(str): The URL to be triggred by the chatbot at the fulfillment of intent
+            webhook_trigger_intents(List[str]): Intents to be triggered by the webhook
+            visible_on_community(bool): Should a bot be visible on a community page.
+
+        Returns:
+            Union[type[Bot], Dict[Any, Any]]: Chatbot object if bot updated successfully otherwise dict with error message
+
+        Examples:
+
+        >>> from sarufi import Sarufi
+        >>> sarufi = Sarufi(api_key='Your API KEY')
+        >>> bot = sarufi.update_bot(
+            ...     id=5,
+            ...     name='Maria',
+            ...     description='A chatbot that does this and that',
+            ...     intents={...},
+            ...     flow={...},
+            ...     industry='healthcare',
+            ...     visible_on_community=True
+            ... )
+        """
+        logger.info("Updating bot")
+        url = self._BASE_URL + f"chatbot/{id}"
+        data = {
+            "name": name,
+            "description": description,
+            "intents": intents,
+            "flows": flow,
+            "industry": industry,
+            "webhook_url": webhook_url,
+            "webhook_trigger_intents": webhook_trigger_intents,
+            "visible_on_community": visible_on_community,
+        }
+        response = self._put_req(body=data, url=url)
+        if response.status_code == 200:
+            return self._bot(self._cached(response.json()))
+        return response.json()
+
+    def update_from_file(
+        self,
+        id: int,
+        intents: Union[Path, str] = None,
+        flow: Union[Path, str] = None,
+        metadata: Union[Path, str] = None,
+        validate: bool = False,
+        dedupe: bool = False,
+    ) -> Union[type[Bot], Dict[Any, Any]]:
+        """update_from_file
+
+            Updates chatbot (intents, flow) using sarufi engine from a file
+
+        Args:
+            id (int): ID of the chatbot to update
+            intents (Union[Path, str], optional): Intent file. Defaults to None.
+            flow (Union[Path, str], optional): Flow file. Defaults to None.
+            metadata (Union[Path, str], optional): Metadata file. Defaults to None.
+            validate (bool, optional): Validate intents and flow locally before uploading. Defaults to False.
+            dedupe (bool, optional): Drop duplicate utterances before uploading. Defaults to False.
+
+        Raises:
+            FlowValidationError: If `validate` is True and the intents or flow have errors
+
+        Returns:
+            Union[type[Bot], Dict[Any, Any]]: Chatbot object if bot updated successfully otherwise dict with error message
+
+        Examples:
+
+        >>> from sarufi import Sarufi
+        >>> sarufi = Sarufi(api_key='Your API KEY')
+        >>> bot = sarufi.update_from_file(
+            ...     id=5,
+            ...     intents='data/intents.json',
+            ...     flow='data/flow.json',
+            ...     metadata='data/metadata.json'
+            ... )
+        """
+
+        if intents:
+            intents = self._read_file(intents)
+            if dedupe:
+                intents = self._dedupe(intents)
+        if flow:
+            flow = self._read_file(flow)
+        if validate:
+            self._validate(intents, flow)
+        if metadata:
+            metadata = self._read_file(metadata)
+        else:
+            metadata = {}
+        return self.update_bot(
+            id=id,
+            name=metadata.get("name"),
+            industry=metadata.get("industry"),
+            description=metadata.get("description"),
+            webhook_url=metadata.get("webhook_url"),
+            webhook_trigger_intents=metadata.get("webhook_trigger_intents"),
+            visible_on_community=metadata.get("visible_on_community"),
+            intents=intents,
+            flow=flow,
+        )
+
+    def watch_files(
+        self,
+        id: int,
+        intents: Union[Path, str] = None,
+        flow: Union[Path, str] = None,
+        metadata: Union[Path, str] = None,
+        validate: bool = True,
+        dedupe: bool = False,
+        debounce: float = 0.25,
+        on_sync: Callable = None,
+    ):
+        """watch_files
+
+        Watch mode of `update_from_file`: syncs the files to the bot now and
+        again every time they are saved, pushing only the changed sections.
+        See `sarufi.watch.BotWatcher`.
+
+        Args:
+            id (int): ID of the chatbot to keep in sync
+            intents (Union[Path, str], optional): Intent file. Defaults to None.
+            flow (Union[Path, str], optional): Flow file. Defaults to None.
+            metadata (Union[Path, str], optional): Metadata file. Defaults to None.
+            validate (bool, optional): Validate intents and flow before pushing. Defaults to True.
+            dedupe (bool, optional): Drop duplicate utterances before pushing. Defaults to False.
+            debounce (float, optional): Seconds without saves before syncing. Defaults to 0.25.
+            on_sync (Callable[[SyncResult], None], optional): Called after every sync. Defaults to None.
+
+        Returns:
+            BotWatcher: The running watcher, call `stop()` when done
+
+        Examples:
+
+        >>> watcher = sarufi.watch_files(5, intents='intents.json', flow='flow.json')
+        >>> watcher.latency.summary()
+        """
+        from .watch import BotWatcher
+
+        return BotWatcher(
+            self,
+            id,
+            intents=intents,
+            flow=flow,
+            metadata=metadata,
+            validate=validate,
+            dedupe=dedupe,
+            debounce=debounce,
+            on_sync=on_sync,
+        ).start()
+
+    def get_bot(
+        self, id: int, deadline: Deadline = None, timeout_budget: float = None
+    ) -> Union[type[Bot], Dict[Any, Any]]:
+        """get_bot
+
+        Gets a chatbot  with a specified (id) from sarufi engine
+
+        Args:
+            id (int): The ID of the chatbot to get
+            deadline (Deadline, optional): Time budget shared with other calls. Defaults to None.
+            timeout_budget (float, optional): Seconds the call may take, retries included. Defaults to None.
+
+        Returns:
+            Union[Bot, Dict[Any, Any]]: Chatbot object if bot found otherwise dict with error message
+
+        Examples:
+
+        >>> from sarufi import Sarufi
+        >>> sarufi = Sarufi(api_key='Your API KEY')
+        >>> bot = sarufi.get_bot(id=5)
+        >>> print(bot)
+        Bot(name='iBank', id=23)
+        """
+        logger.info("Getting bot with id: {}".format(id))
+        if self._cache is not None:
+            data = self._cache.get(id)
+            if data is not None:
+                self._cache.revalidate(id, self._download_bot)
+                return self._bot(data)
+        deadline = Deadline.resolve(deadline, timeout_budget)
+        response = self._hedged(
+            "get_bot", lambda: self._download_bot(id, deadline), deadline
+        )
+        if response.status_code == 200:
+            return self._bot(response.json())
+        return response.json()
+
+    def _download_bot(self, id: int, deadline: Deadline = None):
+        """Downloads a bot, keeping the persistent cache (if any) in sync"""
+        url = self._BASE_URL + "chatbot/" + str(id)
+        response = self._get_req(url=url, deadline=deadline)
+        if response.status_code == 200:
+            self._cached(response.json())
+        elif response.status_code == 404 and self._cache is not None:
+            self._cache.delete(id)
+        return response
+
+    def bots(self) -> Union[List[type[Bot]], Dict]:
+        """bots
+
+        Gets all user chatbots from sarufi engine
+
+        Returns:
+            Union[List[Bot], Dict]: List of chatbots if successful otherwise dict with error message
+
+        Examples:
+
+        >>> from sarufi import Sarufi
+        >>> sarufi = Sarufi(api_key='Your API KEY')
+        2022-08-23 15:03:00,928 - root - INFO - Getting token
+        >>> sarufi.bots()
+        2022-08-23 15:03:57,845 - root - INFO - Getting bots
+        [Bot(id=4, name=iBank, description=PUT DESCRIPTION HERE), Bot(id=5, name=Maria, description=Swahili Cognitive Mental Health Chatbot)]
+
+        """
+        logger.info("Getting bots")
+        url = self._BASE_URL + "chatbots"
+        response = self._get_req(url=url)
+        if response.status_code == 200:
+            return [self._bot(bot) for bot in response.json()]
+        return response.json()
+
+    def _fetch_response(
+        self,
+        bot_id: int,
+        chat_id: str,
+        message: str,
+        message_type: str,
+        channel: str,
+        deadline: Deadline = None,
+    ):
+        path = "conversation"
+        if channel.lower() == "whatsapp":
+            logger.info("Sending message to bot via whatsapp")
+            path = f"{path}/whatsapp"
+
+        data = {
+            "chat_id": chat_id,
+            "bot_id": bot_id,
+            "message": message,
+            "message_type": message_type,
+        }
+        return self._post_deferrable(path, data, deadline=deadline)
+
+    def chat(
+        self,
+        bot_id: int,
+        chat_id: str = str(uuid4()),
+        message: str = "Hello",
+        message_type: str = "text",
+        channel: str = "general",
+        deadline: Deadline = None,
+        timeout_budget: float = None,
+    ):
+        """
+        Handle chat messages conversations
+
+        Args:
+            bot_id (_type_): bot project id
+            chat_id (_type_): bot chat_id (unique)
+            message (_type_): message to be sent to bot
+            message_type (_type_): message type (text, image, audio, video, file)
+            deadline (Deadline, optional): Time budget shared with other calls. Defaults to None.
+            timeout_budget (float, optional): Seconds the call may take, retries included,
+                `DeadlineExceeded` is raised when it runs out. Defaults to None.
+
+        Returns:
+            response (json): bot response, with a `Coalescer` the reply to all the
+                messages merged with this one
+
+        Examples:
+            >>> from sarufi import Sarufi
+            >>> sarufi = Sarufi(api_key='Your API KEY')
+            >>> sarufi.chat(bot_id=5, chat_id='123456789', message='Hello')
+
+            # You can also send direct from bot instance
+
+            >>> mybot = sarufi.get_bot(id=5)
+            >>> mybot.respond(chat_id='123456789', message='Hello')
+        """
+        logger.info("Sending message to bot and returning response")
+        deadline = Deadline.resolve(deadline, timeout_budget)
+
+        def send(message: str):
+            response = self._fetch_response(
+                bot_id=bot_id,
+                chat_id=chat_id,
+                message=message,
+                message_type=message_type,
+                channel=channel,
+                deadline=deadline,
+            )
+            logger.info(f"Status code: {response.status_code}")
+            if response.status_code == 200:
+                logger.info("Message sent successfully")
+                return response.json()
+            if response.status_code == QUEUED:
+                logger.info("Message queued in the outbox")
+                return response.json()
+
+            logger.error("Message not sent[CHAT]")
+            return response.json()
+
+        if self._coalescer is None or message_type != "text":
+            return send(message)
+        return self._coalescer.submit(
+            (bot_id, chat_id, channel.lower()), message, send, deadline=deadline
+        )
+
+    def send_media(
+        self,
+        bot_id: int,
+        chat_id: str,
+        media: MediaSource,
+        message_type: str = "file",
+        channel: str = "general",
+        filename: str = None,
+        content_type: str = None,
+        progress: Callable[[int, Optional[int]], None] = None,
+        cancel: threading.Event = None,
+    ):
+        """send_media
+
+        Sends a media message (image, audio, video, file) as a streamed multipart upload,
+        the media is read in chunks and never base64 encoded or loaded whole
+
+        Args:
+            bot_id (int): bot project id
+            chat_id (str): bot chat_id (unique)
+            media (MediaSource): File path, binary file object, bytes or iterator of byte chunks
+            message_type (str, optional): image, audio, video or file. Defaults to "file".
+            channel (str, optional): general or whatsapp. Defaults to "general".
+            filename (str, optional): File name sent with the media. Defaults to the path name.
+            content_type (str, optional): Media type of the file. Defaults to a guess from the file name.
+            progress (Callable[[int, Optional[int]], None], optional): Called with (bytes sent,
+                total bytes or None) as the media is sent. Defaults to None.
+            cancel (threading.Event, optional): Set it from another thread to abort the upload. Defaults to None.
+
+        Raises:
+            UploadCancelled: If `cancel` is set before the upload finishes
+
+        Returns:
+            response (json): bot response
+
+        Examples:
+
+        >>> from sarufi import Sarufi
+        >>> sarufi = Sarufi(api_key='Your API KEY')
+        >>> sarufi.send_media(bot_id=5, chat_id='123456789', media='receipt.jpg', message_type='image')
+        """
+        from .media import MultipartUpload
+
+        url = self._BASE_URL + "conversation"
+        if channel.lower() == "whatsapp":
+            url = f"{url}/whatsapp"
+        upload = MultipartUpload(
+            {"chat_id": chat_id, "bot_id": bot_id, "message_type": message_type},
+            media,
+            filename=filename,
+            content_type=content_type,
+            progress=progress,
+            cancel=cancel,
+        )
+        headers = {
+            "Authorization": self.headers["Authorization"],
+            "Content-Type": upload.content_type,
+        }
+        if upload.size is not None:
+            headers["Content-Length"] = str(upload.size)
+        logger.info(f"Sending {message_type} {upload.filename} to bot")
+        response = self._request("POST", url, _headers=headers, data=upload)
+        if response.status_code == 200:
+            logger.info("Message sent successfully")
+            return response.json()
+
+        logger.error("Message not sent[MEDIA]")
+        return response.json()
+
+    def chat_status(
+        self,
+        bot_id: int,
+        chat_id: str,
+        deadline: Deadline = None,
+        timeout_budget: float = None,
+    ):
+        """
+        Handle chat messages conversations
+
+        Help to fetch the status of a chat session
+
+        Args:
+            bot_id (int): The ID of the chatbot to get
+            chat_id (str): The ID of the chat session
+            deadline (Deadline, optional): Time budget shared with other calls. Defaults to None.
+            timeout_budget (float, optional): Seconds the call may take, retries included. Defaults to None.
+
+        Returns:
+            response (json): bot response
+
+        Examples:
+
+        >>> from sarufi import Sarufi
+        >>> sarufi = Sarufi(api_key='Your API KEY')
+        >>> sarufi.chat_status(bot_id=5, chat_id='chat_id')
+        >>> {'current_state': 'greetings', 'next_state':'end'}
+
+        """
+        logger.info("Sending message to bot and returning response")
+        url = self._BASE_URL + "conversation/status"
+        data = {
+            "chat_id": chat_id,
+            "bot_id": str(bot_id),
+        }
+        deadline = Deadline.resolve(deadline, timeout_budget)
+        response = self._hedged(
+            "chat_status",
+            lambda: self._post_req(url=url, body=data, deadline=deadline),
+            deadline,
+        )
+        if response.status_code == 200:
+            logger.info("Message sent successfully")
+            return response.json()
+
+        logger.error("Message not sent[CHAT]")
+        return response.json()
+
+    def update_conversation_state(self, bot_id: int, chat_id: str, next_state: str):
+        """
+        Update the conversation state of a chat session
+
+        Use this to explicitly update the conversation state of a chat session
+
+        Args:
+            bot_id (int): The ID of the chatbot to get
+            chat_id (str): The ID of the chat session
+            next_state(str): The next state to update to
+
+        Returns:
+            response (json): bot response
+
+        Examples:
+
+        >>> from sarufi import Sarufi
+        >>> sarufi = Sarufi(api_key='Your API KEY')
+        >>> sarufi.update_conversation_state(bot_id=5, chat_id='chat_id', state='greetings')
+        >>> {..new state machine..}
+
+        """
+        logger.info("Sending message to bot and returning response")
+        data = {
+            "chat_id": chat_id,
+            "bot_id": str(bot_id),
+            "next_state": next_state,
+        }
+        response = self._post_deferrable("conversation-state", data)
+        if response.status_code == 200:
+            logger.info("Message sent successfully")
+            return response.json()
+        if response.status_code == QUEUED:
+            logger.info("State update queued in the outbox")
+            return response.json()
+
+        logger.error("Message not sent[CHAT]")
+        return response.json()
+
+    def delete_bot(self, id: int) -> Dict[Any, Any]:
+        """delete_bot
+
+        Deletes a chatbot with a specified (id) from sarufi engine
+
+        Args:
+            id (int): The ID of the chatbot to delete
+
+        Returns:
+            Dict[Any, Any]: Dict with error message if bot not found otherwise dict with success message
+
+        Examples:
+
+        >>> from sarufi import Sarufi
+        >>> sarufi = Sarufi(api_key='Your API KEY')
+        >>> sarufi.delete_bot(5)
+        {'message': 'Bot with ID 5 deleted successfully'}
+        """
+        logger.info("Deleting bot")
+        return self._remove_bot(id).json()
+
+    def _remove_bot(self, id: int):
+        """Deletes a bot, evicting it from the persistent cache (if any)"""
+        url = self._BASE_URL + f"chatbot/{id}"
+        response = self._delete_req(url=url)
+        if response.status_code == 200 and self._cache is not None:
+            self._cache.delete(id)
+        return response
+
+    def bulk_create(
+        self,
+        bots: Iterable[Dict[str, Any]],
+        max_workers: int = 8,
+        progress: Callable = None,
+        checkpoint: Union[Path, str] = None,
+        key: Callable[[Dict[str, Any]], Any] = None,
+    ) -> List[BulkResult]:
+        """bulk_create
+
+        Creates many chatbots concurrently
+
+        Args:
+            bots (Iterable[Dict[str, Any]]): `create_bot` keyword arguments per bot, consumed lazily
+            max_workers (int, optional): Concurrent requests. Defaults to 8.
+            progress (Callable, optional): Called with (finished, failed, result) after each bot. Defaults to None.
+            checkpoint (Union[Path, str], optional): File recording progress, bots already created
+                according to it are skipped so a crashed run can be resumed with the same input.
+                Defaults to None.
+            key (Callable, optional): Identifies a bot in results and checkpoint, must be unique.
+                Defaults to its position in `bots`, names need not be unique.
+
+        Returns:
+            List[BulkResult]: Per bot result with the new bot id on success, the error body or exception otherwise
+
+        Examples:
+
+        >>> from sarufi import Sarufi
+        >>> sarufi = Sarufi(api_key='Your API KEY')
+        >>> results = sarufi.bulk_create(
+        ...     [{"name": "Kubeti", "intents": {...}, "flow": {...}}, ...],
+        ...     checkpoint="create.ndjson",
+        ... )
+        >>> [result.key for result in results if not result.ok]
+        """
+        from .bulk import run_bulk
+
+        def create(item: Tuple[int, Dict[str, Any]]):
+            bot = self.create_bot(**item[1])
+            if isinstance(bot, dict):
+                return False, bot
+            return True, bot.id  # only the id, results of large runs stay small
+
+        return run_bulk(
+            create,
+            enumerate(bots),
+            (lambda item: key(item[1])) if key else (lambda item: item[0]),
+            max_workers=max_workers,
+            progress=progress,
+            checkpoint=checkpoint and str(checkpoint),
+            checkpoint_extra=lambda result: {"id": result.value} if result.ok else {},
+        )
+
+    def bulk_update(
+        self,
+        bots: Iterable[Dict[str, Any]],
+        max_workers: int = 8,
+        progress: Callable = None,
+        checkpoint: Union[Path, str] = None,
+    ) -> List[BulkResult]:
+        """bulk_update
+
+        Updates many chatbots concurrently
+
+        Args:
+            bots (Iterable[Dict[str, Any]]): `update_bot` keyword arguments (including `id`) per bot
+            max_workers (int, optional): Concurrent requests. Defaults to 8.
+            progress (Callable, optional): Called with (finished, failed, result) after each bot. Defaults to None.
+            checkpoint (Union[Path, str], optional): File recording progress to resume from. Defaults to None.
+
+        Returns:
+            List[BulkResult]: Per bot result keyed by bot id, the error body or exception on failure
+        """
+        from .bulk import run_bulk
+
+        def update(kwargs: Dict[str, Any]):
+            bot = self.update_bot(**kwargs)
+            if isinstance(bot, dict):
+                return False, bot
+            return True, bot.id
+
+        return run_bulk(
+            update,
+            bots,
+            lambda kwargs: kwargs["id"],
+            max_workers=max_workers,
+            progress=progress,
+            checkpoint=checkpoint and str(checkpoint),
+        )
+
+    def bulk_delete(
+        self,
+        ids: Iterable[int],
+        max_workers: int = 8,
+        progress: Callable = None,
+        checkpoint: Union[Path, str] = None,
+    ) -> List[BulkResult]:
+        """bulk_delete
+
+        Deletes many chatbots concurrently
+
+        Args:
+            ids (Iterable[int]): IDs of the chatbots to delete
+            max_workers (int, optional): Concurrent requests. Defaults to 8.
+            progress (Callable, optional): Called with (finished, failed, result) after each bot. Defaults to None.
+            checkpoint (Union[Path, str], optional): File recording progress to resume from. Defaults to None.
+
+        Returns:
+            List[BulkResult]: Per bot result keyed by bot id with the response body
+        """
+        from .bulk import run_bulk
+
+        def delete(id: int):
+            response = self._remove_bot(id)
+            return response.status_code == 200, response.json()
+
+        return run_bulk(
+            delete,
+            ids,
+            lambda id: id,
+            max_workers=max_workers,
+            progress=progress,
+            checkpoint=checkpoint and str(checkpoint),
+        )
+
+    def migrate_conversation_states(
+        self,
+        bot_id: int,
+        chat_ids: Iterable[str],
+        mapping: Dict[str, str] = None,
+        target: str = None,
+        check: bool = None,
+        keep: Iterable[str] = None,
+        rate: float = None,
+        max_workers: int = 8,
+        progress: Callable = None,
+        checkpoint: Union[Path, str] = None,
+    ) -> List[BulkResult]:
+        """migrate_conversation_states
+
+        Moves many live conversations to new states, e.g after states were renamed
+        or removed from the flow
+
+        With `check` the state each chat is in (its `next_state`) is read with
+        `chat_status` first, chats the migration does not apply to are left
+        alone and the checkpoint records the state each chat came from. A chat
+        that receives a message between the check and the update is migrated
+        from its state at the check.
+
+        Args:
+            bot_id (int): The chatbot
+            chat_ids (Iterable[str]): Chats to migrate, consumed lazily
+            mapping (Dict[str, str], optional): Old state -> new state, chats in other states are
+                left alone. Defaults to None.
+            target (str, optional): State every chat is moved to, instead of a mapping. Defaults to None.
+            check (bool, optional): Read the current state first, always done with a mapping.
+                Defaults to True with a mapping, False with a target.
+            keep (Iterable[str], optional): With a target, chats already in one of these states
+                (e.g the states of the new flow) are left alone, implies check. Defaults to None.
+            rate (float, optional): API calls per second across all workers. Defaults to None (no limit).
+            max_workers (int, optional): Concurrent chats. Defaults to 8.
+            progress (Callable, optional): Called with (finished, failed, result) after each chat. Defaults to None.
+            checkpoint (Union[Path, str], optional): File recording progress to resume from. Defaults to None.
+
+        Raises:
+            ValueError: Unless exactly one of mapping and target is given, or if a mapping is
+                given with check=False
+
+        Returns:
+            List[BulkResult]: Per chat result keyed by chat_id, the value is
+                {"from": state or None if not checked, "to": new state or None if left alone}
+
+        Examples:
+
+        >>> results = sarufi.migrate_conversation_states(
+        ...     5, chat_ids, mapping={"toa_pesa": "withdraw", "old_menu": "menu"}, rate=50,
+        ...     checkpoint="migration.ndjson",
+        ... )
+        >>> sum(result.value["to"] is not None for result in results if result.ok)
+        1843
+        """
+        from .bulk import RateLimiter, run_bulk
+
+        if (mapping is None) == (target is None):
+            raise ValueError("pass either a mapping of old to new states or a target state")
+        keep = frozenset(keep or ())
+        if check is None:
+            check = mapping is not None or bool(keep)
+        if not check and (mapping is not None or keep):
+            raise ValueError("migrating by mapping or with keep needs check=True")
+        limiter = RateLimiter(rate)
+
+        def migrate(chat_id: str):
+            chat_id = str(chat_id)
+            body = {"chat_id": chat_id, "bot_id": str(bot_id)}
+            current = None
+            if check:
+                limiter.acquire()
+                response = self._post_req(url=self._BASE_URL + "conversation/status", body=body)
+                if response.status_code != 200:
+                    return False, response.json()
+                current = response.json().get("next_state")
+            new = target if mapping is None else mapping.get(current)
+            if new is None or new == current or current in keep:
+                return True, {"from": current, "to": None}
+            limiter.acquire()
+            response = self._post_req(
+                url=self._BASE_URL + "conversation-state", body=dict(body, next_state=new)
+            )
+            if response.status_code != 200:
+                return False, response.json()
+            return True, {"from": current, "to": new}
+
+        return run_bulk(
+            migrate,
+            chat_ids,
+            lambda chat_id: chat_id,
+            max_workers=max_workers,
+            progress=progress,
+            checkpoint=checkpoint and str(checkpoint),
+            checkpoint_extra=lambda result: result.value if result.ok else {},
+        )
+
+    def export_bots(
+        self,
+        path: Union[Path, str],
+        max_workers: int = 4,
+        progress: Callable = None,
+    ) -> List[BulkResult]:
+        """export_bots
+
+        Streams every chatbot's full definition (metadata, intents, flows) to an NDJSON file
+
+        Args:
+            path (Union[Path, str]): Output file, gzip compressed when it ends in .gz
+            max_workers (int, optional): Concurrent downloads. Defaults to 4.
+            progress (Callable, optional): Called with (finished, failed, result) after each bot. Defaults to None.
+
+        Returns:
+            List[BulkResult]: Per bot result keyed by bot id
+
+        Examples:
+
+        >>> from sarufi import Sarufi
+        >>> sarufi = Sarufi(api_key='Your API KEY')
+        >>> sarufi.export_bots('backup.ndjson.gz')
+        """
+        from .backup import export_bots
+
+        return export_bots(self, path, max_workers=max_workers, progress=progress)
+
+    def import_bots(
+        self,
+        path: Union[Path, str],
+        update: bool = False,
+        max_workers: int = 4,
+        progress: Callable = None,
+        checkpoint: Union[Path, str] = None,
+    ) -> List[BulkResult]:
+        """import_bots
+
+        Streams chatbots from an `export_bots` file back through create (or update)
+
+        Args:
+            path (Union[Path, str]): Export file, gzip compressed when it ends in .gz
+            update (bool, optional): Update the bots with the exported ids instead of creating new ones. Defaults to False.
+            max_workers (int, optional): Concurrent uploads. Defaults to 4.
+            progress (Callable, optional): Called with (finished, failed, result) after each bot. Defaults to None.
+            checkpoint (Union[Path, str], optional): File recording progress to resume from. Defaults to None.
+
+        Returns:
+            List[BulkResult]: Per bot result keyed by the exported id, with the new bot id on success
+
+        Examples:
+
+        >>> from sarufi import Sarufi
+        >>> sarufi = Sarufi(api_key='Your API KEY')
+        >>> sarufi.import_bots('backup.ndjson.gz', checkpoint='import.ndjson')
+        """
+        from .backup import import_bots
+
+        return import_bots(
+            self,
+            path,
+            update=update,
+            max_workers=max_workers,
+            progress=progress,
+            checkpoint=checkpoint,
+        )
@@ -0,0 +1,183 @@
+"""Coalescing of rapid-fire messages of one chat into a single chat call
+
+On messaging channels users often type one thought as several quick
+messages ("hi", "nataka", "kutoa hela"). With a `Coalescer` the messages a
+chat sends within `window` seconds of each other are merged into one
+`chat` call and its reply is returned to every caller that sent a part of
+it, instead of each message making its own round trip and flow transition.
+The first message of a burst waits until the chat has been quiet for
+`window` seconds (never longer than `max_delay` in total), so coalescing
+trades that much added latency for fewer calls. Bursts of one chat are
+sent in order, a burst waits for the previous one's reply. Only text
+messages are coalesced. Every caller waits at most until its own deadline,
+the burst itself is sent under the deadline of the caller that opened it.
+
+Examples:
+
+>>> from sarufi import Sarufi, Coalescer
+>>> coalescer = Coalescer(window=0.8)
+>>> sarufi = Sarufi(api_key="YOUR_API_KEY", coalescer=coalescer)
+>>> # three webhook handler threads, one per incoming message
+>>> sarufi.chat(bot_id=5, chat_id="255700000000", message="hi")
+>>> sarufi.chat(bot_id=5, chat_id="255700000000", message="nataka")
+>>> sarufi.chat(bot_id=5, chat_id="255700000000", message="kutoa hela")
+>>> coalescer.stats()
+{'messages': 3, 'calls': 1, 'merged': 2, 'merge_rate': 0.6667, 'count': 3, 'p50': 0.81, ...}
+"""
+from __future__ import annotations
+import time
+import threading
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+from .deadline import Deadline, DeadlineExceeded
+from .stats import LatencyStats
+
+WINDOW = 0.5
+MAX_DELAY = 2.0
+MAX_MESSAGES = 10
+
+
+class _Burst(object):
+    """Messages of one chat waiting to be sent together"""
+
+    def __init__(self, lock: threading.Lock, previous: Optional[_Burst]) -> None:
+        self.messages: List[str] = []
+        self.arrivals: List[float] = []
+        self.previous = previous
+        self.closed = False
+        self.grown = threading.Condition(lock)
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class Coalescer(object):
+    """Merges messages a chat sends in quick succession into one call
+
+    Args:
+        window (float, optional): Seconds of quiet after which a burst is sent. Defaults to 0.5.
+        max_delay (float, optional): Longest a message waits for its burst to end. Defaults to 2.0.
+        max_messages (int, optional): Messages after which a burst is sent right away. Defaults to 10.
+        separator (str, optional): Joins the messages of a burst. Defaults to " ".
+    """
+
+    def __init__(
+        self,
+        window: float = WINDOW,
+        max_delay: float = MAX_DELAY,
+        max_messages: int = MAX_MESSAGES,
+        separator: str = " ",
+    ) -> None:
+        self.window = window
+        self.max_delay = max(max_delay, window)
+        self.max_messages = max_messages
+        self.separator = separator
+        self.messages = 0
+        self.merged = 0
+        self.calls = 0
+        self.added_latency = LatencyStats()
+        self._bursts: Dict[Hashable, _Burst] = {}  # chat -> its latest burst
+        self._lock = threading.Lock()
+
+    def submit(
+        self,
+        key: Hashable,
+        message: str,
+        send: Callable[[str], Any],
+        deadline: Deadline = None,
+    ) -> Any:
+        """submit
+
+        Adds a message to the open burst of its chat, or opens one. The caller
+        opening a burst waits for it to end and sends it, the others wait for
+        its reply.
+
+        Args:
+            key (Hashable): Chat the message belongs to, e.g (bot_id, chat_id, channel)
+            message (str): The message
+            send (Callable[[str], Any]): Sends the merged message and returns the reply
+            deadline (Deadline, optional): Time budget of this caller. Defaults to None.
+
+        Raises:
+            DeadlineExceeded: If the reply does not arrive within this caller's deadline
+
+        Returns:
+            Any: The reply to the burst the message was merged into, an error raised
+                by `send` is raised to every caller of the burst
+        """
+        arrived = time.monotonic()
+        with self._lock:
+            self.messages += 1
+            burst = self._bursts.get(key)
+            leader = burst is None or burst.closed
+            if leader:
+                burst = self._bursts[key] = _Burst(self._lock, previous=burst)
+            else:
+                self.merged += 1
+                burst.grown.notify()
+            burst.messages.append(message)
+            burst.arrivals.append(arrived)
+        if not leader:
+            if not burst.done.wait(self._timeout(deadline)):
+                raise DeadlineExceeded(f"chat exceeded its {deadline.budget:g}s budget")
+            return self._outcome(burst)
+
+        with self._lock:
+            while len(burst.messages) < self.max_messages:
+                quiet = min(burst.arrivals[-1] + self.window, arrived + self.max_delay)
+                if deadline is not None:
+                    quiet = min(quiet, deadline.expires_at)
+                remaining = quiet - time.monotonic()
+                if remaining <= 0:
+                    break
+                burst.grown.wait(remaining)
+            burst.closed = True
+        if burst.previous is not None:
+            # keep the chat's bursts in order, the burst is sent under this caller's deadline
+            if not burst.previous.done.wait(self._timeout(deadline)):
+                burst.error = DeadlineExceeded(
+                    f"chat exceeded its {deadline.budget:g}s budget waiting for the previous burst"
+                )
+                self._finish(key, burst)
+                return self._outcome(burst)
+            burst.previous = None
+
+        sent = time.monotonic()
+        with self._lock:
+            self.calls += 1
+        for arrival in burst.arrivals:
+            self.added_latency.observe(sent - arrival)
+        try:
+            burst.result = send(self.separator.join(burst.messages))
+        except BaseException as error:
+            burst.error = error
+        finally:
+            self._finish(key, burst)
+        return self._outcome(burst)
+
+    def _finish(self, key: Hashable, burst: _Burst) -> None:
+        with self._lock:
+            if self._bursts.get(key) is burst:
+                del self._bursts[key]  # no burst of the chat queued behind it
+        burst.done.set()
+
+    @staticmethod
+    def _timeout(deadline: Optional[Deadline]) -> Optional[float]:
+        return None if deadline is None else max(deadline.remaining(), 0)
+
+    @staticmethod
+    def _outcome(burst: _Burst) -> Any:
+        if burst.error is not None:
+            raise burst.error
+        return burst.result
+
+    def stats(self) -> Dict[str, Any]:
+        """Messages, calls made, merge rate and the latency waiting for a burst added to messages"""
+        stats = {
+            "messages": self.messages,
+            "calls": self.calls,
+            "merged": self.merged,
+            "merge_rate": round(self.merged / max(self.messages, 1), 4),
+        }
+        stats.update(self.added_latency.summary())
+        return stats
@@ -0,0 +1,81 @@
+"""Per call time budgets
+
+A `Deadline` is a point in time a call must finish by. It is carried
+through every attempt of a request (retries included) and turned into
+connect and read timeouts from whatever budget is left, so a caller that
+has to answer a WhatsApp user within a few seconds is never held up by the
+fixed 120 seconds transport timeout.
+
+Examples:
+
+>>> from sarufi import Sarufi
+>>> from sarufi.deadline import Deadline
+>>> sarufi = Sarufi(api_key="YOUR_API_KEY", retries=2)
+>>> sarufi.chat(bot_id=5, chat_id="255700000000", message="Hello", timeout_budget=4)
+>>> deadline = Deadline(5)  # one budget shared by several calls
+>>> state = sarufi.chat_status(bot_id=5, chat_id="255700000000", deadline=deadline)
+>>> reply = sarufi.chat(bot_id=5, chat_id="255700000000", message="1", deadline=deadline)
+"""
+from __future__ import annotations
+import time
+from typing import Optional, Tuple
+
+# seconds a TCP/TLS connect may take at most out of the budget
+CONNECT_TIMEOUT = 3.05
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a call runs out of its time budget"""
+
+
+class Deadline(object):
+    """A monotonic point in time a call has to finish by
+
+    Args:
+        budget (float): Seconds from now
+    """
+
+    def __init__(self, budget: float) -> None:
+        self.budget = budget
+        self.expires_at = time.monotonic() + budget
+
+    @classmethod
+    def resolve(
+        cls, deadline: Optional[Deadline] = None, timeout_budget: Optional[float] = None
+    ) -> Optional[Deadline]:
+        """The deadline of a call given either a shared deadline or a budget in seconds"""
+        if deadline is not None:
+            return deadline
+        if timeout_budget is not None:
+            return cls(timeout_budget)
+        return None
+
+    def remaining(self) -> float:
+        """Seconds left, negative once expired"""
+        return self.expires_at - time.monotonic()
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def check(self, what: str = "request") -> float:
+        """Returns the seconds left, raising DeadlineExceeded when there are none"""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"{what} exceeded its {self.budget:g}s budget")
+        return remaining
+
+    def timeouts(self, what: str = "request") -> Tuple[float, float]:
+        """(connect, read) timeouts for the next attempt, out of the remaining budget
+
+        The connect timeout is capped at a third of what is left, the read
+        timeout gets the whole remainder since connects on a pooled
+        connection are free. A slow fresh connect can therefore overrun the
+        deadline by up to the connect timeout, and since read timeouts bound
+        the wait between bytes, so can a response that trickles in.
+        """
+        remaining = self.check(what)
+        return min(CONNECT_TIMEOUT, remaining / 3), remaining
+
+    def __repr__(self) -> str:
+        return f"Deadline(remaining={self.remaining():.3f}s)"
@@ -0,0 +1,249 @@
+"""Routing requests over several base URLs with failover
+
+`Endpoints` replaces the single `Sarufi._BASE_URL` with a set of base URLs
+(regional endpoints, a local proxy, a standby deployment). Every request
+attempt goes to one endpoint:
+
+- "latency" policy (default): the healthy endpoint with the lowest moving
+  average (EWMA) of observed latency divided by its weight. A small share
+  of requests explores the other healthy endpoints so their averages stay
+  current.
+- "ordered" policy: the first healthy endpoint in the order given, the
+  others are standbys.
+
+An attempt that fails to connect marks its endpoint down for `cooldown`
+seconds and is sent to the next endpoint right away. With `check_interval`
+a background thread sends a GET to `health_path` on every endpoint, any
+answer marks it up again and no answer marks it down; without health
+checks a down endpoint is tried again once its cooldown has passed.
+
+Examples:
+
+>>> from sarufi import Sarufi, Endpoints
+>>> endpoints = Endpoints(
+...     {"https://eu.example.com/": 2, "https://developers.sarufi.io/": 1},
+...     check_interval=10,
+... )
+>>> sarufi = Sarufi(api_key="YOUR_API_KEY", endpoints=endpoints)
+>>> endpoints.stats()["https://eu.example.com/"]
+{'weight': 2, 'healthy': True, 'ewma': 0.081, 'requests': 940, 'errors': 2, 'failovers': 0, ...}
+"""
+from __future__ import annotations
+import time
+import random
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Union
+
+from .stats import LatencyStats
+
+logger = logging.getLogger(__name__)
+
+POLICIES = ("latency", "ordered")
+ALPHA = 0.2
+EXPLORE = 0.05
+COOLDOWN = 5.0
+CHECK_TIMEOUT = (3.05, 5)
+
+
+class Endpoint(object):
+    """One base URL with its health and latency statistics"""
+
+    def __init__(self, url: str, weight: float) -> None:
+        self.url = url if url.endswith("/") else url + "/"
+        self.weight = weight
+        self.ewma: Optional[float] = None
+        self.down_until = 0.0
+        self.requests = 0
+        self.errors = 0
+        self.failovers = 0
+        self.checks = 0
+        self.failed_checks = 0
+        self.latency = LatencyStats()
+
+    def healthy(self, now: float) -> bool:
+        return self.down_until <= now
+
+    def score(self) -> float:
+        # endpoints without samples yet go first so every endpoint gets measured
+        return 0.0 if self.ewma is None else self.ewma / self.weight
+
+
+class Endpoints(object):
+    """Set of base URLs requests are routed over
+
+    Args:
+        urls (Union[Sequence[str], Mapping[str, float]]): Base URLs in order of preference, or
+            base URL -> weight (higher weights take more traffic)
+        policy (str, optional): "latency" or "ordered". Defaults to "latency".
+        alpha (float, optional): Weight of a new sample in the latency EWMA. Defaults to 0.2.
+        explore (float, optional): Share of requests sent to a random other healthy endpoint
+            under the "latency" policy. Defaults to 0.05.
+        cooldown (float, optional): Seconds an endpoint that failed to connect is skipped. Defaults to 5.
+        check_interval (float, optional): Seconds between health checks, None disables them. Defaults to None.
+        health_path (str, optional): Path requested by health checks. Defaults to "" (the base URL).
+    """
+
+    def __init__(
+        self,
+        urls: Union[Sequence[str], Mapping[str, float]],
+        policy: str = "latency",
+        alpha: float = ALPHA,
+        explore: float = EXPLORE,
+        cooldown: float = COOLDOWN,
+        check_interval: Optional[float] = None,
+        health_path: str = "",
+    ) -> None:
+        if policy not in POLICIES:
+            raise ValueError(f"policy must be one of {POLICIES}, got {policy!r}")
+        weights = dict(urls) if isinstance(urls, Mapping) else {url: 1.0 for url in urls}
+        if not weights:
+            raise ValueError("at least one base URL is required")
+        self.endpoints: List[Endpoint] = [Endpoint(url, weight) for url, weight in weights.items()]
+        self.policy = policy
+        self.alpha = alpha
+        self.explore = explore
+        self.cooldown = cooldown
+        self.check_interval = check_interval
+        self.health_path = health_path
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._checker: Optional[threading.Thread] = None
+
+    @property
+    def primary(self) -> str:
+        """First base URL, clients build request URLs on it before they are routed"""
+        return self.endpoints[0].url
+
+    def start(self, transport) -> Endpoints:
+        """Starts the health checks (if enabled) through `transport`, once"""
+        with self._lock:
+            if self._checker is not None or not self.check_interval:
+                return self
+            self._checker = threading.Thread(
+                target=self._check_loop, args=(transport,), name="sarufi-endpoints", daemon=True
+            )
+        self._checker.start()
+        return self
+
+    def ranked(self) -> List[Endpoint]:
+        """Endpoints in the order an attempt tries them, down ones last"""
+        now = time.monotonic()
+        healthy = [endpoint for endpoint in self.endpoints if endpoint.healthy(now)]
+        down = sorted(
+            (endpoint for endpoint in self.endpoints if not endpoint.healthy(now)),
+            key=lambda endpoint: endpoint.down_until,
+        )
+        if self.policy == "latency" and len(healthy) > 1:
+            healthy.sort(key=Endpoint.score)
+            if random.random() < self.explore:
+                healthy.insert(0, healthy.pop(random.randrange(1, len(healthy))))
+        return healthy + down
+
+    def send(
+        self, path: str, send: Callable[[str], Any], connect_failed: Callable[[Exception], bool]
+    ):
+        """send
+
+        Sends one attempt, failing over to the next endpoint when it cannot connect
+
+        Args:
+            path (str): URL relative to the base URL
+            send (Callable[[str], Any]): Sends the request to a full URL and returns the response
+            connect_failed (Callable[[Exception], bool]): Whether an error happened while
+                connecting, only those fail over. Any other error may come after the endpoint
+                received the request, it is raised without resending or marking the endpoint down
+
+        Returns:
+            The response of the first endpoint that answered
+        """
+        error: Optional[Exception] = None
+        for endpoint in self.ranked():
+            started = time.perf_counter()
+            try:
+                response = send(endpoint.url + path)
+            except Exception as exception:
+                self._observe(endpoint, time.perf_counter() - started, error=True)
+                if not connect_failed(exception):
+                    raise
+                with self._lock:
+                    endpoint.failovers += 1
+                self._mark_down(endpoint, exception)
+                error = exception
+                continue
+            self._observe(
+                endpoint, time.perf_counter() - started, error=response.status_code >= 500
+            )
+            return response
+        raise error
+
+    def _observe(self, endpoint: Endpoint, seconds: float, error: bool) -> None:
+        endpoint.latency.observe(seconds, error=error)
+        with self._lock:
+            endpoint.requests += 1
+            endpoint.errors += error
+            if not error:
+                endpoint.ewma = (
+                    seconds
+                    if endpoint.ewma is None
+                    else self.alpha * seconds + (1 - self.alpha) * endpoint.ewma
+                )
+
+    def _mark_down(self, endpoint: Endpoint, reason: Any) -> None:
+        with self._lock:
+            was_healthy = endpoint.healthy(time.monotonic())
+            endpoint.down_until = time.monotonic() + self.cooldown
+        if was_healthy:
+            logger.warning(f"Endpoint {endpoint.url} is down: {reason!r}")
+
+    def _mark_up(self, endpoint: Endpoint) -> None:
+        with self._lock:
+            was_down = not endpoint.healthy(time.monotonic())
+            endpoint.down_until = 0.0
+        if was_down:
+            logger.info(f"Endpoint {endpoint.url} is up again")
+
+    def check(self, transport) -> None:
+        """Health checks every endpoint once"""
+        for endpoint in self.endpoints:
+            with self._lock:
+                endpoint.checks += 1
+            try:
+                transport.request(
+                    "GET", endpoint.url + self.health_path, headers={}, timeout=CHECK_TIMEOUT
+                )
+            except Exception as error:
+                with self._lock:
+                    endpoint.failed_checks += 1
+                self._mark_down(endpoint, error)
+            else:
+                self._mark_up(endpoint)
+
+    def _check_loop(self, transport) -> None:
+        while not self._closed.wait(self.check_interval):
+            self.check(transport)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Health, latency EWMA, counters and latency summary per endpoint"""
+        now = time.monotonic()
+        stats = {}
+        for endpoint in self.endpoints:
+            entry = {
+                "weight": endpoint.weight,
+                "healthy": endpoint.healthy(now),
+                "ewma": None if endpoint.ewma is None else round(endpoint.ewma, 6),
+                "requests": endpoint.requests,
+                "errors": endpoint.errors,
+                "failovers": endpoint.failovers,
+                "checks": endpoint.checks,
+                "failed_checks": endpoint.failed_checks,
+            }
+            entry.update(endpoint.latency.summary())
+            stats[endpoint.url] = entry
+        return stats
+
+    def close(self) -> None:
+        """Stops the health checks"""
+        self._closed.set()
+        if self._checker is not None:
+            self._checker.join()
@@ -0,0 +1,44 @@
+"""Loading of intents, flow and metadata files (JSON or YAML)"""
+from __future__ import annotations
+import os
+import json
+import logging
+from pathlib import Path
+from typing import Any, Dict, Union
+
+logger = logging.getLogger(__name__)
+
+
+def read_file(_file: Union[Path, str]) -> Dict[Any, Any]:
+    """read_file
+        Reads a file and returns the contents as a dict
+    Args:
+        _file (Union[Path, str]): File to read(path or filename) | (intents, flows)
+
+    Raises:
+        FileNotFoundError: If file is not found
+
+    Returns:
+        Dict[Any, Any]: Contents of the file as a dict
+    """
+    # Get full path of file
+    _file = os.path.realpath(_file)
+    if os.path.exists(_file):
+        try:
+            if any([_file.endswith(ext) for ext in [".yaml", ".yml"]]):
+                from yaml import safe_load
+
+                logger.info(f"Reading {_file} as YAML")
+                with open(_file, encoding="utf-8") as stream:
+                    return safe_load(stream)
+            elif _file.endswith(".json"):
+                logger.info(f"Reading {_file} as JSON")
+                with open(_file, encoding="utf-8") as stream:
+                    return json.load(stream)
+            else:
+                raise FileNotFoundError(f"{_file} is not a valid file")
+        except Exception as error:
+            logger.error(error)
+            logger.error("Could not read file")
+            return None
+    raise FileNotFoundError(f"File {_file} not found")
@@ -0,0 +1,208 @@
+"""Hedged requests for idempotent reads
+
+A `Hedger` cuts tail latency of idempotent reads (`get_bot`,
+`chat_status`). It sends the request, and if no response has arrived once
+the observed latency percentile of that endpoint has passed, it sends a
+duplicate and returns whichever answers first. The loser is abandoned: a
+request already on the wire cannot be recalled, so its response is simply
+dropped when it arrives. Hedging starts once an endpoint has enough latency
+samples, and with the default 95th percentile at most about 5% of calls
+are duplicated.
+
+Until then calls run on the caller's thread. Once an endpoint is hedged
+the primary request runs on a thread of its own, so any number of hedged
+reads run at once, and only the duplicates share a bounded pool; a
+duplicate that would have to wait for a pool thread is not sent. Latency
+is timed from when a request starts running.
+
+Examples:
+
+>>> from sarufi import Sarufi
+>>> from sarufi.hedging import Hedger
+>>> hedger = Hedger(percentile=95)
+>>> sarufi = Sarufi(api_key="YOUR_API_KEY", hedger=hedger)
+>>> sarufi.chat_status(bot_id=5, chat_id="255700000000")
+>>> hedger.stats()["chat_status"]
+{'calls': 1200, 'hedged': 61, 'hedge_wins': 38, 'hedge_rate': 0.0508, 'delay': 0.183, ...}
+"""
+from __future__ import annotations
+import time
+import threading
+from contextvars import copy_context
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional
+
+from .deadline import Deadline, DeadlineExceeded
+from .stats import LatencyStats
+
+
+class _Endpoint(object):
+    def __init__(self) -> None:
+        self.latency = LatencyStats()
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.skipped = 0
+        self.delay: Optional[float] = None
+
+
+class Hedger(object):
+    """Sends a duplicate of slow idempotent requests and keeps the first response
+
+    Args:
+        percentile (float, optional): Latency percentile after which a duplicate is sent. Defaults to 95.
+        min_samples (int, optional): Samples an endpoint needs before it is hedged. Defaults to 20.
+        min_delay (float, optional): Shortest wait before hedging, in seconds. Defaults to 0.005.
+        max_workers (int, optional): Duplicate requests in flight at most. Defaults to 16.
+        refresh_every (int, optional): Samples between recomputing the hedge delay. Defaults to 16.
+    """
+
+    def __init__(
+        self,
+        percentile: float = 95,
+        min_samples: int = 20,
+        min_delay: float = 0.005,
+        max_workers: int = 16,
+        refresh_every: int = 16,
+    ) -> None:
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.refresh_every = refresh_every
+        self.max_workers = max_workers
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="sarufi-hedge"
+        )
+        self._hedges_running = 0
+        self._endpoints: Dict[str, _Endpoint] = {}
+        self._lock = threading.Lock()
+
+    def _endpoint(self, key: str) -> _Endpoint:
+        endpoint = self._endpoints.get(key)
+        if endpoint is None:
+            with self._lock:
+                endpoint = self._endpoints.setdefault(key, _Endpoint())
+        return endpoint
+
+    def _observe(self, endpoint: _Endpoint, seconds: float, error: bool) -> None:
+        endpoint.latency.observe(seconds, error=error)
+        count = endpoint.latency.count
+        if count >= self.min_samples and (
+            endpoint.delay is None or count % self.refresh_every == 0
+        ):
+            delay = endpoint.latency.percentiles((self.percentile,))[f"p{self.percentile:g}"]
+            endpoint.delay = max(delay, self.min_delay)
+
+    def call(self, key: str, func: Callable[[], Any], deadline: Deadline = None) -> Any:
+        """call
+
+        Runs `func`, hedging it with a second call when it is slower than usual
+
+        Args:
+            key (str): Endpoint name the latency statistics are kept under
+            func (Callable[[], Any]): The idempotent request, may be called twice
+            deadline (Deadline, optional): Time budget of the call. Defaults to None.
+
+        Raises:
+            DeadlineExceeded: If neither request answers within the deadline
+
+        Returns:
+            Any: The first successful result (the first error when both fail)
+        """
+        endpoint = self._endpoint(key)
+        with self._lock:
+            endpoint.calls += 1
+
+        def timed() -> Any:
+            started = time.perf_counter()
+            try:
+                result = func()
+            except Exception:
+                self._observe(endpoint, time.perf_counter() - started, error=True)
+                raise
+            self._observe(endpoint, time.perf_counter() - started, error=False)
+            return result
+
+        delay = endpoint.delay
+        if delay is None:
+            return timed()  # not hedged yet, nothing to wait for in parallel
+
+        primary: Future = Future()
+        threading.Thread(
+            target=copy_context().run,
+            args=(self._run, primary, timed),
+            name="sarufi-hedge-primary",
+            daemon=True,
+        ).start()
+        futures = {primary}
+        if deadline is not None:
+            delay = min(delay, max(deadline.remaining(), 0))
+        if not wait(futures, timeout=delay).done:
+            hedge = self._hedge(func)
+            with self._lock:
+                if hedge is None:
+                    endpoint.skipped += 1
+                else:
+                    endpoint.hedged += 1
+            if hedge is not None:
+                futures.add(hedge)
+
+        error: Optional[BaseException] = None
+        while futures:
+            timeout = None if deadline is None else max(deadline.remaining(), 0)
+            done, futures = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                raise DeadlineExceeded(f"{key} exceeded its {deadline.budget:g}s budget")
+            for future in done:
+                if future.exception() is None:
+                    if future is not primary:
+                        with self._lock:
+                            endpoint.hedge_wins += 1
+                    for loser in futures:
+                        loser.cancel()
+                    return future.result()
+                error = error or future.exception()
+        raise error
+
+    @staticmethod
+    def _run(future: Future, func: Callable[[], Any]) -> None:
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(func())
+        except BaseException as error:
+            future.set_exception(error)
+
+    def _hedge(self, func: Callable[[], Any]) -> Optional[Future]:
+        """Sends the duplicate on the pool, None when every pool thread is busy"""
+        with self._lock:
+            if self._hedges_running >= self.max_workers:
+                return None
+            self._hedges_running += 1
+
+        def finished(_future: Future) -> None:
+            with self._lock:
+                self._hedges_running -= 1
+
+        future = self._pool.submit(copy_context().run, func)
+        future.add_done_callback(finished)  # runs on cancellation too
+        return future
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """Hedge counters and latency summary per endpoint"""
+        stats = {}
+        for key, endpoint in list(self._endpoints.items()):
+            entry = {
+                "calls": endpoint.calls,
+                "hedged": endpoint.hedged,
+                "hedge_wins": endpoint.hedge_wins,
+                "skipped": endpoint.skipped,
+                "hedge_rate": round(endpoint.hedged / max(endpoint.calls, 1), 4),
+                "delay": endpoint.delay,
+            }
+            entry.update(endpoint.latency.summary())
+            stats[key] = entry
+        return stats
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False)
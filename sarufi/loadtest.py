@@ -0,0 +1,325 @@
+"""Load generator replaying conversations against a bot
+
+Runs N concurrent virtual users through `chat`, each one replaying whole
+conversations (lists of messages), and reports throughput, latency
+percentiles and errors broken down by the conversation state the user was
+in when sending the message.
+
+Conversations come from a script file, a JSON list of message lists (or a
+dict of user -> messages), or are generated as random walks over the bot's
+intents and flow.
+
+    python -m sarufi.loadtest --api-key KEY --bot-id 5 --script conversations.json --users 50
+    python -m sarufi.loadtest --api-key KEY --bot-id 5 --random-walk 1000 --users 50
+
+Offline, against the local stand-in server:
+
+    python -m sarufi.loadtest --standin --intents intents.json --flow flow.json --random-walk 500
+"""
+from __future__ import annotations
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from uuid import uuid4
+from collections import Counter, defaultdict
+from typing import Any, Dict, Iterable, List, Optional
+
+from .stats import LatencyStats
+from .validation import END_STATE
+
+START_STATE = "start"
+
+
+def random_walks(
+    intents: Dict[str, List[str]],
+    flow: Dict[str, Any],
+    count: int,
+    max_turns: int = 10,
+    seed: Optional[int] = None,
+) -> List[List[str]]:
+    """random_walks
+
+    Generates conversations by walking the flow from random intents, picking
+    random utterances and random options of choice states
+
+    Args:
+        intents (Dict[str, List[str]]): Bot intents
+        flow (Dict[str, Any]): Bot flow
+        count (int): Number of conversations
+        max_turns (int, optional): Messages per conversation at most. Defaults to 10.
+        seed (int, optional): Random seed for repeatable runs. Defaults to None.
+
+    Returns:
+        List[List[str]]: Conversations as lists of messages
+    """
+    rng = random.Random(seed)
+    entry = [intent for intent, utterances in intents.items() if utterances and intent in flow]
+    if not entry:
+        raise ValueError("no intent with utterances has a flow state to start from")
+    every_utterance = [u for utterances in intents.values() for u in utterances]
+
+    conversations = []
+    for _ in range(count):
+        intent = rng.choice(entry)
+        messages = [rng.choice(intents[intent])]
+        state = (flow.get(intent) or {}).get("next_state", END_STATE)
+        while state != END_STATE and state in flow and len(messages) < max_turns:
+            if state.startswith("choice_"):
+                options = [option for option, target in flow[state].items() if isinstance(target, str)]
+                if not options:
+                    break
+                option = rng.choice(options)
+                messages.append(option)
+                state = flow[state][option]
+            else:
+                messages.append(rng.choice(every_utterance))
+            state = (flow.get(state) or {}).get("next_state", END_STATE)
+        conversations.append(messages)
+    return conversations
+
+
+def load_script(path: str) -> List[List[str]]:
+    """Reads conversations from a JSON file, a list of message lists or a dict user -> messages"""
+    with open(path, encoding="utf-8") as stream:
+        script = json.load(stream)
+    if isinstance(script, dict):
+        script = list(script.values())
+    if not all(isinstance(messages, list) for messages in script):
+        raise ValueError(f"{path} must hold a list of message lists or a dict of user -> messages")
+    return script
+
+
+class LoadReport(object):
+    """Results of a load run"""
+
+    def __init__(self) -> None:
+        self.latency = LatencyStats(window=1_000_000)
+        self.states: Dict[str, LatencyStats] = defaultdict(lambda: LatencyStats(window=100_000))
+        self.errors: Dict[str, Counter] = defaultdict(Counter)
+        self.conversations = 0
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, state: str, seconds: float, error: Optional[str]) -> None:
+        self.latency.observe(seconds, error=error is not None)
+        with self._lock:
+            stats = self.states[state]
+            if error is not None:
+                self.errors[state][error] += 1
+        stats.observe(seconds, error=error is not None)
+
+    def to_dict(self) -> Dict[str, Any]:
+        summary = self.latency.summary()
+        return {
+            "conversations": self.conversations,
+            "messages": summary["count"],
+            "elapsed": self.elapsed,
+            "throughput": summary["count"] / self.elapsed if self.elapsed else 0.0,
+            "latency": summary,
+            "states": {
+                state: dict(stats.summary(), errors_by_kind=dict(self.errors.get(state, {})))
+                for state, stats in sorted(self.states.items())
+            },
+        }
+
+    def __str__(self) -> str:
+        report = self.to_dict()
+        latency = report["latency"]
+        lines = [
+            f"{report['conversations']} conversations, {report['messages']} messages "
+            f"in {report['elapsed']:.1f}s ({report['throughput']:.1f} msg/s), "
+            f"errors {latency['errors']}",
+            "latency ms: p50 {:.1f}  p95 {:.1f}  p99 {:.1f}  max {:.1f}".format(
+                *(latency[key] * 1000 for key in ("p50", "p95", "p99", "max"))
+            ),
+            f"{'state':<32}{'messages':>10}{'errors':>8}{'p50 ms':>9}{'p99 ms':>9}  error kinds",
+        ]
+        for state, stats in report["states"].items():
+            kinds = ", ".join(f"{kind} x{n}" for kind, n in stats["errors_by_kind"].items())
+            lines.append(
+                f"{state:<32}{stats['count']:>10}{stats['errors']:>8}"
+                f"{stats['p50'] * 1000:>9.1f}{stats['p99'] * 1000:>9.1f}  {kinds}"
+            )
+        return "\n".join(lines)
+
+
+def run_load(
+    client,
+    bot_id: int,
+    conversations: Iterable[List[str]],
+    users: int = 10,
+    duration: Optional[float] = None,
+    channel: str = "general",
+) -> LoadReport:
+    """run_load
+
+    Replays conversations through `client.chat` with concurrent virtual users
+
+    Args:
+        client (Sarufi): Client used to send the messages
+        bot_id (int): Bot to talk to
+        conversations (Iterable[List[str]]): Conversations to replay, each one with a fresh chat_id
+        users (int, optional): Concurrent virtual users. Defaults to 10.
+        duration (float, optional): Seconds to run, cycling through the conversations.
+            Runs every conversation once when None. Defaults to None.
+        channel (str, optional): Channel to send on. Defaults to "general".
+
+    Returns:
+        LoadReport: Throughput, latency and errors per state
+    """
+    report = LoadReport()
+    conversations = list(conversations)
+    if not conversations:
+        return report
+    lock = threading.Lock()
+    position = iter(range(sys.maxsize))
+    started = time.perf_counter()
+
+    def next_conversation() -> Optional[List[str]]:
+        with lock:
+            index = next(position)
+        if duration is None:
+            return conversations[index] if index < len(conversations) else None
+        if time.perf_counter() - started >= duration:
+            return None
+        return conversations[index % len(conversations)]
+
+    def virtual_user() -> None:
+        while True:
+            messages = next_conversation()
+            if messages is None:
+                return
+            chat_id = str(uuid4())
+            state = START_STATE
+            for message in messages:
+                sent = time.perf_counter()
+                error = None
+                try:
+                    # through the public call, so a coalescer, outbox, endpoints or
+                    # variants configured on the client are part of what is measured
+                    response = client.chat(
+                        bot_id=bot_id,
+                        chat_id=chat_id,
+                        message=message,
+                        message_type="text",
+                        channel=channel,
+                    )
+                    if not isinstance(response, dict):
+                        error = "invalid response"
+                    elif response.get("queued") is True:
+                        error = "queued"  # held by the outbox, there is no reply to go on from
+                    elif "message" not in response:
+                        error = "error response"
+                    else:
+                        next_state = response.get("next_state")
+                except Exception as exception:
+                    error = type(exception).__name__
+                report.observe(state, time.perf_counter() - sent, error)
+                if error is not None:
+                    break
+                state = next_state or END_STATE
+            with lock:
+                report.conversations += 1
+
+    threads = [
+        threading.Thread(target=virtual_user, name=f"sarufi-vu-{i}", daemon=True)
+        for i in range(users)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    report.elapsed = time.perf_counter() - started
+    return report
+
+
+def _read_json(path: Optional[str]) -> Optional[Dict[str, Any]]:
+    if not path:
+        return None
+    from .files import read_file
+
+    return read_file(path)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m sarufi.loadtest", description="Replay conversations against a Sarufi bot"
+    )
+    parser.add_argument("--api-key", default=os.environ.get("SARUFI_API_KEY"))
+    parser.add_argument("--bot-id", type=int)
+    parser.add_argument("--base-url", help="API base URL, e.g a local stand-in")
+    parser.add_argument("--script", help="JSON file with the conversations to replay")
+    parser.add_argument("--random-walk", type=int, metavar="N", help="generate N conversations from the flow")
+    parser.add_argument("--intents", help="intents file for random walks / the stand-in bot")
+    parser.add_argument("--flow", help="flow file for random walks / the stand-in bot")
+    parser.add_argument("--max-turns", type=int, default=10)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--users", type=int, default=10, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, help="seconds to run, cycling the conversations")
+    parser.add_argument("--channel", default="general")
+    parser.add_argument("--http2", action="store_true", help="use the HTTP/2 transport")
+    parser.add_argument("--standin", action="store_true", help="run against a local stand-in server")
+    parser.add_argument("--latency", type=float, default=0.0, help="stand-in response delay in seconds")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    from .client import Sarufi
+    from .transport import HTTP2Transport, Transport
+
+    if not args.script and not args.random_walk:
+        parser.error("one of --script or --random-walk is required")
+
+    transport = HTTP2Transport() if args.http2 else Transport(pool_maxsize=args.users)
+    client = Sarufi(api_key=args.api_key or "standin", transport=transport)
+    intents, flow = _read_json(args.intents), _read_json(args.flow)
+
+    server = None
+    if args.standin:
+        from .standin import StandinServer
+
+        if intents is None or flow is None:
+            parser.error("--standin needs --intents and --flow to create the bot")
+        server = StandinServer(latency=args.latency).start()
+        client._BASE_URL = server.url
+        args.bot_id = client.create_bot(name="loadtest", intents=intents, flow=flow).id
+    elif args.base_url:
+        client._BASE_URL = args.base_url if args.base_url.endswith("/") else args.base_url + "/"
+    if not args.api_key and not args.standin:
+        parser.error("--api-key (or SARUFI_API_KEY) is required")
+    if args.bot_id is None:
+        parser.error("--bot-id is required")
+
+    if args.script:
+        conversations = load_script(args.script)
+    else:
+        if intents is None or flow is None:
+            bot = client.get_bot(args.bot_id)
+            if isinstance(bot, dict):
+                print(f"Could not fetch bot {args.bot_id}: {bot}", file=sys.stderr)
+                return 1
+            intents, flow = intents or bot.intents, flow or bot.flow
+        conversations = random_walks(intents, flow, args.random_walk, args.max_turns, args.seed)
+
+    try:
+        report = run_load(
+            client,
+            args.bot_id,
+            conversations,
+            users=args.users,
+            duration=args.duration,
+            channel=args.channel,
+        )
+    finally:
+        if server is not None:
+            server.stop()
+        transport.close()
+    print(json.dumps(report.to_dict(), indent=2) if args.json else report)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
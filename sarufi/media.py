@@ -0,0 +1,178 @@
+"""Streaming multipart bodies for media messages
+
+`MultipartUpload` encodes chat fields and one media part as
+`multipart/form-data` lazily, reading the media in chunks from a path, a
+binary file object, bytes or an iterator of byte chunks. Nothing is base64
+encoded and the media is never held in memory as a whole. When the size is
+known up front (paths, seekable files, bytes) the body is sent with a
+Content-Length, otherwise with chunked transfer encoding.
+
+A streamed body can be sent once only, so media uploads are not retried.
+
+Examples:
+
+>>> import threading
+>>> from sarufi import Sarufi
+>>> sarufi = Sarufi(api_key="YOUR_API_KEY")
+>>> cancel = threading.Event()
+>>> sarufi.send_media(
+...     bot_id=5,
+...     chat_id="255700000000",
+...     media="receipt.jpg",
+...     message_type="image",
+...     progress=lambda sent, total: print(f"{sent}/{total}"),
+...     cancel=cancel,
+... )
+"""
+from __future__ import annotations
+import os
+import mimetypes
+import threading
+from uuid import uuid4
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, Iterable, Iterator, Optional, Union
+
+CHUNK_SIZE = 64 * 1024
+
+MediaSource = Union[Path, str, bytes, bytearray, IO[bytes], Iterable[bytes]]
+
+
+class UploadCancelled(Exception):
+    """Raised from inside a media upload when its cancel event is set"""
+
+
+def _remaining_size(stream: IO[bytes]) -> Optional[int]:
+    """Bytes left to read in a binary file object, None when it cannot tell"""
+    try:
+        if not stream.seekable():
+            return None
+        position = stream.tell()
+        end = stream.seek(0, os.SEEK_END)
+        stream.seek(position)
+        return end - position
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+class MultipartUpload(object):
+    """Lazily encoded `multipart/form-data` body with one media part
+
+    Iterate over it to get the body chunk by chunk. `len()` works when the
+    size is known, which is how `requests` decides between a Content-Length
+    and chunked transfer encoding.
+
+    Args:
+        fields (Dict[str, Any]): Form fields sent before the media, None values are left out
+        media (MediaSource): Path, bytes, binary file object or iterator of byte chunks
+        filename (str, optional): File name sent with the media. Defaults to the path name or "media".
+        content_type (str, optional): Media type of the file. Defaults to a guess from the file name.
+        field_name (str, optional): Form field of the media part. Defaults to "media".
+        chunk_size (int, optional): Bytes read per chunk. Defaults to 64 KiB.
+        progress (Callable[[int, Optional[int]], None], optional): Called with (media bytes sent,
+            total media bytes or None) after each chunk. Defaults to None.
+        cancel (threading.Event, optional): Set it to abort the upload with `UploadCancelled`. Defaults to None.
+    """
+
+    def __init__(
+        self,
+        fields: Dict[str, Any],
+        media: MediaSource,
+        filename: str = None,
+        content_type: str = None,
+        field_name: str = "media",
+        chunk_size: int = CHUNK_SIZE,
+        progress: Callable[[int, Optional[int]], None] = None,
+        cancel: threading.Event = None,
+    ) -> None:
+        self.media = media
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.cancel = cancel
+        self.boundary = uuid4().hex
+        self.sent = 0
+        self._consumed = False
+
+        if isinstance(media, (str, Path)):
+            filename = filename or Path(media).name
+            self.media_size = os.path.getsize(media)
+        elif isinstance(media, (bytes, bytearray, memoryview)):
+            self.media_size = len(media)
+        elif hasattr(media, "read"):
+            filename = filename or Path(getattr(media, "name", "") or "media").name
+            self.media_size = _remaining_size(media)
+        else:
+            self.media_size = None
+        self.filename = filename or "media"
+        self.media_type = (
+            content_type
+            or mimetypes.guess_type(self.filename)[0]
+            or "application/octet-stream"
+        )
+
+        head = b"".join(
+            self._part_header(f'name="{name}"') + str(value).encode("utf-8") + b"\r\n"
+            for name, value in fields.items()
+            if value is not None
+        )
+        filename_quoted = self.filename.replace('"', "%22")
+        self._head = head + self._part_header(
+            f'name="{field_name}"; filename="{filename_quoted}"',
+            self.media_type,
+        )
+        self._tail = f"\r\n--{self.boundary}--\r\n".encode("ascii")
+
+    def _part_header(self, disposition: str, content_type: str = None) -> bytes:
+        header = f"--{self.boundary}\r\nContent-Disposition: form-data; {disposition}\r\n"
+        if content_type:
+            header += f"Content-Type: {content_type}\r\n"
+        return (header + "\r\n").encode("utf-8")
+
+    @property
+    def content_type(self) -> str:
+        """Content-Type header of the body, carries the boundary"""
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __bool__(self) -> bool:
+        return True  # an empty looking body would be dropped by requests
+
+    def __len__(self) -> int:
+        if self.media_size is None:
+            raise TypeError("size of a streamed media iterator is unknown")
+        return len(self._head) + self.media_size + len(self._tail)
+
+    @property
+    def size(self) -> Optional[int]:
+        """Body size in bytes, None when the media comes from an iterator"""
+        return None if self.media_size is None else len(self)
+
+    def _chunks(self) -> Iterator[bytes]:
+        media = self.media
+        if isinstance(media, (str, Path)):
+            with open(media, "rb") as stream:
+                yield from iter(lambda: stream.read(self.chunk_size), b"")
+        elif isinstance(media, (bytes, bytearray, memoryview)):
+            view = memoryview(media)
+            for start in range(0, len(view), self.chunk_size):
+                yield bytes(view[start : start + self.chunk_size])
+        elif hasattr(media, "read"):
+            yield from iter(lambda: media.read(self.chunk_size), b"")
+        else:
+            yield from media
+
+    def __iter__(self) -> Iterator[bytes]:
+        if self._consumed:
+            raise RuntimeError("a multipart upload can only be sent once")
+        self._consumed = True
+        yield self._head
+        for chunk in self._chunks():
+            if self.cancel is not None and self.cancel.is_set():
+                raise UploadCancelled(
+                    f"upload of {self.filename} cancelled after {self.sent} bytes"
+                )
+            if not chunk:
+                continue
+            yield bytes(chunk)
+            self.sent += len(chunk)
+            if self.progress is not None:
+                self.progress(self.sent, self.media_size)
+        yield self._tail
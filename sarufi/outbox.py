@@ -0,0 +1,528 @@
+"""Durable outbox for chat messages and state updates sent during outages
+
+With an `Outbox` a `chat` or `update_conversation_state` call that cannot
+reach the API (failed connect, or a 429/502/503/504 answer) is queued on
+disk instead of being lost, and the caller gets a 202 receipt
+(`{"queued": True, "outbox_id": ...}`) rather than an error body. Later
+calls of a chat that still has queued calls are queued behind them, so a
+chat's messages are never reordered. A background drainer replays the
+queue once the API answers again: one call per chat at a time, chats
+taking turns, at most `rate` calls per second, pausing with backoff while
+the API is still unreachable. Replies of replayed chats go to `on_delivered`
+since their callers have long returned.
+
+The queue is an append-only log of segment files in `directory`. Queued
+calls are fsynced before `defer` returns, with concurrent callers sharing
+one fsync, and deliveries are appended as acknowledgements. Segments whose
+calls are all acknowledged are deleted, and calls are refused with
+`OutboxFull` once the log reaches `max_bytes`. Calls rejected by the API
+(4xx), or failing `max_attempts` times, are moved to the `dead.ndjson`
+dead letter file, which is rotated to `dead.ndjson.1` (replacing the
+previous one) once it reaches `max_dead_bytes`, so dead letters use at most
+twice that on disk. Delivery is at least once: a call delivered right before
+a crash is replayed again after it.
+
+Examples:
+
+>>> from sarufi import Sarufi
+>>> from sarufi.outbox import Outbox
+>>> outbox = Outbox("/var/lib/mybot/outbox", rate=20, on_delivered=send_reply)
+>>> sarufi = Sarufi(api_key="YOUR_API_KEY", outbox=outbox)
+>>> sarufi.chat(bot_id=5, chat_id="255700000000", message="salio")  # API down
+{'queued': True, 'outbox_id': 1, 'detail': 'Sarufi is unreachable, the call is queued'}
+>>> outbox.stats()
+{'depth': 1, 'chats': 1, 'bytes': 211, 'oldest_age': 3.2, 'enqueued': 1, 'delivered': 0, ...}
+"""
+from __future__ import annotations
+import os
+import json
+import time
+import heapq
+import logging
+import threading
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from .stats import LatencyStats
+
+logger = logging.getLogger(__name__)
+
+# answers meaning the call did not get through and should be queued and retried later
+OUTAGE_STATUSES = (429, 502, 503, 504)
+MAX_BYTES = 256 * 1024**2
+SEGMENT_BYTES = 4 * 1024**2
+DEAD_LETTERS = "dead.ndjson"
+MAX_DEAD_BYTES = 16 * 1024**2
+# seconds, doubled while the API stays unreachable
+PAUSE = 0.5
+MAX_PAUSE = 30.0
+_THROUGHPUT_WINDOW = 10.0
+
+
+class OutboxFull(Exception):
+    """The outbox reached its disk budget, the call was not queued"""
+
+
+class OutboxEntry(NamedTuple):
+    """A queued call
+
+    Attributes:
+        id (int): Position in the outbox, increasing
+        path (str): API path the call is posted to, e.g "conversation"
+        body (Dict[str, Any]): JSON body of the call
+        ts (float): Time it was queued
+    """
+
+    id: int
+    path: str
+    body: Dict[str, Any]
+    ts: float
+
+
+def _chat_key(body: Dict[str, Any]) -> Tuple[str, str]:
+    return str(body.get("bot_id")), str(body.get("chat_id"))
+
+
+def _segment_name(number: int) -> str:
+    return f"segment-{number:08d}.log"
+
+
+class Outbox(object):
+    """Queues calls on disk while the API is unreachable and replays them in order
+
+    Args:
+        directory (str): Directory of the log segments and dead letters, created if missing
+        rate (float, optional): Calls per second the drainer sends at most. Defaults to 10.
+        max_bytes (int, optional): Disk budget of the log, calls are refused beyond it. Defaults to 256 MiB.
+        max_dead_bytes (int, optional): Size at which the dead letter file is rotated, the
+            rotated file replaces the previous one. Defaults to 16 MiB.
+        segment_bytes (int, optional): Size at which a new segment is started. Defaults to 4 MiB.
+        max_attempts (int, optional): Failed replays (other than outages) before a call is
+            dead-lettered. Defaults to 5.
+        fsync_interval (float, optional): Shortest time between fsyncs, queued calls wait for the
+            next one. Defaults to 0.005.
+        on_delivered (Callable[[OutboxEntry, Any], None], optional): Called with each replayed call
+            and its JSON answer. Defaults to None.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        rate: float = 10.0,
+        max_bytes: int = MAX_BYTES,
+        max_dead_bytes: int = MAX_DEAD_BYTES,
+        segment_bytes: int = SEGMENT_BYTES,
+        max_attempts: int = 5,
+        fsync_interval: float = 0.005,
+        on_delivered: Callable[[OutboxEntry, Any], None] = None,
+    ) -> None:
+        self.directory = directory
+        self.rate = rate
+        self.max_bytes = max_bytes
+        self.max_dead_bytes = max_dead_bytes
+        self.segment_bytes = min(segment_bytes, max_bytes)
+        self.max_attempts = max_attempts
+        self.fsync_interval = fsync_interval
+        self.on_delivered = on_delivered
+        self.enqueued = 0
+        self.delivered = 0
+        self.dead = 0
+        self.rejected = 0
+        self.delay = LatencyStats()  # time from queueing to delivery
+
+        self._lock = threading.Lock()
+        self._work = threading.Condition(self._lock)  # entries became ready
+        self._synced = threading.Condition(self._lock)  # an fsync finished
+        self._dirty = threading.Condition(self._lock)  # records wait for an fsync
+        self._sync_lock = threading.Lock()  # one fsync or rotation at a time
+        self._closed = threading.Event()
+        self._client = None
+        self._threads: List[threading.Thread] = []
+
+        self._chats: Dict[Tuple[str, str], Deque[OutboxEntry]] = {}
+        self._ready: Deque[Tuple[str, str]] = deque()  # chats whose first call can be sent
+        self._delayed: List[Tuple[float, Tuple[str, str]]] = []  # (retry at, chat) heap
+        self._attempts: Dict[int, int] = {}
+        self._segment_of: Dict[int, int] = {}
+        self._segments: Dict[int, List[int]] = {}  # number -> [bytes, queued calls not done]
+        self._deliveries: Deque[float] = deque(maxlen=4096)
+        self._paused_until = 0.0
+        self._written = 0
+        self._synced_upto = 0
+        self._segment = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._next_id = self._recover() + 1
+        # always write to a fresh segment, the last one may end in a torn record
+        self._segment = max(self._segments, default=0) + 1
+        self._segments[self._segment] = [0, 0]
+        self._stream = open(os.path.join(directory, _segment_name(self._segment)), "ab")
+        self._dead_path = os.path.join(directory, DEAD_LETTERS)
+        self._dead_stream = open(self._dead_path, "ab")
+        self._dead_bytes = self._dead_stream.tell()
+        self._spawn(self._flush, "sarufi-outbox-fsync")
+
+    def _recover(self) -> int:
+        """Rebuilds the queue from the segments on disk, returns the largest id seen"""
+        last_id = 0
+        numbers = sorted(
+            int(name[8:-4])
+            for name in os.listdir(self.directory)
+            if name.startswith("segment-") and name.endswith(".log")
+        )
+        queued: Dict[int, OutboxEntry] = {}
+        for number in numbers:
+            path = os.path.join(self.directory, _segment_name(number))
+            self._segments[number] = [os.path.getsize(path), 0]
+            with open(path, "rb") as stream:
+                for line in stream:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # torn last record after a crash
+                    last_id = max(last_id, record["id"])
+                    if record["op"] == "put":
+                        queued[record["id"]] = OutboxEntry(
+                            record["id"], record["path"], record["body"], record["ts"]
+                        )
+                        self._segment_of[record["id"]] = number
+                        self._segments[number][1] += 1
+                    elif queued.pop(record["id"], None) is not None:
+                        self._segments[self._segment_of.pop(record["id"])][1] -= 1
+        with self._lock:
+            for entry in sorted(queued.values()):
+                self._queue(entry)
+        self._compact()
+        if queued:
+            logger.info(f"Outbox {self.directory} recovered {len(queued)} queued calls")
+        return last_id
+
+    def bind(self, client) -> Outbox:
+        """Starts draining through `client`, later calls with other clients are ignored"""
+        with self._lock:
+            if self._client is not None or self._closed.is_set():
+                return self
+            self._client = client
+        self._spawn(self._drain, "sarufi-outbox")
+        return self
+
+    def _spawn(self, target: Callable[[], None], name: str) -> None:
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def holds(self, body: Dict[str, Any]) -> bool:
+        """Whether the chat of a call has queued calls, its new calls must queue behind them"""
+        return _chat_key(body) in self._chats
+
+    def post(self, client, path: str, body: Dict[str, Any], deadline=None):
+        """post
+
+        Posts a call through `client`, queueing it when the API is unreachable
+        or its chat already has queued calls
+
+        Args:
+            client (Sarufi): Client sending the call
+            path (str): API path, e.g "conversation"
+            body (Dict[str, Any]): JSON body
+            deadline (Deadline, optional): Time budget of the call. Defaults to None.
+
+        Returns:
+            The API response, or a 202 `Receipt` when the call was queued
+        """
+        if self.holds(body):
+            return self.defer(path, body)
+        try:
+            response = client._post_req(url=client._BASE_URL + path, body=body, deadline=deadline)
+        except Exception as error:
+            if not client._transport.retryable(error):
+                raise
+            logger.warning(f"Queueing {path} call, Sarufi is unreachable: {error!r}")
+            return self.defer(path, body)
+        if response.status_code in OUTAGE_STATUSES:
+            logger.warning(f"Queueing {path} call after a {response.status_code} answer")
+            return self.defer(path, body)
+        return response
+
+    def defer(self, path: str, body: Dict[str, Any]) -> Receipt:
+        """defer
+
+        Queues a call durably: it is on disk when this returns
+
+        Args:
+            path (str): API path, e.g "conversation"
+            body (Dict[str, Any]): JSON body
+
+        Raises:
+            OutboxFull: If the log reached `max_bytes`
+            RuntimeError: If the outbox is closed
+
+        Returns:
+            Receipt: 202 response-like receipt of the queued call
+        """
+        with self._lock:
+            if self._closed.is_set():
+                raise RuntimeError(f"outbox {self.directory} is closed, the call was not queued")
+            entry = OutboxEntry(self._next_id, path, body, round(time.time(), 6))
+            line = self._encode({"op": "put", **entry._asdict()})
+            if self._bytes() + len(line) > self.max_bytes:
+                self.rejected += 1
+                raise OutboxFull(f"outbox {self.directory} is full ({self.max_bytes} bytes)")
+            self._next_id += 1
+            self._write(line)
+            self._segment_of[entry.id] = self._segment
+            self._segments[self._segment][1] += 1
+            self.enqueued += 1
+            self._queue(entry)  # right away, so calls of a chat queue in id order
+            position = self._written
+            while self._synced_upto < position and not self._closed.is_set():
+                self._synced.wait()
+        return Receipt(entry.id)
+
+    def _queue(self, entry: OutboxEntry) -> None:
+        key = _chat_key(entry.body)
+        calls = self._chats.get(key)
+        if calls is None:
+            calls = self._chats[key] = deque()
+            self._ready.append(key)
+            self._work.notify()
+        calls.append(entry)
+
+    @staticmethod
+    def _encode(record: Dict[str, Any]) -> bytes:
+        return (
+            json.dumps(record, separators=(",", ":"), ensure_ascii=False).encode("utf-8") + b"\n"
+        )
+
+    def _bytes(self) -> int:
+        return sum(size for size, _ in self._segments.values())
+
+    def _write(self, line: bytes) -> None:
+        """Appends a record to the current segment, called holding the lock"""
+        if self._segments[self._segment][0] + len(line) > self.segment_bytes:
+            self._rotate()
+        self._stream.write(line)
+        self._segments[self._segment][0] += len(line)
+        self._written += 1
+        self._dirty.notify()
+
+    def _rotate(self) -> None:
+        with self._sync_lock:
+            self._stream.flush()
+            os.fsync(self._stream.fileno())
+            self._stream.close()
+        self._synced_upto = self._written
+        self._synced.notify_all()
+        self._segment += 1
+        self._segments[self._segment] = [0, 0]
+        self._stream = open(os.path.join(self.directory, _segment_name(self._segment)), "ab")
+        self._compact()
+
+    def _compact(self) -> None:
+        """Deletes the oldest segments while all their calls are done
+
+        Only a prefix of segments is deleted, so an acknowledgement is never
+        deleted before the call it acknowledges.
+        """
+        for number in sorted(self._segments):
+            if number == self._segment or self._segments[number][1]:
+                break
+            os.remove(os.path.join(self.directory, _segment_name(number)))
+            del self._segments[number]
+
+    def _flush(self) -> None:
+        """Fsyncs written records, records written during an fsync share the next one"""
+        while True:
+            with self._lock:
+                while self._synced_upto == self._written and not self._closed.is_set():
+                    self._dirty.wait()
+                if self._closed.is_set() and self._synced_upto == self._written:
+                    return
+                position = self._written
+                self._stream.flush()
+                stream = self._stream
+            with self._sync_lock:
+                if not stream.closed:
+                    os.fsync(stream.fileno())
+            with self._lock:
+                self._synced_upto = max(self._synced_upto, position)
+                self._synced.notify_all()
+            if self.fsync_interval:
+                time.sleep(self.fsync_interval)
+
+    def _next(self) -> Optional[Tuple[Tuple[str, str], OutboxEntry]]:
+        """Waits for the first call of the next chat whose turn it is"""
+        with self._lock:
+            while not self._closed.is_set():
+                now = time.monotonic()
+                while self._delayed and self._delayed[0][0] <= now:
+                    self._ready.append(heapq.heappop(self._delayed)[1])
+                if self._ready:
+                    key = self._ready.popleft()
+                    return key, self._chats[key][0]
+                self._work.wait(self._delayed[0][0] - now if self._delayed else None)
+        return None
+
+    def _drain(self) -> None:
+        pause = PAUSE
+        next_send = 0.0
+        while True:
+            item = self._next()
+            if item is None:
+                return
+            key, entry = item
+            wait = max(next_send - time.monotonic(), self._paused_until - time.monotonic())
+            if wait > 0 and self._closed.wait(wait):
+                return
+            next_send = time.monotonic() + 1.0 / self.rate if self.rate else 0.0
+
+            client = self._client
+            error: Any = None
+            try:
+                response = client._post_req(url=client._BASE_URL + entry.path, body=entry.body)
+            except Exception as exception:
+                outage = client._transport.retryable(exception)
+                status, error = None, repr(exception)
+            else:
+                status = response.status_code
+                outage = status in OUTAGE_STATUSES
+
+            if outage:
+                # still unreachable, the chat keeps its place and the drainer backs off
+                with self._lock:
+                    self._ready.appendleft(key)
+                    self._paused_until = time.monotonic() + pause
+                logger.debug(f"Outbox paused {pause:g}s, Sarufi still unreachable ({status or error})")
+                pause = min(pause * 2, MAX_PAUSE)
+                continue
+            pause = PAUSE
+
+            if status is not None:
+                try:
+                    answer = response.json()
+                except ValueError:
+                    answer = response.text
+                if status < 400:
+                    self._done(key, entry, "ack")
+                    if self.on_delivered is not None:
+                        try:
+                            self.on_delivered(entry, answer)
+                        except Exception:
+                            logger.exception(f"on_delivered failed for outbox call {entry.id}")
+                    continue
+                error = {"status": status, "response": answer}
+            attempts = self._attempts.get(entry.id, 0) + 1
+            if status is not None and status < 500 or attempts >= self.max_attempts:
+                self._done(key, entry, "dead", error=error, attempts=attempts)
+                continue
+            self._attempts[entry.id] = attempts
+            with self._lock:
+                heapq.heappush(self._delayed, (time.monotonic() + PAUSE * 2**attempts, key))
+
+    def _done(self, key: Tuple[str, str], entry: OutboxEntry, op: str, **dead_letter) -> None:
+        """Records a call as delivered ("ack") or dead-lettered ("dead") and moves its chat on"""
+        if op == "dead":
+            logger.error(f"Outbox call {entry.id} to {entry.path} dead-lettered: {dead_letter['error']}")
+            line = self._encode({**entry._asdict(), **dead_letter, "dead_at": round(time.time(), 6)})
+        with self._lock:
+            if op == "dead":
+                self._dead_letter(line)
+            self._write(self._encode({"op": op, "id": entry.id}))
+            self._attempts.pop(entry.id, None)
+            self._segments[self._segment_of.pop(entry.id)][1] -= 1
+            self._compact()
+            calls = self._chats[key]
+            calls.popleft()
+            if calls:
+                self._ready.append(key)
+            else:
+                del self._chats[key]
+            if op == "ack":
+                self.delivered += 1
+                self._deliveries.append(time.monotonic())
+            else:
+                self.dead += 1
+        if op == "ack":
+            self.delay.observe(max(time.time() - entry.ts, 0.0))
+
+    def _dead_letter(self, line: bytes) -> None:
+        """Appends to the dead letter file, rotating it at `max_dead_bytes`, called holding the lock"""
+        if self._dead_bytes and self._dead_bytes + len(line) > self.max_dead_bytes:
+            self._dead_stream.close()
+            os.replace(self._dead_path, self._dead_path + ".1")
+            self._dead_stream = open(self._dead_path, "ab")
+            self._dead_bytes = 0
+        self._dead_stream.write(line)
+        self._dead_stream.flush()
+        self._dead_bytes += len(line)
+
+    def dead_letters(self) -> Iterator[Dict[str, Any]]:
+        """The dead-lettered calls kept on disk with their error and attempts, oldest first"""
+        for path in (self._dead_path + ".1", self._dead_path):
+            if not os.path.exists(path):
+                continue
+            with open(path, "rb") as stream:
+                for line in stream:
+                    try:
+                        yield json.loads(line)
+                    except ValueError:
+                        continue
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth, disk use, counters and drain throughput (calls/s over the last 10 s)"""
+        with self._lock:
+            now = time.monotonic()
+            oldest = min((calls[0].ts for calls in self._chats.values()), default=None)
+            recent = sum(1 for at in self._deliveries if now - at <= _THROUGHPUT_WINDOW)
+            stats = {
+                "depth": sum(len(calls) for calls in self._chats.values()),
+                "chats": len(self._chats),
+                "bytes": self._bytes(),
+                "dead_bytes": self._dead_bytes,
+                "oldest_age": None if oldest is None else round(max(time.time() - oldest, 0.0), 3),
+                "enqueued": self.enqueued,
+                "delivered": self.delivered,
+                "dead": self.dead,
+                "rejected": self.rejected,
+                "throughput": round(recent / _THROUGHPUT_WINDOW, 3),
+                "paused": self._paused_until > now,
+            }
+        stats.update(self.delay.summary())
+        return stats
+
+    def close(self) -> None:
+        """Stops the drainer, queued calls stay on disk for the next run"""
+        self._closed.set()
+        with self._lock:
+            self._work.notify_all()
+            self._dirty.notify_all()
+            self._synced.notify_all()
+        for thread in self._threads:
+            thread.join()
+        with self._lock:
+            self._stream.flush()
+            os.fsync(self._stream.fileno())
+            self._stream.close()
+            self._dead_stream.close()
+
+    def __enter__(self) -> Outbox:
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class Receipt(object):
+    """Response-like answer to a queued call, status 202"""
+
+    status_code = 202
+
+    def __init__(self, outbox_id: int) -> None:
+        self.outbox_id = outbox_id
+
+    def json(self) -> Dict[str, Any]:
+        return {
+            "queued": True,
+            "outbox_id": self.outbox_id,
+            "detail": "Sarufi is unreachable, the call is queued",
+        }
@@ -0,0 +1,245 @@
+"""Local intent prediction from a bot's training utterances
+
+`IntentPredictor` is built from `bot.intents`, which the client already
+holds, so messages can be classified without a round trip to the
+`predict/intent` endpoint: for pre-screening, offline tests of intents and
+as a degraded mode when the API is unreachable. Utterances are normalized
+like `dedupe_intents` does, split into character n-grams and weighted by
+TF-IDF. A message is scored against the utterances by cosine similarity
+over an inverted index held in numpy arrays, and the intent of the nearest
+utterance wins with the similarity as its confidence. Utterances sharing
+only common n-grams with the message are skipped when they provably
+cannot win, which keeps queries fast on large intent sets.
+
+The local model is not the server's model: answers can differ, which is
+what the confidence threshold and the server fallback of
+`Bot.predict_intent(message, local=True)` are for. Requires
+`pip install sarufi[analytics]` (numpy).
+
+Examples:
+
+>>> from sarufi.predictor import IntentPredictor
+>>> predictor = IntentPredictor(bot.intents, threshold=0.5)
+>>> predictor.predict("nataka kuangalia salio langu")
+{'intent': 'balance', 'status': True, 'confidence': 0.8123}
+>>> predictor.rank("naomba namba", k=2)
+[('contact', 0.7011), ('balance', 0.1432)]
+"""
+from __future__ import annotations
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError as error:  # pragma: no cover
+    raise ImportError(
+        "sarufi.predictor needs numpy, install it with `pip install sarufi[analytics]`"
+    ) from error
+
+from .utterances import normalize
+
+NGRAM_RANGE = (2, 4)
+THRESHOLD = 0.5
+
+_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)
+# the common n-grams of a message skipped while collecting candidate
+# utterances may add at most this much to the score of an utterance
+_SKIPPED_BOUND = 0.25
+# below this many postings scoring every utterance is cheaper than pruning
+_PRUNE_POSTINGS = 20_000
+
+
+def _ngram_hashes(
+    texts: Sequence[str], ngram_range: Tuple[int, int] = NGRAM_RANGE
+) -> Tuple[np.ndarray, np.ndarray]:
+    """64 bit hashes of the character n-grams of normalized texts, as (text index, hash) arrays
+
+    All texts are laid out in one array of code points and every n-gram
+    hash is computed for all positions at once, windows spanning two texts
+    are dropped.
+    """
+    padded = [f" {text} " for text in texts]
+    lengths = np.fromiter(map(len, padded), dtype=np.int64, count=len(padded))
+    codes = np.frombuffer("".join(padded).encode("utf-32-le"), dtype="<u4").astype(np.uint64)
+    owner = np.repeat(np.arange(len(padded), dtype=np.int64), lengths)
+    rows, hashes = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.uint64)]
+    for n in range(ngram_range[0], ngram_range[1] + 1):
+        count = len(codes) - n + 1
+        if count <= 0:
+            continue
+        hashed = np.full(count, n, dtype=np.uint64)
+        for offset in range(n):
+            hashed = hashed * _MULTIPLIER + codes[offset : offset + count]
+        inside = owner[:count] == owner[n - 1 :]
+        rows.append(owner[:count][inside])
+        hashes.append(hashed[inside])
+    return np.concatenate(rows), np.concatenate(hashes)
+
+
+class IntentPredictor(object):
+    """Character n-gram TF-IDF nearest neighbour intent classifier
+
+    Args:
+        intents (Mapping[str, Sequence[str]]): Intent name -> training utterances, e.g `bot.intents`
+        threshold (float, optional): Confidence at or above which a prediction has status True. Defaults to 0.5.
+        ngram_range (Tuple[int, int], optional): Smallest and largest n-gram length. Defaults to (2, 4).
+    """
+
+    def __init__(
+        self,
+        intents: Mapping[str, Sequence[str]],
+        threshold: float = THRESHOLD,
+        ngram_range: Tuple[int, int] = NGRAM_RANGE,
+    ) -> None:
+        self.intents = intents
+        self.threshold = threshold
+        self.ngram_range = ngram_range
+
+        names: List[str] = []
+        texts: List[str] = []
+        starts: List[int] = []
+        for intent, utterances in (intents or {}).items():
+            normalized = [normalize(str(utterance)) for utterance in utterances or ()]
+            if normalized:
+                names.append(intent)
+                starts.append(len(texts))
+                texts.extend(normalized)
+        self.names = names
+        self.size = len(texts)
+        self._starts = np.array(starts, dtype=np.int64)
+
+        rows, hashes = _ngram_hashes(texts, ngram_range)
+        self._vocabulary, features = np.unique(hashes, return_inverse=True)
+        features = features.reshape(-1)
+        width = max(len(self._vocabulary), 1)
+        pairs, tf = np.unique(rows * width + features, return_counts=True)
+        rows, features = pairs // width, pairs % width
+
+        df = np.bincount(features, minlength=len(self._vocabulary))
+        self._idf = np.log((1.0 + self.size) / (1.0 + df)) + 1.0
+        self._unseen_idf = float(np.log(1.0 + self.size) + 1.0)
+        weights = (1.0 + np.log(tf)) * self._idf[features]
+        norms = np.sqrt(np.bincount(rows, weights=weights * weights, minlength=self.size))
+        weights /= norms[rows]
+
+        # inverted index: the utterances (and weights) of feature f are
+        # postings[offsets[f]:offsets[f + 1]]
+        by_feature = np.argsort(features, kind="stable")
+        self._posting_rows = rows[by_feature].astype(np.int32)
+        self._posting_weights = weights[by_feature].astype(np.float32)
+        self._offsets = np.concatenate(([0], np.cumsum(df)))
+        self._max_weights = (
+            np.maximum.reduceat(self._posting_weights, self._offsets[:-1])
+            if len(df)
+            else np.zeros(0, dtype=np.float32)
+        )
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __repr__(self) -> str:
+        return (
+            f"IntentPredictor({len(self.names)} intents, {self.size} utterances, "
+            f"{len(self._vocabulary)} n-grams)"
+        )
+
+    def _query(self, message: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Vocabulary features of a message and their normalized TF-IDF weights"""
+        if not self.size:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        _, hashes = _ngram_hashes([normalize(str(message))], self.ngram_range)
+        hashes, tf = np.unique(hashes, return_counts=True)
+        index = np.minimum(np.searchsorted(self._vocabulary, hashes), len(self._vocabulary) - 1)
+        known = self._vocabulary[index] == hashes
+        # n-grams never seen in training still count towards the message norm,
+        # so mostly unknown messages get a low confidence
+        weights = (1.0 + np.log(tf)) * np.where(known, self._idf[index], self._unseen_idf)
+        weights /= np.sqrt(np.dot(weights, weights))
+        return index[known], weights[known]
+
+    def _postings(self, feature: int) -> Tuple[np.ndarray, np.ndarray]:
+        begin, end = self._offsets[feature], self._offsets[feature + 1]
+        return self._posting_rows[begin:end], self._posting_weights[begin:end]
+
+    def _row_scores(self, features: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        """Cosine similarity of a message to every utterance"""
+        scores = np.zeros(self.size, dtype=np.float32)
+        for feature, weight in zip(features.tolist(), weights.tolist()):
+            rows, posting_weights = self._postings(feature)
+            scores[rows] += posting_weights * weight  # rows of one posting list are unique
+        return scores
+
+    def _nearest(self, features: np.ndarray, weights: np.ndarray) -> Tuple[int, float]:
+        """nearest utterance of a message and its similarity, -1 when nothing matches
+
+        Common n-grams have long posting lists but little weight. Utterances
+        sharing a rare n-gram with the message are collected first, then
+        scored exactly by looking them up in the common n-grams' postings,
+        dropping candidates that can no longer catch up with the best one.
+        Any other utterance scores at most the sum of the common n-grams'
+        largest weights, so when the best candidate beats that bound it is
+        the nearest utterance overall, otherwise every utterance is scored.
+        """
+        if not len(features):
+            return -1, 0.0
+        lengths = self._offsets[features + 1] - self._offsets[features]
+        order = np.argsort(lengths, kind="stable")  # rarest first
+        features, weights = features[order], weights[order]
+        bounds = weights * self._max_weights[features]
+        skipped = np.cumsum(bounds[::-1])[::-1]  # bound of the n-grams from i on
+        split = int(np.searchsorted(-skipped, -_SKIPPED_BOUND, side="right"))
+        total = int(lengths.sum())
+        rare = int(lengths[order][:split].sum())
+        if split < len(features) and total > _PRUNE_POSTINGS and rare * 2 < total:
+            scores = self._row_scores(features[:split], weights[:split])
+            candidates = np.flatnonzero(scores)
+            for position in range(split, len(features)):
+                if len(candidates) > 1:
+                    # candidates that cannot catch up with the best partial score are dropped
+                    partial = scores[candidates]
+                    candidates = candidates[partial + skipped[position] >= partial.max()]
+                feature, weight = int(features[position]), float(weights[position])
+                rows, posting_weights = self._postings(feature)
+                found = np.minimum(np.searchsorted(rows, candidates), len(rows) - 1)
+                hit = rows[found] == candidates
+                scores[candidates[hit]] += posting_weights[found[hit]] * weight
+            if len(candidates):
+                best = int(candidates[np.argmax(scores[candidates])])
+                if scores[best] >= skipped[split]:
+                    return best, float(scores[best])
+        scores = self._row_scores(features, weights)
+        best = int(np.argmax(scores))
+        return (best, float(scores[best])) if scores[best] > 0 else (-1, 0.0)
+
+    def predict(self, message: str, threshold: Optional[float] = None) -> Dict[str, Any]:
+        """predict
+
+        Predicts the intent of a message, in the shape of `Bot.predict_intent`
+
+        Args:
+            message (str): The message
+            threshold (float, optional): Overrides the predictor's threshold. Defaults to None.
+
+        Returns:
+            Dict[str, Any]: intent, status (confidence reached the threshold) and confidence
+        """
+        threshold = self.threshold if threshold is None else threshold
+        row, score = self._nearest(*self._query(message))
+        confidence = round(min(score, 1.0), 4)
+        if row < 0 or confidence <= 0:
+            return {"intent": None, "status": False, "confidence": 0.0}
+        intent = self.names[int(np.searchsorted(self._starts, row, side="right")) - 1]
+        return {"intent": intent, "status": confidence >= threshold, "confidence": confidence}
+
+    def predict_many(
+        self, messages: Sequence[str], threshold: Optional[float] = None
+    ) -> List[Dict[str, Any]]:
+        """Predicts the intents of many messages, see `predict`"""
+        return [self.predict(message, threshold) for message in messages]
+
+    def rank(self, message: str, k: int = 3) -> List[Tuple[str, float]]:
+        """The k most similar intents of a message with their confidence, best first"""
+        if not self.size:
+            return []
+        scores = np.maximum.reduceat(self._row_scores(*self._query(message)), self._starts)
+        best = np.argsort(-scores, kind="stable")[:k]
+        return [(self.names[code], round(min(float(scores[code]), 1.0), 4)) for code in best]
@@ -0,0 +1,378 @@
+"""Recording and replay of chat traffic
+
+`Recorder` plugs into the request layer of a client and appends sampled
+`chat` request/response pairs to a compact NDJSON log (one JSON object per
+line) with size based rotation. `replay` streams a log back through a
+client, optionally paced to the original timing, and diffs the new
+responses against the recorded ones. Logs are read line by line, so
+multi-GB logs replay in constant memory; `RecordedTransport` additionally
+keeps up to `max_waiting` records that arrive out of order.
+
+Sampling is decided per chat_id, so a sampled conversation is recorded
+whole.
+
+Examples:
+
+>>> from sarufi import Sarufi
+>>> from sarufi.recorder import Recorder, replay
+>>> recorder = Recorder("chats.ndjson", sample_rate=0.1, max_bytes=256 * 1024**2)
+>>> sarufi = Sarufi(api_key="YOUR_API_KEY", recorder=recorder)
+>>> ...
+>>> for result in replay("chats.ndjson", Sarufi(api_key="YOUR_API_KEY"), speed=10):
+...     if result.diff:
+...         print(result.record["request"]["chat_id"], result.diff)
+"""
+from __future__ import annotations
+import os
+import gzip
+import json
+import time
+import zlib
+import queue
+import logging
+import threading
+from contextvars import copy_context
+from collections import OrderedDict, deque
+from urllib.parse import urlsplit
+from typing import Any, Deque, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from .transport import Transport
+
+logger = logging.getLogger(__name__)
+
+CHAT_PATHS = ("conversation", "conversation/whatsapp")
+MAX_WAITING = 10000
+
+
+def _chat_id(body: Optional[Dict[str, Any]]) -> str:
+    return str((body or {}).get("chat_id", ""))
+
+
+class Recorder(object):
+    """Appends sampled request/response pairs to an NDJSON log
+
+    Args:
+        path (str): Log file, rotated files get a numeric suffix (chats.ndjson.1, ...)
+        sample_rate (float, optional): Fraction of conversations (chat_ids) recorded. Defaults to 1.
+        max_bytes (int, optional): Rotate when the log reaches this size, 0 never rotates. Defaults to 0.
+        backups (int, optional): Rotated files kept. Defaults to 5.
+        paths (Iterable[str], optional): API paths recorded. Defaults to the chat endpoints.
+        flush_every (int, optional): Records buffered before flushing to the OS. Defaults to 64.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        sample_rate: float = 1.0,
+        max_bytes: int = 0,
+        backups: int = 5,
+        paths: Iterable[str] = CHAT_PATHS,
+        flush_every: int = 64,
+    ) -> None:
+        self.path = path
+        self.sample_rate = sample_rate
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.paths = tuple("/" + path for path in paths)
+        self.flush_every = flush_every
+        self.recorded = 0
+        self._threshold = int(sample_rate * 0xFFFFFFFF)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._stream = open(path, "ab")
+        self._size = self._stream.tell()
+
+    def wants(self, method: str, url: str, body: Optional[Dict[str, Any]]) -> bool:
+        """Cheap check deciding whether a request is recorded"""
+        if not url.endswith(self.paths):
+            return False
+        if self.sample_rate >= 1:
+            return True
+        return zlib.crc32(_chat_id(body).encode("utf-8")) < self._threshold
+
+    def record(
+        self,
+        method: str,
+        url: str,
+        body: Optional[Dict[str, Any]],
+        response: Any,
+        latency: float,
+    ) -> None:
+        """Appends one request/response pair if it is sampled"""
+        if not self.wants(method, url, body):
+            return
+        try:
+            payload = response.json()
+        except ValueError:
+            payload = None
+        line = json.dumps(
+            {
+                "ts": round(time.time(), 6),
+                "latency": round(latency, 6),
+                "method": method,
+                "path": urlsplit(url).path.lstrip("/"),
+                "request": body,
+                "status": response.status_code,
+                "response": payload,
+            },
+            separators=(",", ":"),
+            ensure_ascii=False,
+        ).encode("utf-8") + b"\n"
+        with self._lock:
+            if self.max_bytes and self._size + len(line) > self.max_bytes and self._size:
+                self._rotate()
+            self._stream.write(line)
+            self._size += len(line)
+            self.recorded += 1
+            self._pending += 1
+            if self._pending >= self.flush_every:
+                self._stream.flush()
+                self._pending = 0
+
+    def _rotate(self) -> None:
+        self._stream.close()
+        for index in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._stream = open(self.path, "ab")
+        self._size = 0
+        self._pending = 0
+
+    def flush(self) -> None:
+        with self._lock:
+            self._stream.flush()
+            self._pending = 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._stream.close()
+
+    def files(self) -> List[str]:
+        """Log files oldest first, the order to replay them in"""
+        rotated = [f"{self.path}.{i}" for i in range(self.backups, 0, -1)]
+        return [path for path in rotated if os.path.exists(path)] + [self.path]
+
+
+def read_log(paths: Union[str, Iterable[str]]) -> Iterator[Dict[str, Any]]:
+    """Streams records from one or more NDJSON logs (gzip compressed logs end in .gz)"""
+    for path in [paths] if isinstance(paths, str) else paths:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rb") as stream:
+            for line in stream:
+                if line.strip():
+                    yield json.loads(line)
+
+
+class RecordedResponse(object):
+    """Response served from a recording, mimics the parts of `requests.Response` the SDK uses"""
+
+    def __init__(self, status_code: int, payload: Any) -> None:
+        self.status_code = status_code
+        self._payload = payload
+        self.headers = {"Content-Type": "application/json"}
+
+    def json(self) -> Any:
+        return self._payload
+
+    @property
+    def content(self) -> bytes:
+        return json.dumps(self._payload).encode("utf-8")
+
+
+class RecordedTransport(Transport):
+    """Fake transport answering requests with the responses of a recording
+
+    Requests are matched to records in log order by method, API path and
+    chat_id, so client code (or `replay`) can run offline against recorded
+    traffic. Records read past while looking for a match are kept for later
+    requests, at most `max_waiting` of them (the oldest are dropped first),
+    so memory stays bounded however long the log is.
+
+    Args:
+        paths (Union[str, Iterable[str]]): Log file(s) to serve from
+        max_waiting (int, optional): Records kept for later requests. Defaults to 10000.
+    """
+
+    def __init__(self, paths: Union[str, Iterable[str]], max_waiting: int = MAX_WAITING) -> None:
+        super().__init__()
+        self.max_waiting = max_waiting
+        self.dropped = 0
+        self._records = read_log(paths)
+        self._sequence = 0
+        self._waiting: OrderedDict[int, Dict[str, Any]] = OrderedDict()  # log order
+        self._index: Dict[Tuple[str, str, str], Deque[int]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(method: str, path: str, body: Optional[Dict[str, Any]]) -> Tuple[str, str, str]:
+        return method.upper(), path.strip("/"), _chat_id(body)
+
+    def _keep(self, key: Tuple[str, str, str], record: Dict[str, Any]) -> None:
+        """Keeps a record read past for a later request, lock held"""
+        self._sequence += 1
+        self._waiting[self._sequence] = record
+        self._index.setdefault(key, deque()).append(self._sequence)
+        if len(self._waiting) > self.max_waiting:
+            _, oldest = self._waiting.popitem(last=False)
+            oldest_key = self._key(oldest.get("method", ""), oldest.get("path", ""), oldest.get("request"))
+            queued = self._index[oldest_key]
+            queued.popleft()  # the oldest record overall is the oldest of its key
+            if not queued:
+                del self._index[oldest_key]
+            self.dropped += 1
+            if self.dropped == 1:
+                logger.warning(f"More than {self.max_waiting} recorded responses waiting, dropping the oldest")
+
+    def request(
+        self, method, url, headers, data=None, json=None, timeout=None, stream=False, path=None
+    ):
+        key = self._key(method, urlsplit(url).path, json)
+        with self._lock:
+            queued = self._index.get(key)
+            if queued:
+                record = self._waiting.pop(queued.popleft())
+                if not queued:
+                    del self._index[key]
+            else:
+                record = None
+                for candidate in self._records:
+                    candidate_key = self._key(
+                        candidate.get("method", ""), candidate.get("path", ""), candidate.get("request")
+                    )
+                    if candidate_key == key:
+                        record = candidate
+                        break
+                    self._keep(candidate_key, candidate)
+        if record is None:
+            return RecordedResponse(
+                404, {"detail": f"no recorded response for {key[0]} {key[1]} chat {key[2]}"}
+            )
+        return RecordedResponse(record["status"], record["response"])
+
+
+class ReplayResult(NamedTuple):
+    record: Dict[str, Any]
+    status: Optional[int]
+    response: Any
+    latency: float
+    diff: Dict[str, Tuple[Any, Any]]
+
+
+def diff_responses(
+    recorded: Any, replayed: Any, ignore: Iterable[str] = ()
+) -> Dict[str, Tuple[Any, Any]]:
+    """Top level fields that differ between two JSON responses, as {field: (recorded, replayed)}"""
+    if not isinstance(recorded, dict) or not isinstance(replayed, dict):
+        return {} if recorded == replayed else {"": (recorded, replayed)}
+    diff = {}
+    for key in recorded.keys() | replayed.keys():
+        if key in ignore:
+            continue
+        if recorded.get(key) != replayed.get(key):
+            diff[key] = (recorded.get(key), replayed.get(key))
+    return diff
+
+
+def replay(
+    paths: Union[str, Iterable[str]],
+    client,
+    speed: Optional[float] = None,
+    workers: int = 1,
+    ignore: Iterable[str] = (),
+) -> Iterator[ReplayResult]:
+    """replay
+
+    Streams recorded requests back through a client and diffs the responses
+
+    Requests of one chat_id are always sent in order by the same worker,
+    different chats run concurrently when `workers` > 1 (results are then
+    yielded in completion order).
+
+    Args:
+        paths (Union[str, Iterable[str]]): Log file(s), oldest first
+        client (Sarufi): Client to send through, e.g with a `RecordedTransport` for offline runs
+        speed (float, optional): Replay speed relative to the recording (2 is twice as fast),
+            None sends as fast as possible. Defaults to None.
+        workers (int, optional): Concurrent senders. Defaults to 1.
+        ignore (Iterable[str], optional): Response fields left out of the diff. Defaults to ().
+
+    Yields:
+        ReplayResult: Record, new status, new response, latency and diff
+    """
+    ignore = frozenset(ignore)
+
+    def send(record: Dict[str, Any]) -> ReplayResult:
+        url = client._BASE_URL + record["path"]
+        started = time.perf_counter()
+        try:
+            response = client._request(record["method"], url, body=record.get("request"))
+            status = response.status_code
+            try:
+                payload = response.json()
+            except ValueError:
+                payload = None
+        except Exception as error:
+            status, payload = None, {"exception": repr(error)}
+        latency = time.perf_counter() - started
+        diff = diff_responses(record.get("response"), payload, ignore)
+        if status != record.get("status"):
+            diff["status"] = (record.get("status"), status)
+        return ReplayResult(record, status, payload, latency, diff)
+
+    def paced(records: Iterator[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        first_ts = wall_start = None
+        for record in records:
+            if speed:
+                if first_ts is None:
+                    first_ts, wall_start = record["ts"], time.perf_counter()
+                due = wall_start + (record["ts"] - first_ts) / speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            yield record
+
+    records = paced(read_log(paths))
+    if workers <= 1:
+        for record in records:
+            yield send(record)
+        return
+
+    results: queue.Queue = queue.Queue(maxsize=workers * 64)
+    inboxes = [queue.Queue(maxsize=64) for _ in range(workers)]
+    done = object()
+
+    def worker(inbox: queue.Queue) -> None:
+        while True:
+            record = inbox.get()
+            if record is done:
+                results.put(done)
+                return
+            results.put(send(record))
+
+    def dispatch() -> None:
+        for record in records:
+            key = zlib.crc32(_chat_id(record.get("request")).encode("utf-8"))
+            inboxes[key % workers].put(record)
+        for inbox in inboxes:
+            inbox.put(done)
+
+    # copy_context: a scheduler priority set by the caller applies to the replayed requests
+    threads = [
+        threading.Thread(target=copy_context().run, args=(worker, inbox), daemon=True)
+        for inbox in inboxes
+    ]
+    threads.append(threading.Thread(target=dispatch, daemon=True))
+    for thread in threads:
+        thread.start()
+    finished = 0
+    while finished < workers:
+        result = results.get()
+        if result is done:
+            finished += 1
+        else:
+            yield result
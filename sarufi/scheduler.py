@@ -0,0 +1,191 @@
+"""Priority scheduling of requests sharing one transport
+
+A client that serves live conversations and runs heavy admin jobs (large
+`update_bot` uploads, bulk `predict_intent`) at the same time should not
+make users wait behind a deploy. `PriorityScheduler` gives every request a
+priority class and a slot out of a fixed total, sized like the connection
+pool. Each class has its own concurrency limit and can reserve slots that
+lower classes may not take. Free slots always go to the highest priority
+waiter first. By default chat traffic is interactive and everything else is
+background: interactive requests keep a reserved share of the pool while
+background work soaks up the rest.
+
+Examples:
+
+>>> from sarufi import Sarufi
+>>> from sarufi.scheduler import BACKGROUND, PriorityScheduler
+>>> from sarufi.transport import Transport
+>>> scheduler = PriorityScheduler(total=32)
+>>> transport = Transport(pool_maxsize=32, scheduler=scheduler)
+>>> sarufi = Sarufi(api_key="YOUR_API_KEY", transport=transport)
+>>> with scheduler.priority(BACKGROUND):
+...     bot.predict_intent("nataka kubeti")
+>>> scheduler.metrics()["interactive"]
+{'in_flight': 3, 'waiting': 0, 'max_concurrency': 32, 'reserved': 8, 'count': 5120, 'p95': 0.0, ...}
+"""
+from __future__ import annotations
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from urllib.parse import urlsplit
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+from .stats import LatencyStats
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+INTERACTIVE_PATHS = (
+    "conversation",
+    "conversation/whatsapp",
+    "conversation/status",
+    "conversation-state",
+)
+
+_priority: ContextVar[Optional[str]] = ContextVar("sarufi_priority", default=None)
+
+
+class PriorityClass(NamedTuple):
+    """A class of requests
+
+    Attributes:
+        name (str): Class name requests are tagged with
+        priority (int): Lower values are served first
+        max_concurrency (int): Requests of the class in flight at most
+        reserved (int): Slots kept free for this class, lower priority classes cannot take them
+    """
+
+    name: str
+    priority: int
+    max_concurrency: int
+    reserved: int = 0
+
+
+class _State(object):
+    def __init__(self, spec: PriorityClass, lock: threading.Lock) -> None:
+        self.spec = spec
+        self.in_flight = 0
+        self.waiting = 0
+        self.wait = LatencyStats()
+        self.condition = threading.Condition(lock)
+
+
+class PriorityScheduler(object):
+    """Hands out request slots by priority class
+
+    Args:
+        total (int, optional): Slots in all, match the transport's `pool_maxsize`. Defaults to 32.
+        classes (Iterable[PriorityClass], optional): Priority classes. Defaults to interactive
+            (a quarter of the slots reserved) and background (the remaining slots).
+        interactive_paths (Iterable[str], optional): API paths classed as interactive,
+            any other request is background. Defaults to the chat endpoints.
+    """
+
+    def __init__(
+        self,
+        total: int = 32,
+        classes: Iterable[PriorityClass] = None,
+        interactive_paths: Iterable[str] = INTERACTIVE_PATHS,
+    ) -> None:
+        if classes is None:
+            reserved = max(1, total // 4)
+            classes = (
+                PriorityClass(INTERACTIVE, 0, total, reserved),
+                PriorityClass(BACKGROUND, 1, total - reserved),
+            )
+        self.total = total
+        self.interactive_paths = frozenset(path.strip("/") for path in interactive_paths)
+        ordered = sorted(classes, key=lambda spec: spec.priority)
+        self._lock = threading.Lock()
+        self._classes: Dict[str, _State] = {
+            spec.name: _State(spec, self._lock) for spec in ordered
+        }
+        self._in_flight = 0
+
+    def classify(self, method: str, url: str, path: str = None) -> str:
+        """Priority class of a request: the `priority()` override, else by API path
+
+        `path` is the API path relative to the client's base URL, so a base URL
+        with a path prefix (e.g a gateway at https://host/sarufi/) is classed
+        right. Without it the whole URL path is used.
+        """
+        override = _priority.get()
+        if override is not None:
+            return override
+        path = urlsplit(url).path if path is None else path.split("?", 1)[0]
+        return INTERACTIVE if path.strip("/") in self.interactive_paths else BACKGROUND
+
+    @contextmanager
+    def priority(self, name: str) -> Iterator[None]:
+        """Runs the requests made in the block in the given class, including those the
+        SDK's own worker threads (bulk jobs, hedges, bot updates) make on its behalf"""
+        if name not in self._classes:
+            raise KeyError(f"unknown priority class {name}")
+        token = _priority.set(name)
+        try:
+            yield
+        finally:
+            _priority.reset(token)
+
+    def _can_start(self, state: _State) -> bool:
+        if state.in_flight >= state.spec.max_concurrency:
+            return False
+        held_back = 0
+        for other in self._classes.values():
+            if other.spec.priority >= state.spec.priority:
+                continue
+            if other.waiting and other.in_flight < other.spec.max_concurrency:
+                return False  # higher priority requests go first
+            held_back += max(0, other.spec.reserved - other.in_flight)
+        return self.total - self._in_flight > held_back
+
+    @contextmanager
+    def slot(self, name: str) -> Iterator[None]:
+        """Holds a slot of the given class for the duration of one request"""
+        state = self._classes[name]
+        started = time.perf_counter()
+        with self._lock:
+            if not self._can_start(state):
+                state.waiting += 1
+                try:
+                    state.condition.wait_for(lambda: self._can_start(state))
+                finally:
+                    state.waiting -= 1
+            state.in_flight += 1
+            self._in_flight += 1
+            self._wake()  # a freed reservation can let in more than one waiter
+        state.wait.observe(time.perf_counter() - started)
+        try:
+            yield
+        finally:
+            with self._lock:
+                state.in_flight -= 1
+                self._in_flight -= 1
+                self._wake()
+
+    def _wake(self) -> None:
+        """Wakes one waiter of the highest priority class that can start, lock held"""
+        for state in self._classes.values():
+            if state.waiting and self._can_start(state):
+                state.condition.notify()
+                return
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """In flight and waiting requests plus queueing delay (seconds) per class"""
+        metrics = {}
+        for name, state in self._classes.items():
+            entry: Dict[str, Any] = {
+                "in_flight": state.in_flight,
+                "waiting": state.waiting,
+                "max_concurrency": state.spec.max_concurrency,
+                "reserved": state.spec.reserved,
+            }
+            entry.update(state.wait.summary())
+            entry.pop("errors")
+            metrics[name] = entry
+        return metrics
+
+    @property
+    def classes(self) -> List[PriorityClass]:
+        return [state.spec for state in self._classes.values()]
@@ -0,0 +1,377 @@
+"""Local stand-in for the Sarufi API
+
+A small in-memory emulation of the Sarufi endpoints used by the SDK,
+meant for benchmarks, load tests and offline development. It stores bots in
+memory, walks their flows for `chat` calls and counts the bytes it sends and
+receives on the wire. It serves HTTP/1.1 itself and exposes an ASGI app for
+HTTP/2 capable servers. It is not a faithful copy of the real engine (intent
+prediction is a naive word overlap).
+
+Examples:
+
+>>> from sarufi import Sarufi
+>>> from sarufi.standin import StandinServer
+>>> with StandinServer() as server:
+...     sarufi = Sarufi(api_key="test")
+...     sarufi._BASE_URL = server.url
+...     bot = sarufi.create_bot(name="Kubeti", intents=intents, flow=flow)
+...     bot.respond("nataka kubeti")
+"""
+from __future__ import annotations
+import gzip
+import json
+import hashlib
+import time
+import zlib
+import asyncio
+import threading
+from itertools import count
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .validation import END_STATE
+
+
+class StandinServer(object):
+    """Threaded HTTP stand-in for the Sarufi API
+
+    Args:
+        host (str, optional): Interface to bind. Defaults to "127.0.0.1".
+        port (int, optional): Port to bind, 0 picks a free one. Defaults to 0.
+        latency (float, optional): Seconds added to every response to simulate a slow link. Defaults to 0.
+        compress_responses (bool, optional): Gzip responses when the client accepts it. Defaults to True.
+        workers (int, optional): Requests answered at once, more wait like on a saturated server,
+            None answers every request at once. Defaults to None.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        compress_responses: bool = True,
+        workers: int = None,
+    ) -> None:
+        self.latency = latency
+        self.compress_responses = compress_responses
+        self._workers = threading.BoundedSemaphore(workers) if workers else None
+        self.bots: Dict[int, Dict[str, Any]] = {}
+        self.conversations: Dict[Tuple[int, str], Dict[str, str]] = {}
+        self._ids = count(1)
+        self._lock = threading.Lock()
+        self.reset_counters()
+        self._server = ThreadingHTTPServer((host, port), _handler_for(self))
+        self._server.daemon_threads = True
+        self._server.request_queue_size = 1024
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def reset_counters(self) -> None:
+        self.requests = 0
+        self.bytes_received = 0
+        self.bytes_sent = 0
+        self.peers = set()
+
+    def counters(self) -> Dict[str, int]:
+        """Requests, wire bytes and distinct client connections since the last reset"""
+        return {
+            "requests": self.requests,
+            "bytes_received": self.bytes_received,
+            "bytes_sent": self.bytes_sent,
+            "connections": len(self.peers),
+        }
+
+    def start(self) -> StandinServer:
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="sarufi-standin", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> StandinServer:
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _count(self, received: int, sent: int, peer: Any) -> None:
+        with self._lock:
+            self.requests += 1
+            self.bytes_received += received
+            self.bytes_sent += sent
+            self.peers.add(peer)
+
+    def respond(
+        self,
+        method: str,
+        path: str,
+        headers: Dict[str, str],
+        raw: bytes,
+        peer: Any = None,
+    ) -> Tuple[int, List[Tuple[str, str]], bytes]:
+        """Decodes a raw request, answers it and encodes the response
+
+        Args:
+            method (str): HTTP method
+            path (str): Request path
+            headers (Dict[str, str]): Request headers with lower case names
+            raw (bytes): Request body as received (possibly compressed)
+            peer (Any, optional): Client (host, port), used to count connections. Defaults to None.
+
+        Returns:
+            Tuple[int, List[Tuple[str, str]], bytes]: Status, response headers and body
+        """
+        received = len(raw)
+        if self._workers is not None:
+            self._workers.acquire()
+        try:
+            encoding = headers.get("content-encoding", "")
+            if encoding == "gzip":
+                raw = gzip.decompress(raw)
+            elif encoding == "deflate":
+                raw = zlib.decompress(raw)
+            content_type = headers.get("content-type", "")
+            if content_type.startswith("multipart/form-data"):
+                body = _parse_multipart(raw, content_type)
+            else:
+                body = json.loads(raw) if raw else None
+            status, payload = self.handle(method, path, body)
+        except (ValueError, OSError, zlib.error):
+            status, payload = 400, {"detail": "Invalid body"}
+        finally:
+            if self.latency:
+                time.sleep(self.latency)
+            if self._workers is not None:
+                self._workers.release()
+
+        data = json.dumps(payload).encode("utf-8")
+        response_headers = [("Content-Type", "application/json")]
+        if (
+            self.compress_responses
+            and len(data) > 1024
+            and "gzip" in headers.get("accept-encoding", "")
+        ):
+            data = gzip.compress(data, compresslevel=5)
+            response_headers.append(("Content-Encoding", "gzip"))
+        response_headers.append(("Content-Length", str(len(data))))
+        self._count(received, len(data), peer)
+        return status, response_headers, data
+
+    async def asgi(self, scope: Dict[str, Any], receive: Callable, send: Callable):
+        """ASGI entry point, serve it with an HTTP/2 capable server such as hypercorn"""
+        if scope["type"] != "http":
+            return
+        chunks = []
+        more_body = True
+        while more_body:
+            message = await receive()
+            chunks.append(message.get("body", b""))
+            more_body = message.get("more_body", False)
+        headers = {key.decode().lower(): value.decode() for key, value in scope["headers"]}
+        path = scope["path"]
+        if scope.get("query_string"):
+            path += "?" + scope["query_string"].decode()
+        status, response_headers, data = await asyncio.get_running_loop().run_in_executor(
+            None,
+            self.respond,
+            scope["method"],
+            path,
+            headers,
+            b"".join(chunks),
+            tuple(scope.get("client") or ()),
+        )
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [(k.lower().encode(), v.encode()) for k, v in response_headers],
+            }
+        )
+        await send({"type": "http.response.body", "body": data})
+
+    # API emulation
+
+    def handle(
+        self, method: str, path: str, body: Optional[Dict[str, Any]]
+    ) -> Tuple[int, Any]:
+        """Answers one API call, returns the status code and JSON payload"""
+        parts = [part for part in path.split("?")[0].split("/") if part]
+        route = "/".join(parts)
+        body = body or {}
+        if route == "chatbot" and method == "POST":
+            return self._save_bot(next(self._ids), body)
+        if route == "chatbots" and method == "GET":
+            return 200, list(self.bots.values())
+        if len(parts) == 2 and parts[0] == "chatbot":
+            if not parts[1].isdigit() or int(parts[1]) not in self.bots:
+                return 404, {"detail": "Bot not found"}
+            bot_id = int(parts[1])
+            if method == "GET":
+                return 200, self.bots[bot_id]
+            if method == "PUT":
+                return self._save_bot(bot_id, dict(self.bots[bot_id], **body))
+            if method == "DELETE":
+                del self.bots[bot_id]
+                return 200, {"message": f"Bot with ID {bot_id} deleted successfully"}
+        if route in ("conversation", "conversation/whatsapp") and method == "POST":
+            return self._chat(body)
+        if route == "conversation/status" and method == "POST":
+            return self._status(body)
+        if route == "conversation-state" and method == "POST":
+            return self._set_state(body)
+        if route == "predict/intent" and method == "POST":
+            bot = self.bots.get(_int(body.get("bot_id")))
+            if bot is None:
+                return 404, {"detail": "Bot not found"}
+            intent, confidence = _predict(bot, body.get("message", ""))
+            return 200, {"intent": intent, "status": bool(intent), "confidence": confidence}
+        return 404, {"detail": "Not Found"}
+
+    def _save_bot(self, bot_id: int, body: Dict[str, Any]) -> Tuple[int, Any]:
+        if not body.get("name"):
+            return 400, {"detail": "name is required"}
+        bot = dict(body, id=bot_id)
+        bot.setdefault("intents", {})
+        bot.setdefault("flows", {})
+        bot["updated_at"] = time.time()
+        self.bots[bot_id] = bot
+        return 200, bot
+
+    def _chat(self, body: Dict[str, Any]) -> Tuple[int, Any]:
+        bot = self.bots.get(_int(body.get("bot_id")))
+        if bot is None:
+            return 404, {"detail": "Bot not found"}
+        flow = bot.get("flows") or {}
+        key = (bot["id"], str(body.get("chat_id")))
+        message = str(body.get("message", ""))
+        if "media" in body:
+            # media messages do not move the flow, they are acknowledged with their metadata
+            return 200, {"message": [], "media": body["media"]}
+        conversation = self.conversations.get(key, {"next_state": END_STATE})
+
+        state = conversation["next_state"]
+        if state.startswith("choice_"):
+            state = (flow.get(state) or {}).get(message.strip(), state)
+        if state == END_STATE or state not in flow:
+            state, _ = _predict(bot, message)
+        if not state or state not in flow:
+            return 200, {"message": ["Samahani, sijakuelewa"], "next_state": END_STATE}
+
+        definition = flow[state]
+        next_state = definition.get("next_state", END_STATE)
+        self.conversations[key] = {"current_state": state, "next_state": next_state}
+        return 200, {
+            "message": definition.get("message", []),
+            "current_state": state,
+            "next_state": next_state,
+        }
+
+    def _status(self, body: Dict[str, Any]) -> Tuple[int, Any]:
+        key = (_int(body.get("bot_id")), str(body.get("chat_id")))
+        return 200, self.conversations.get(
+            key, {"current_state": None, "next_state": END_STATE}
+        )
+
+    def _set_state(self, body: Dict[str, Any]) -> Tuple[int, Any]:
+        key = (_int(body.get("bot_id")), str(body.get("chat_id")))
+        state = body.get("next_state")
+        conversation = dict(self.conversations.get(key, {}), next_state=state)
+        self.conversations[key] = conversation
+        return 200, conversation
+
+
+def _int(value: Any) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_multipart(raw: bytes, content_type: str) -> Dict[str, Any]:
+    """Form fields of a multipart body, file parts become {filename, content_type, size, sha256}"""
+    boundary = content_type.split("boundary=", 1)[1].split(";")[0].strip().strip('"')
+    fields: Dict[str, Any] = {}
+    for part in raw.split(b"--" + boundary.encode("ascii"))[1:]:
+        if part.startswith(b"--"):
+            break
+        head, _, content = part[2:].partition(b"\r\n\r\n")
+        content = content[:-2]  # CRLF before the next boundary
+        part_headers = dict(
+            line.split(": ", 1) for line in head.decode("utf-8").split("\r\n") if ": " in line
+        )
+        disposition = dict(
+            item.strip().split("=", 1)
+            for item in part_headers.get("Content-Disposition", "").split(";")
+            if "=" in item
+        )
+        name = disposition.get("name", "").strip('"')
+        if "filename" in disposition:
+            fields["message"] = disposition["filename"].strip('"')
+            fields[name] = {
+                "filename": fields["message"],
+                "content_type": part_headers.get("Content-Type"),
+                "size": len(content),
+                "sha256": hashlib.sha256(content).hexdigest(),
+            }
+        else:
+            fields[name] = content.decode("utf-8")
+    return fields
+
+
+def _predict(bot: Dict[str, Any], message: str) -> Tuple[Optional[str], float]:
+    words = set(message.lower().split())
+    best, score = None, 0.0
+    for intent, utterances in (bot.get("intents") or {}).items():
+        for utterance in utterances:
+            tokens = set(str(utterance).lower().split())
+            overlap = len(words & tokens) / (len(words | tokens) or 1)
+            if overlap > score:
+                best, score = intent, overlap
+    return best, round(score, 4)
+
+
+def _handler_for(standin: StandinServer):
+    class _Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True  # headers and body are written separately
+
+        def _read_body(self) -> bytes:
+            if "chunked" not in self.headers.get("Transfer-Encoding", ""):
+                return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b";")[0].strip() or b"0", 16)
+                chunk = self.rfile.read(size + 2)
+                if size == 0:
+                    break
+                chunks.append(chunk[:-2])
+            return b"".join(chunks)
+
+        def _serve(self) -> None:
+            headers = {key.lower(): value for key, value in self.headers.items()}
+            status, response_headers, data = standin.respond(
+                self.command, self.path, headers, self._read_body(), self.client_address
+            )
+            self.send_response(status)
+            for key, value in response_headers:
+                self.send_header(key, value)
+            self.end_headers()
+            try:
+                self.wfile.write(data)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # the client gave up, e.g a cancelled upload
+
+        do_GET = do_POST = do_PUT = do_DELETE = _serve
+
+        def log_message(self, *args) -> None:
+            pass
+
+    return _Handler
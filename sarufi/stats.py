@@ -0,0 +1,79 @@
+"""Lightweight in-memory latency statistics shared by the SDK helpers"""
+from __future__ import annotations
+import threading
+from collections import deque
+from typing import Dict, Iterable, List
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """percentile
+
+    Nearest-rank percentile of a list of samples
+
+    Args:
+        samples (List[float]): Samples to compute the percentile from (sorted or not)
+        pct (float): Percentile to compute (0 - 100)
+
+    Returns:
+        float: The percentile value, 0.0 if there are no samples
+    """
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = int(round(pct / 100.0 * (len(ordered) - 1)))
+    return ordered[min(max(rank, 0), len(ordered) - 1)]
+
+
+class LatencyStats(object):
+    """Thread safe latency recorder
+
+    Keeps exact counters plus a bounded window of the most recent samples
+    which is used to compute percentiles.
+
+    Examples:
+
+    >>> stats = LatencyStats()
+    >>> stats.observe(0.120)
+    >>> stats.summary()
+    {'count': 1, 'errors': 0, 'mean': 0.12, 'p50': 0.12, 'p95': 0.12, 'p99': 0.12, 'max': 0.12}
+    """
+
+    def __init__(self, window: int = 2048) -> None:
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=window)
+        self.count = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float, error: bool = False) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+            if error:
+                self.errors += 1
+
+    def percentiles(self, pcts: Iterable[float] = (50, 95, 99)) -> Dict[str, float]:
+        with self._lock:
+            samples = list(self._samples)
+        return {f"p{pct:g}": percentile(samples, pct) for pct in pcts}
+
+    def summary(self) -> Dict[str, float]:
+        """summary
+
+        Returns:
+            Dict[str, float]: count, errors, mean, p50, p95, p99 and max latency in seconds
+        """
+        with self._lock:
+            count, errors, total, _max = self.count, self.errors, self.total, self.max
+        summary = {
+            "count": count,
+            "errors": errors,
+            "mean": total / count if count else 0.0,
+        }
+        summary.update(self.percentiles())
+        summary["max"] = _max
+        return summary
@@ -0,0 +1,156 @@
+"""Serving many Sarufi accounts (tenants) from one process
+
+`ClientRegistry` hands out one `Sarufi` client per tenant API key. All the
+clients share a single transport, and so one connection pool. Each tenant
+gets a concurrency limit of its own so that one busy tenant cannot take
+every connection, plus request metrics.
+
+Examples:
+
+>>> from sarufi.tenants import ClientRegistry
+>>> registry = ClientRegistry(max_concurrency=8)
+>>> registry.register("acme", api_key="ACME_API_KEY")
+>>> registry.register("globex", api_key="GLOBEX_API_KEY", max_concurrency=32)
+>>> registry.client("acme").chat(bot_id=5, chat_id="123", message="Hello")
+>>> registry.metrics()["acme"]
+{'in_flight': 0, 'throttled': 0, 'count': 1, 'errors': 0, ...}
+"""
+from __future__ import annotations
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator
+
+from .deadline import Deadline, DeadlineExceeded
+from .stats import LatencyStats
+from .transport import Transport
+
+
+class Tenant(object):
+    """Concurrency limit and request metrics of one tenant
+
+    Args:
+        tenant_id (str): Tenant identifier
+        max_concurrency (int, optional): Requests the tenant may have in flight. Defaults to 8.
+    """
+
+    def __init__(self, tenant_id: str, max_concurrency: int = 8) -> None:
+        self.tenant_id = tenant_id
+        self.max_concurrency = max_concurrency
+        self.stats = LatencyStats()
+        self.in_flight = 0
+        self.throttled = 0
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def slot(self, deadline: Deadline = None) -> Iterator[None]:
+        """Holds one of the tenant's request slots, waiting when all are taken
+
+        Raises:
+            DeadlineExceeded: If no slot frees up before the deadline
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.throttled += 1
+            if deadline is None:
+                self._slots.acquire()
+            elif not self._slots.acquire(timeout=max(deadline.remaining(), 0)):
+                raise DeadlineExceeded(
+                    f"no request slot of tenant {self.tenant_id} freed up within the "
+                    f"{deadline.budget:g}s budget"
+                )
+        with self._lock:
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+            self._slots.release()
+
+    def observe(self, seconds: float, error: bool) -> None:
+        self.stats.observe(seconds, error=error)
+
+    def metrics(self) -> Dict[str, Any]:
+        metrics = {"in_flight": self.in_flight, "throttled": self.throttled}
+        metrics.update(self.stats.summary())
+        return metrics
+
+
+class ClientRegistry(object):
+    """Per tenant clients sharing one transport
+
+    Args:
+        transport (Transport, optional): Transport shared by every tenant. Defaults to a new one.
+        max_concurrency (int, optional): Default in flight requests per tenant. Defaults to 8.
+        **client_options: Extra `Sarufi` options (cache, recorder, ...) given to every client
+    """
+
+    def __init__(
+        self, transport: Transport = None, max_concurrency: int = 8, **client_options
+    ) -> None:
+        self.transport = transport or Transport()
+        self.max_concurrency = max_concurrency
+        self.client_options = client_options
+        self._clients: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def register(self, tenant_id: str, api_key: str, max_concurrency: int = None):
+        """register
+
+        Creates (or replaces) the client of a tenant
+
+        Args:
+            tenant_id (str): Tenant identifier
+            api_key (str): The tenant's Sarufi API key
+            max_concurrency (int, optional): In flight requests for this tenant. Defaults to the registry default.
+
+        Returns:
+            Sarufi: The tenant's client
+        """
+        from .client import Sarufi
+
+        tenant = Tenant(tenant_id, max_concurrency or self.max_concurrency)
+        client = Sarufi(
+            api_key=api_key, transport=self.transport, tenant=tenant, **self.client_options
+        )
+        with self._lock:
+            self._clients[tenant_id] = client
+        return client
+
+    def client(self, tenant_id: str):
+        """client
+
+        Args:
+            tenant_id (str): Tenant identifier
+
+        Raises:
+            KeyError: If the tenant is not registered
+
+        Returns:
+            Sarufi: The tenant's client
+        """
+        try:
+            return self._clients[tenant_id]
+        except KeyError:
+            raise KeyError(f"tenant {tenant_id} is not registered") from None
+
+    def remove(self, tenant_id: str) -> None:
+        with self._lock:
+            self._clients.pop(tenant_id, None)
+
+    def __contains__(self, tenant_id: str) -> bool:
+        return tenant_id in self._clients
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def metrics(self) -> Dict[str, Dict[str, Any]]:
+        """Request metrics per tenant"""
+        return {
+            tenant_id: client._tenant.metrics()
+            for tenant_id, client in list(self._clients.items())
+        }
+
+    def close(self) -> None:
+        self.transport.close()
@@ -0,0 +1,323 @@
+"""HTTP transport used by the request helpers of `Sarufi`
+
+`requests` is imported on the first request rather than at import time so
+that `import sarufi` stays cheap for short lived processes.
+
+Large JSON bodies (bot intents and flows) can optionally be sent gzip
+compressed. The body is serialized and compressed incrementally and sent
+with chunked transfer encoding, so neither the full JSON text nor the full
+compressed payload is ever built in memory.
+"""
+from __future__ import annotations
+import json
+import zlib
+import logging
+import threading
+from itertools import chain
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from .scheduler import PriorityScheduler
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 120
+
+# raw JSON bytes fed to the compressor / compressed bytes sent per chunk
+_CHUNK_SIZE = 64 * 1024
+
+
+def strip_of_nones(data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Removes keys with `None` values from a request body"""
+    if isinstance(data, dict):
+        return {k: v for k, v in data.items() if v is not None}
+    error_message = f"{data} should be dict not {type(data)}"
+    logger.error(error_message)
+
+
+def _gzip_stream(chunks: Iterator[bytes], level: int) -> Iterator[bytes]:
+    """Gzip compresses an iterator of byte chunks lazily"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    pending: List[bytes] = []
+    pending_size = 0
+    output = bytearray()
+    for chunk in chunks:
+        pending.append(chunk)
+        pending_size += len(chunk)
+        if pending_size >= _CHUNK_SIZE:
+            output += compressor.compress(b"".join(pending))
+            pending, pending_size = [], 0
+            if len(output) >= _CHUNK_SIZE:
+                yield bytes(output)
+                output.clear()
+    output += compressor.compress(b"".join(pending))
+    output += compressor.flush()
+    yield bytes(output)
+
+
+class Transport(object):
+    """Pooled HTTP/1.1 transport backed by a `requests.Session`
+
+    One transport can be shared by many clients (and the bots they create)
+    so that they reuse the same keep-alive connections.
+
+    Args:
+        pool_maxsize (int, optional): Connections kept alive per host. Defaults to 32.
+        compress_threshold (int, optional): Gzip JSON bodies of at least this many bytes,
+            None disables request compression. Defaults to None.
+        compresslevel (int, optional): zlib compression level (1-9). Defaults to 6.
+        scheduler (PriorityScheduler, optional): Orders requests by priority class so chat
+            traffic is not held up by background jobs. Defaults to None.
+    """
+
+    def __init__(
+        self,
+        pool_maxsize: int = 32,
+        compress_threshold: int = None,
+        compresslevel: int = 6,
+        scheduler: PriorityScheduler = None,
+    ) -> None:
+        self.pool_maxsize = pool_maxsize
+        self.compress_threshold = compress_threshold
+        self.compresslevel = compresslevel
+        self.scheduler = scheduler
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    import requests
+
+                    session = requests.Session()
+                    adapter = requests.adapters.HTTPAdapter(
+                        pool_connections=4, pool_maxsize=self.pool_maxsize
+                    )
+                    session.mount("https://", adapter)
+                    session.mount("http://", adapter)
+                    # every encoding urllib3 can decode here (gzip, deflate, br/zstd when installed)
+                    from urllib3.util.request import ACCEPT_ENCODING
+
+                    session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+                    self._session = session
+        return self._session
+
+    def encode(self, body: Dict[str, Any]) -> Tuple[Any, Dict[str, str]]:
+        """encode
+
+        Serializes a JSON body, compressing it when it reaches `compress_threshold`
+
+        Args:
+            body (Dict[str, Any]): JSON body
+
+        Returns:
+            Tuple[Any, Dict[str, str]]: Encoded body (bytes or a chunk iterator) and extra headers
+        """
+        if self.compress_threshold is None:
+            return json.dumps(body).encode("utf-8"), {}
+
+        pieces = (piece.encode("utf-8") for piece in json.JSONEncoder().iterencode(body))
+        head: List[bytes] = []
+        size = 0
+        for piece in pieces:
+            head.append(piece)
+            size += len(piece)
+            if size >= self.compress_threshold:
+                break
+        else:
+            return b"".join(head), {}
+        stream = _gzip_stream(chain(head, pieces), self.compresslevel)
+        return stream, {"Content-Encoding": "gzip"}
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        headers: Dict[str, str],
+        data: Any = None,
+        json: Dict[str, Any] = None,
+        timeout: Any = DEFAULT_TIMEOUT,
+        stream: bool = False,
+        path: str = None,
+    ):
+        """request
+
+        Sends a request and returns the response, a response is returned for
+        every status code so callers can inspect error bodies
+
+        Args:
+            method (str): HTTP method
+            url (str): URL to make the request to
+            headers (Dict[str, str]): Request headers
+            data (Any, optional): Already encoded request body. Defaults to None.
+            json (Dict[str, Any], optional): JSON body, encoded (and compressed) by the transport. Defaults to None.
+            timeout (Any, optional): Seconds (or (connect, read) tuple) to wait. Defaults to 120.
+            stream (bool, optional): Return once the headers arrive and leave the body to be
+                read with `iter_content`, the caller closes the response. Defaults to False.
+            path (str, optional): API path relative to the client's base URL, classifies the
+                request for the scheduler. Defaults to the URL path.
+
+        Returns:
+            requests.Response: The response
+        """
+        if self.scheduler is None:
+            return self._send(method, url, headers, data, json, timeout, stream)
+        with self.scheduler.slot(self.scheduler.classify(method, url, path)):
+            return self._send(method, url, headers, data, json, timeout, stream)
+
+    def _send(
+        self,
+        method: str,
+        url: str,
+        headers: Dict[str, str],
+        data: Any,
+        json: Optional[Dict[str, Any]],
+        timeout: Any,
+        stream: bool = False,
+    ):
+        data, headers = self._prepare(headers, data, json)
+        return self.session.request(
+            method, url, data=data, headers=headers, timeout=timeout, stream=stream
+        )
+
+    def _prepare(
+        self, headers: Dict[str, str], data: Any, json: Optional[Dict[str, Any]]
+    ) -> Tuple[Any, Dict[str, str]]:
+        if json is not None:
+            data, extra_headers = self.encode(json)
+            if extra_headers:
+                headers = dict(headers, **extra_headers)
+        return data, headers
+
+    def retryable(self, error: Exception) -> bool:
+        """Whether a failed attempt never reached the server and may be sent again
+
+        Only failures to connect qualify: a connection dropped after the request
+        was written may have been processed, and resending a POST could repeat it.
+        """
+        import requests
+        from urllib3.exceptions import MaxRetryError, NewConnectionError
+
+        if isinstance(error, requests.ConnectTimeout):
+            return True
+        if not isinstance(error, requests.ConnectionError) or not error.args:
+            return False
+        cause = error.args[0]
+        if isinstance(cause, MaxRetryError):
+            cause = cause.reason
+        return isinstance(cause, NewConnectionError)
+
+    def timed_out(self, error: Exception) -> bool:
+        """Whether an attempt failed on its connect or read timeout"""
+        import requests
+
+        return isinstance(error, requests.Timeout)
+
+    def close(self) -> None:
+        """Closes pooled connections"""
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+
+class HTTP2Transport(Transport):
+    """Multiplexed HTTP/2 transport backed by `httpx`
+
+    Many in-flight requests share a few connections instead of holding one
+    socket each. Requires `pip install httpx[http2]`, without it the
+    transport logs a warning and falls back to the pooled HTTP/1.1
+    transport. Servers that do not negotiate HTTP/2 are spoken to over
+    HTTP/1.1 by httpx itself.
+
+    Args:
+        max_connections (int, optional): Connections opened per host at most. Defaults to 4.
+        prior_knowledge (bool, optional): Speak HTTP/2 over cleartext `http://` without
+            negotiation (h2c), e.g. to a local proxy. Defaults to False.
+        **kwargs: `Transport` options (compress_threshold, ...), used by the fallback too.
+
+    Examples:
+
+    >>> from sarufi import Sarufi
+    >>> from sarufi.transport import HTTP2Transport
+    >>> sarufi = Sarufi(api_key="YOUR_API_KEY", transport=HTTP2Transport())
+    """
+
+    def __init__(
+        self, max_connections: int = 4, prior_knowledge: bool = False, **kwargs
+    ) -> None:
+        super().__init__(**kwargs)
+        self.max_connections = max_connections
+        self.prior_knowledge = prior_knowledge
+        self._client = None
+        self._fallback = False
+
+    @property
+    def client(self):
+        """The httpx client, None when falling back to HTTP/1.1"""
+        if self._client is None and not self._fallback:
+            with self._lock:
+                if self._client is None and not self._fallback:
+                    try:
+                        import httpx
+                        import h2  # noqa: F401, httpx needs it for http2=True
+                    except ImportError:
+                        logger.warning(
+                            "httpx[http2] is not installed, falling back to HTTP/1.1"
+                        )
+                        self._fallback = True
+                        return None
+                    self._client = httpx.Client(
+                        http1=not self.prior_knowledge,
+                        http2=True,
+                        limits=httpx.Limits(
+                            max_connections=self.max_connections,
+                            max_keepalive_connections=self.max_connections,
+                        ),
+                    )
+        return self._client
+
+    def _send(
+        self,
+        method: str,
+        url: str,
+        headers: Dict[str, str],
+        data: Any,
+        json: Optional[Dict[str, Any]],
+        timeout: Any,
+        stream: bool = False,
+    ):
+        client = self.client
+        if client is None:
+            return super()._send(method, url, headers, data, json, timeout, stream)
+
+        import httpx
+
+        if isinstance(timeout, tuple):
+            timeout = httpx.Timeout(timeout[1], connect=timeout[0])
+        data, headers = self._prepare(headers, data, json)
+        request = client.build_request(
+            method, url, content=data, headers=headers, timeout=timeout
+        )
+        return client.send(request, stream=stream)
+
+    def retryable(self, error: Exception) -> bool:
+        if self._client is None:
+            return super().retryable(error)
+        import httpx
+
+        return isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout))
+
+    def timed_out(self, error: Exception) -> bool:
+        if self._client is None:
+            return super().timed_out(error)
+        import httpx
+
+        return isinstance(error, httpx.TimeoutException)
+
+    def close(self) -> None:
+        super().close()
+        if self._client is not None:
+            self._client.close()
+            self._client = None
@@ -0,0 +1,249 @@
+"""Deduplication and conflict detection for intent utterances
+
+Intents assembled from several sources carry duplicate and near duplicate
+utterances, and sometimes the same utterance under two intents, which bloats
+`create_bot`/`update_bot` payloads and hurts intent classification.
+
+`dedupe_intents` normalizes every utterance (case, whitespace, punctuation,
+accents, stretched letters, Swahili `ng'` spellings), drops exact duplicates
+through a hash index and finds near duplicates with a MinHash index over
+character shingles. Each utterance is hashed once into one-permutation
+MinHash bins and the signatures are banded for LSH, so the cost grows
+linearly with the number of utterances.
+
+Examples:
+
+>>> from sarufi.utterances import dedupe_intents, normalize
+>>> report = dedupe_intents(intents)
+>>> print(report.summary())
+12 duplicates dropped, 1 cross-intent conflicts, 3 near duplicates (2 across intents)
+>>> sarufi.update_bot(id=5, intents=report.intents)
+>>> normalize("Mamboooo!!"), normalize("toa shilingi 1000")
+('mambo', 'toa shilingi 1000')
+"""
+from __future__ import annotations
+import re
+import zlib
+import random
+import unicodedata
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+_APOSTROPHES = str.maketrans({"’": "'", "‘": "'", "`": "'", "´": "'"})
+_NG_APOSTROPHE = re.compile(r"\bng'(?=\w)")
+_NON_WORD = re.compile(r"[^\w\s]+")
+_STRETCHED = re.compile(r"([^\W\d_])\1{2,}")  # letters only, amounts like 1000 stay
+_SPACES = re.compile(r"\s+")
+
+SHINGLE_SIZE = 3
+BINS = 40
+ROWS_PER_BAND = 5
+_EMPTY = 0xFFFFFFFF
+
+
+def normalize(utterance: str) -> str:
+    """normalize
+
+    Folds an utterance to the form used for comparison: NFKC, case folded,
+    accents removed, `ng'ombe`/`ng’ombe`/`ngombe` folded to `ngombe`,
+    punctuation dropped, letters repeated three or more times collapsed to
+    one (`mamboooo` -> `mambo`, while Swahili long vowels like `saa` and
+    digits like `1000` stay) and whitespace collapsed
+
+    Args:
+        utterance (str): Raw utterance
+
+    Returns:
+        str: Normalized utterance
+    """
+    text = unicodedata.normalize("NFKC", utterance).casefold()
+    if not text.isascii():
+        text = "".join(
+            char for char in unicodedata.normalize("NFKD", text) if not unicodedata.combining(char)
+        )
+    text = text.translate(_APOSTROPHES)
+    text = _NG_APOSTROPHE.sub("ng", text)
+    text = _NON_WORD.sub(" ", text).replace("_", " ")
+    text = _STRETCHED.sub(r"\1", text)
+    return _SPACES.sub(" ", text).strip()
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> Set[int]:
+    """Hashed character shingles of a normalized utterance"""
+    padded = f" {text} "
+    if len(padded) <= size:
+        return {zlib.crc32(padded.encode("utf-8"))}
+    return {
+        zlib.crc32(padded[i : i + size].encode("utf-8"))
+        for i in range(len(padded) - size + 1)
+    }
+
+
+def _probe_sequences(bins: int, length: int = 64) -> List[List[int]]:
+    """Fixed pseudo random bins each empty bin borrows from, shared by all signatures"""
+    generator = random.Random(bins)
+    return [[generator.randrange(bins) for _ in range(length)] for _ in range(bins)]
+
+
+_PROBES = _probe_sequences(BINS)
+
+
+def signature(hashes: Set[int]) -> Tuple[int, ...]:
+    """One permutation MinHash: every shingle hash is routed to one bin, the bin keeps its minimum
+
+    Empty bins borrow from the first non empty bin of their own pseudo random
+    probe sequence (optimal densification), so short utterances still produce
+    comparable signatures without neighbouring bins all copying one value.
+    """
+    mins = [_EMPTY] * BINS
+    for value in hashes:
+        mixed = (value * 0x9E3779B1) & 0xFFFFFFFF
+        slot = (mixed * BINS) >> 32  # high bits pick the bin, low bits of a product are weak
+        if mixed < mins[slot]:
+            mins[slot] = mixed
+    if _EMPTY not in mins:
+        return tuple(mins)
+    dense = list(mins)
+    for slot, value in enumerate(mins):
+        if value == _EMPTY:
+            for attempt, probe in enumerate(_PROBES[slot], 1):
+                if mins[probe] != _EMPTY:
+                    dense[slot] = mins[probe] ^ ((attempt * 0x61C88647) & 0xFFFFFFFF)
+                    break
+    return tuple(dense)
+
+
+class NearDuplicate(NamedTuple):
+    intent: str
+    utterance: str
+    other_intent: str
+    other_utterance: str
+    similarity: float
+
+    @property
+    def cross_intent(self) -> bool:
+        return self.intent != self.other_intent
+
+
+class DedupReport(object):
+    """Result of `dedupe_intents`
+
+    Attributes:
+        intents (Dict[str, List[str]]): Intents without duplicate utterances
+        duplicates (List[Tuple[str, str, str]]): Dropped (intent, utterance, kept utterance)
+        conflicts (Dict[str, List[str]]): Normalized utterance -> intents it appears under
+        near_duplicates (List[NearDuplicate]): Similar utterance pairs above the threshold
+    """
+
+    def __init__(self) -> None:
+        self.intents: Dict[str, List[str]] = {}
+        self.duplicates: List[Tuple[str, str, str]] = []
+        self.conflicts: Dict[str, List[str]] = {}
+        self.near_duplicates: List[NearDuplicate] = []
+
+    @property
+    def cross_intent_near_duplicates(self) -> List[NearDuplicate]:
+        return [pair for pair in self.near_duplicates if pair.cross_intent]
+
+    def summary(self) -> str:
+        return (
+            f"{len(self.duplicates)} duplicates dropped, "
+            f"{len(self.conflicts)} cross-intent conflicts, "
+            f"{len(self.near_duplicates)} near duplicates "
+            f"({len(self.cross_intent_near_duplicates)} across intents)"
+        )
+
+    def __repr__(self) -> str:
+        return f"DedupReport({self.summary()})"
+
+
+def dedupe_intents(
+    intents: Dict[str, List[str]],
+    threshold: Optional[float] = 0.8,
+    drop_conflicts: bool = False,
+    max_bucket: int = 256,
+) -> DedupReport:
+    """dedupe_intents
+
+    Drops exact duplicate utterances (after normalization) and reports
+    cross-intent conflicts and near duplicates
+
+    Args:
+        intents (Dict[str, List[str]]): Intents {intent: [utterances]}
+        threshold (float, optional): Shingle Jaccard similarity from which two utterances are
+            near duplicates, None skips the near duplicate search. Defaults to 0.8.
+        drop_conflicts (bool, optional): Keep a conflicting utterance only under the first intent
+            it appears in instead of under every intent. Defaults to False.
+        max_bucket (int, optional): LSH bucket size above which a bucket is not compared pairwise,
+            guards against quadratic blowups on degenerate inputs. Defaults to 256.
+
+    Returns:
+        DedupReport: Cleaned intents and findings
+    """
+    if not isinstance(intents, dict):
+        raise TypeError("intents must be a dictionary {intent_name: [utterances]}")
+    report = DedupReport()
+    # normalized utterance -> {intent: kept original}
+    seen: Dict[str, Dict[str, str]] = {}
+    unique: List[Tuple[str, str, str]] = []  # (intent, original, normalized)
+
+    for intent, utterances in intents.items():
+        kept = report.intents.setdefault(intent, [])
+        for utterance in utterances:
+            key = normalize(str(utterance))
+            owners = seen.setdefault(key, {})
+            if intent in owners:
+                report.duplicates.append((intent, utterance, owners[intent]))
+                continue
+            if owners and drop_conflicts:
+                report.duplicates.append((intent, utterance, next(iter(owners.values()))))
+                owners[intent] = utterance
+                continue
+            owners[intent] = utterance
+            kept.append(utterance)
+            if len(owners) == 1:
+                unique.append((intent, utterance, key))
+
+    for key, owners in seen.items():
+        if len(owners) > 1:
+            report.conflicts[key] = list(owners)
+
+    if threshold is None:
+        return report
+
+    shingle_sets = [shingles(key) for _, _, key in unique]
+    bands = BINS // ROWS_PER_BAND
+    buckets: Dict[Tuple[int, Tuple[int, ...]], List[int]] = defaultdict(list)
+    for position, hashes in enumerate(shingle_sets):
+        mins = signature(hashes)
+        # interleaved bands, so one band never holds only neighbouring bins
+        for band in range(bands):
+            buckets[(band, mins[band::bands])].append(position)
+
+    # candidate pairs packed as first << 32 | second, each verified once
+    candidates: Set[int] = set()
+    for members in buckets.values():
+        if 1 < len(members) <= max_bucket:
+            candidates.update(
+                first << 32 | second
+                for i, first in enumerate(members)
+                for second in members[i + 1 :]
+            )
+    del buckets
+
+    for pair in sorted(candidates):
+        first, second = pair >> 32, pair & 0xFFFFFFFF
+        a, b = shingle_sets[first], shingle_sets[second]
+        shared = len(a & b)
+        similarity = shared / (len(a) + len(b) - shared)
+        if similarity >= threshold:
+            report.near_duplicates.append(
+                NearDuplicate(
+                    unique[first][0],
+                    unique[first][1],
+                    unique[second][0],
+                    unique[second][1],
+                    round(similarity, 4),
+                )
+            )
+    return report
@@ -0,0 +1,269 @@
+"""Local validation of intents and flow before they are uploaded
+
+The intents and flow dicts are compiled into an indexed graph (one integer
+per state, adjacency lists of integers) and every check is a single linear
+pass or breadth first search over that graph, so validating large bots is
+cheap compared to a round trip to the API.
+
+A flow state either points to the next state with `next_state`, or is a
+choice state (`choice_*`) mapping user options to states. `end` is the
+terminal state.
+
+Examples:
+
+>>> from sarufi.validation import validate_bot
+>>> report = validate_bot(intents, flow)
+>>> report.ok
+False
+>>> print(report)
+error: dangling_edge: toa_amount: next_state points to missing state "toa_password"
+"""
+from __future__ import annotations
+import logging
+from collections import deque
+from typing import Any, Dict, List, NamedTuple, Optional
+
+logger = logging.getLogger(__name__)
+
+END_STATE = "end"
+
+ERROR = "error"
+WARNING = "warning"
+
+
+class ValidationIssue(NamedTuple):
+    severity: str
+    kind: str
+    state: str
+    message: str
+
+    def __str__(self) -> str:
+        return f"{self.severity}: {self.kind}: {self.state}: {self.message}"
+
+
+class ValidationReport(object):
+    """Issues found in a bot's intents and flow"""
+
+    def __init__(self, issues: List[ValidationIssue]) -> None:
+        self.issues = issues
+
+    @property
+    def errors(self) -> List[ValidationIssue]:
+        return [issue for issue in self.issues if issue.severity == ERROR]
+
+    @property
+    def warnings(self) -> List[ValidationIssue]:
+        return [issue for issue in self.issues if issue.severity == WARNING]
+
+    @property
+    def ok(self) -> bool:
+        """True when there is no error (warnings are allowed)"""
+        return not self.errors
+
+    def __str__(self) -> str:
+        return "\n".join(str(issue) for issue in self.issues) or "ok"
+
+    def __repr__(self) -> str:
+        return f"ValidationReport(errors={len(self.errors)}, warnings={len(self.warnings)})"
+
+
+class FlowValidationError(ValueError):
+    """Raised when a bot definition fails validation before upload"""
+
+    def __init__(self, report: ValidationReport) -> None:
+        super().__init__(f"Invalid bot definition:\n{report}")
+        self.report = report
+
+
+class FlowGraph(object):
+    """Flow compiled into integer indexed adjacency lists
+
+    Attributes:
+        states (List[str]): State names, the position is the state index
+        index (Dict[str, int]): State name -> state index
+        edges (List[List[int]]): Outgoing edges per state index
+        dangling (List[tuple]): (state, label, missing target) for edges to unknown states
+        roots (List[int]): Indexes of the states entered from an intent
+    """
+
+    def __init__(self) -> None:
+        self.states: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.edges: List[List[int]] = []
+        self.dangling: List[tuple] = []
+        self.roots: List[int] = []
+
+    def _add(self, state: str) -> int:
+        position = self.index.get(state)
+        if position is None:
+            position = self.index[state] = len(self.states)
+            self.states.append(state)
+            self.edges.append([])
+        return position
+
+    def successors(self, state: str) -> List[str]:
+        return [self.states[i] for i in self.edges[self.index[state]]]
+
+    def reachable(self) -> List[bool]:
+        """Marks the states reachable from the intent (root) states"""
+        seen = [False] * len(self.states)
+        queue = deque(self.roots)
+        for root in self.roots:
+            seen[root] = True
+        while queue:
+            for target in self.edges[queue.popleft()]:
+                if not seen[target]:
+                    seen[target] = True
+                    queue.append(target)
+        return seen
+
+    def can_exit(self) -> List[bool]:
+        """Marks the states from which the conversation can terminate
+
+        Exits are `end`, states without outgoing edges and dangling targets
+        (those are reported separately).
+        """
+        size = len(self.states)
+        reverse: List[List[int]] = [[] for _ in range(size)]
+        exits = [False] * size
+        for source, targets in enumerate(self.edges):
+            if not targets:
+                exits[source] = True
+            for target in targets:
+                reverse[target].append(source)
+        for state, _, _ in self.dangling:
+            exits[self.index[state]] = True
+        queue = deque(i for i in range(size) if exits[i])
+        while queue:
+            for source in reverse[queue.popleft()]:
+                if not exits[source]:
+                    exits[source] = True
+                    queue.append(source)
+        return exits
+
+
+def _targets(state: str, definition: Any):
+    """Yields (label, target) pairs for the outgoing edges of a state"""
+    if not isinstance(definition, dict):
+        return
+    if state.startswith("choice_"):
+        for option, target in definition.items():
+            if isinstance(target, str):
+                yield f"choice {option}", target
+    else:
+        target = definition.get("next_state")
+        if isinstance(target, str):
+            yield "next_state", target
+
+
+def compile_flow(
+    flow: Dict[str, Any], intents: Optional[Dict[str, List[str]]] = None
+) -> FlowGraph:
+    """compile_flow
+
+    Compiles a flow into a `FlowGraph` in linear time
+
+    Args:
+        flow (Dict[str, Any]): Bot flow {state: definition}
+        intents (Dict[str, List[str]], optional): Bot intents, their states become the graph roots.
+            Without intents every state nothing points to is a root. Defaults to None.
+
+    Returns:
+        FlowGraph: The compiled flow
+    """
+    graph = FlowGraph()
+    graph._add(END_STATE)
+    for state in flow:
+        graph._add(state)
+    for state, definition in flow.items():
+        source = graph.index[state]
+        for label, target in _targets(state, definition):
+            if target in graph.index:
+                graph.edges[source].append(graph.index[target])
+            else:
+                graph.dangling.append((state, label, target))
+
+    if intents is not None:
+        graph.roots = [graph.index[intent] for intent in intents if intent in flow]
+    else:
+        referenced = [False] * len(graph.states)
+        for targets in graph.edges:
+            for target in targets:
+                referenced[target] = True
+        graph.roots = [i for i in range(1, len(graph.states)) if not referenced[i]]
+    return graph
+
+
+def validate_bot(
+    intents: Optional[Dict[str, List[str]]] = None,
+    flow: Optional[Dict[str, Any]] = None,
+) -> ValidationReport:
+    """validate_bot
+
+    Checks intents and flow for dangling edges, unreachable states, cycles
+    without an exit and intent/flow mismatches
+
+    Args:
+        intents (Dict[str, List[str]], optional): Bot intents. Defaults to None.
+        flow (Dict[str, Any], optional): Bot flow. Defaults to None.
+
+    Returns:
+        ValidationReport: Issues found, `report.ok` is True when there is no error
+    """
+    issues: List[ValidationIssue] = []
+    if intents is not None and not isinstance(intents, dict):
+        issues.append(ValidationIssue(ERROR, "type", "intents", "intents must be a dict"))
+        intents = None
+    if flow is not None and not isinstance(flow, dict):
+        issues.append(ValidationIssue(ERROR, "type", "flow", "flow must be a dict"))
+        flow = None
+
+    for intent, utterances in (intents or {}).items():
+        if not isinstance(utterances, list) or not utterances:
+            issues.append(
+                ValidationIssue(ERROR, "empty_intent", intent, "intent has no utterances")
+            )
+    if flow is None:
+        return ValidationReport(issues)
+
+    for state, definition in flow.items():
+        if not isinstance(definition, dict):
+            issues.append(
+                ValidationIssue(ERROR, "type", state, "state definition must be a dict")
+            )
+    if intents is not None:
+        for intent in intents:
+            if intent not in flow:
+                issues.append(
+                    ValidationIssue(ERROR, "missing_flow", intent, "intent has no flow state")
+                )
+
+    graph = compile_flow(flow, intents)
+    for state, label, target in graph.dangling:
+        issues.append(
+            ValidationIssue(
+                ERROR, "dangling_edge", state, f'{label} points to missing state "{target}"'
+            )
+        )
+
+    reachable = graph.reachable()
+    can_exit = graph.can_exit()
+    for position, state in enumerate(graph.states):
+        if state == END_STATE:
+            continue
+        if not reachable[position]:
+            issues.append(
+                ValidationIssue(
+                    WARNING, "unreachable", state, "state is not reachable from any intent"
+                )
+            )
+        if not can_exit[position]:
+            issues.append(
+                ValidationIssue(
+                    ERROR,
+                    "cycle_without_exit",
+                    state,
+                    f'state loops forever without reaching "{END_STATE}"',
+                )
+            )
+    return ValidationReport(issues)
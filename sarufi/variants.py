@@ -0,0 +1,225 @@
+"""Traffic splitting of conversations across bot variants
+
+`VariantRouter` sends each conversation to one of several bots (e.g the
+current bot and a reworked copy) in proportion to their weights. A chat_id
+is assigned by weighted rendezvous hashing: every variant scores the
+chat_id with a hash scaled by its weight and the highest score wins, so the
+assignment is stable across processes and restarts, and changing a weight
+only moves the chats the change has to move. Conversations in the middle
+of a flow are additionally pinned to their bot until the flow reaches
+"end" (or the chat is idle for `session_timeout`), so ramping a variant up
+or down never switches a live conversation to another bot.
+
+Per variant the router keeps latency percentiles, error rates and how often
+each state was reached, to compare the variants in memory. Calls an
+`Outbox` queued during an outage are counted as queued, not as errors.
+
+Examples:
+
+>>> from sarufi import Sarufi
+>>> from sarufi.variants import VariantRouter
+>>> sarufi = Sarufi(api_key="YOUR_API_KEY")
+>>> router = VariantRouter(sarufi, {5: 90, 12: 10})  # bot id -> weight
+>>> router.respond(chat_id="255700000000", message="mambo")
+{'message': ['Salama!'], 'current_state': 'salamu', 'next_state': 'end'}
+>>> router.set_weights({5: 50, 12: 50})
+>>> router.stats()[12]
+{'weight': 50, 'calls': 1204, 'conversations': 310, 'errors': 3, 'error_rate': 0.0025, 'p50': 0.21, ..., 'states': {...}}
+"""
+from __future__ import annotations
+import math
+import time
+import hashlib
+import logging
+import threading
+from collections import Counter
+from typing import Any, Dict, Mapping, Tuple
+
+from .stats import LatencyStats
+from .validation import END_STATE
+
+logger = logging.getLogger(__name__)
+
+SESSION_TIMEOUT = 30 * 60.0
+_SWEEP_EVERY = 4096
+
+
+class _Variant(object):
+    def __init__(self, weight: float) -> None:
+        self.weight = weight
+        self.calls = 0
+        self.conversations = 0
+        self.errors = 0
+        self.queued = 0
+        self.latency = LatencyStats()
+        self.states: Counter = Counter()
+
+
+class VariantRouter(object):
+    """Routes conversations to bot variants by weight, sticky per chat_id
+
+    Args:
+        client (Sarufi): Client used for the chat calls
+        variants (Mapping[int, float]): Bot id -> weight, weights are relative
+        salt (str, optional): Mixed into the hash, a new salt reshuffles all assignments. Defaults to "".
+        session_timeout (float, optional): Seconds of inactivity after which a mid-flow
+            conversation is no longer pinned to its bot. Defaults to 30 minutes.
+    """
+
+    def __init__(
+        self,
+        client,
+        variants: Mapping[int, float],
+        salt: str = "",
+        session_timeout: float = SESSION_TIMEOUT,
+    ) -> None:
+        self.client = client
+        self.salt = salt
+        self.session_timeout = session_timeout
+        self._lock = threading.Lock()
+        self._variants: Dict[int, _Variant] = {}
+        self._pinned: Dict[str, Tuple[int, float]] = {}  # chat_id -> (bot id, last seen)
+        self._calls = 0
+        self.set_weights(variants)
+
+    def set_weights(self, variants: Mapping[int, float]) -> None:
+        """Replaces the weights, a weight of 0 (or a bot left out) takes no new conversations"""
+        if any(weight < 0 for weight in variants.values()):
+            raise ValueError("weights must not be negative")
+        if not any(weight > 0 for weight in variants.values()):
+            raise ValueError("at least one variant needs a positive weight")
+        with self._lock:
+            for variant in self._variants.values():
+                variant.weight = 0
+            for bot_id, weight in variants.items():
+                self._variants.setdefault(bot_id, _Variant(weight)).weight = weight
+        logger.info(f"Variant weights set to {dict(variants)}")
+
+    @property
+    def weights(self) -> Dict[int, float]:
+        with self._lock:
+            return {bot_id: variant.weight for bot_id, variant in self._variants.items()}
+
+    def _score(self, bot_id: int, weight: float, chat_id: str) -> float:
+        digest = hashlib.blake2b(
+            f"{self.salt}:{bot_id}:{chat_id}".encode("utf-8"), digest_size=8
+        ).digest()
+        # uniform in (0, 1), -weight / ln(u) is larger for heavier variants
+        unit = (int.from_bytes(digest, "big") + 0.5) / 2**64
+        return -weight / math.log(unit)
+
+    def hashed(self, chat_id: str) -> int:
+        """Bot a chat_id hashes to under the current weights, ignoring pinning"""
+        chat_id = str(chat_id)
+        with self._lock:
+            candidates = [
+                (bot_id, variant.weight)
+                for bot_id, variant in self._variants.items()
+                if variant.weight > 0
+            ]
+        return max(candidates, key=lambda pair: self._score(pair[0], pair[1], chat_id))[0]
+
+    def assign(self, chat_id: str) -> int:
+        """Bot a chat_id is routed to: its pinned bot while mid-flow, otherwise by hash"""
+        chat_id = str(chat_id)
+        pinned = self._pinned.get(chat_id)
+        if pinned is not None and time.monotonic() - pinned[1] < self.session_timeout:
+            return pinned[0]
+        return self.hashed(chat_id)
+
+    def respond(
+        self,
+        chat_id: str,
+        message: str,
+        message_type: str = "text",
+        channel: str = "general",
+        timeout_budget: float = None,
+    ) -> Dict[str, Any]:
+        """respond
+
+        Sends a message to the bot variant of its chat, see `Sarufi.chat`
+
+        Args:
+            chat_id (str): The chat, decides the variant
+            message (str): The message
+            message_type (str, optional): The type of message. Defaults to "text".
+            channel (str, optional): The channel. Defaults to "general".
+            timeout_budget (float, optional): Seconds the call may take, retries included. Defaults to None.
+
+        Returns:
+            Dict[str, Any]: The bot's response
+        """
+        chat_id = str(chat_id)
+        bot_id = self.assign(chat_id)
+        started = time.perf_counter()
+        try:
+            response = self.client.chat(
+                bot_id=bot_id,
+                chat_id=chat_id,
+                message=message,
+                message_type=message_type,
+                channel=channel,
+                timeout_budget=timeout_budget,
+            )
+        except Exception:
+            self._observe(bot_id, chat_id, time.perf_counter() - started, None)
+            raise
+        self._observe(bot_id, chat_id, time.perf_counter() - started, response)
+        return response
+
+    def _observe(self, bot_id: int, chat_id: str, seconds: float, response: Any) -> None:
+        queued = isinstance(response, dict) and response.get("queued") is True
+        failed = not queued and (not isinstance(response, dict) or "message" not in response)
+        now = time.monotonic()
+        with self._lock:
+            variant = self._variants[bot_id]
+            variant.calls += 1
+            variant.errors += failed
+            if chat_id not in self._pinned:
+                variant.conversations += 1  # not mid-flow, a conversation starts
+            if queued:
+                # held by the outbox, which replays it to this bot: neither a reply nor a failure
+                variant.queued += 1
+                self._pinned[chat_id] = (bot_id, now)
+            elif not failed:
+                state = response.get("current_state")
+                if state:
+                    variant.states[state] += 1
+                if response.get("next_state", END_STATE) == END_STATE:
+                    self._pinned.pop(chat_id, None)
+                else:
+                    self._pinned[chat_id] = (bot_id, now)
+            self._calls += 1
+            if self._calls % _SWEEP_EVERY == 0:
+                self._sweep(now)
+        if not queued:
+            variant.latency.observe(seconds, error=failed)
+
+    def _sweep(self, now: float) -> None:
+        """Unpins conversations idle for longer than the session timeout"""
+        expired = [
+            chat_id
+            for chat_id, (_, seen) in self._pinned.items()
+            if now - seen >= self.session_timeout
+        ]
+        for chat_id in expired:
+            del self._pinned[chat_id]
+
+    def stats(self) -> Dict[int, Dict[str, Any]]:
+        """Weight, calls, conversations, error rate, queued calls, latency and reached states per variant"""
+        stats = {}
+        with self._lock:
+            variants = list(self._variants.items())
+        for bot_id, variant in variants:
+            entry = {
+                "weight": variant.weight,
+                "calls": variant.calls,
+                "conversations": variant.conversations,
+                "errors": variant.errors,
+                "error_rate": round(variant.errors / max(variant.calls - variant.queued, 1), 4),
+                "queued": variant.queued,
+            }
+            entry.update(variant.latency.summary())
+            entry["states"] = dict(variant.states.most_common())
+            stats[bot_id] = entry
+        return stats
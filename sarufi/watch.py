@@ -0,0 +1,403 @@
+"""Hot sync of intents, flow and metadata files to a bot
+
+`BotWatcher` keeps a bot in sync with the files it is developed in. It
+listens for filesystem notifications (`pip install sarufi[watch]` for
+watchdog, without it the files are polled), waits until a burst of saves
+has settled, re-parses only the files that changed and validates them.
+Only the sections that changed are pushed with `update_bot`, so saving
+the flow never re-uploads the intents, and saves that change nothing are
+not pushed at all. The API replaces intents and flow as a whole, so a
+changed section is sent complete while the intents or states that changed
+are logged. The time from the save to the bot being live is reported for
+every sync.
+
+    python -m sarufi.watch --api-key KEY --bot-id 5 --intents intents.json --flow flow.json
+
+Examples:
+
+>>> from sarufi import Sarufi
+>>> sarufi = Sarufi(api_key="YOUR_API_KEY")
+>>> watcher = sarufi.watch_files(5, intents="intents.json", flow="flow.json")
+>>> # edit and save flow.json
+>>> watcher.last_result
+SyncResult(files=['flow.json'], changed={'flow': ['toa_pesa']}, pushed=True, latency=0.412, error=None)
+>>> watcher.stop()
+"""
+from __future__ import annotations
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, List, NamedTuple, Optional, Tuple, Union
+
+from .files import read_file
+from .stats import LatencyStats
+from .validation import validate_bot
+
+logger = logging.getLogger(__name__)
+
+DEBOUNCE = 0.25
+POLL_INTERVAL = 0.5
+RETRY_INTERVAL = 5.0
+
+METADATA_FIELDS = (
+    "name",
+    "description",
+    "industry",
+    "webhook_url",
+    "webhook_trigger_intents",
+    "visible_on_community",
+)
+# watchdog events that mean a file was written, opening or reading it is not a change
+_WRITE_EVENTS = frozenset(("created", "modified", "moved", "closed"))
+_MISSING = object()
+
+
+class SyncResult(NamedTuple):
+    """Outcome of syncing one burst of saves
+
+    Attributes:
+        files (List[str]): Files that changed
+        changed (Dict[str, List[str]]): Changed intents, flow states and metadata fields per section
+        pushed (bool): Whether the changes were pushed to the bot
+        latency (float): Seconds from the last save to the end of the sync
+        error (Optional[str]): Why the changes were not pushed, None on success
+    """
+
+    files: List[str]
+    changed: Dict[str, List[str]]
+    pushed: bool
+    latency: float
+    error: Optional[str] = None
+
+
+def _plain(value: Any) -> Any:
+    """JSON equivalent of a value, read only bot snapshots become plain dicts and lists"""
+    return json.loads(json.dumps(value))
+
+
+def changed_keys(old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]) -> List[str]:
+    """Keys added, removed or changed between two dicts, sorted"""
+    old, new = old or {}, new or {}
+    return sorted(
+        key for key in old.keys() | new.keys() if old.get(key, _MISSING) != new.get(key, _MISSING)
+    )
+
+
+class BotWatcher(object):
+    """Pushes changes of intents, flow and metadata files to a bot as they are saved
+
+    Args:
+        client (Sarufi): Client used to fetch and update the bot
+        bot_id (int): Bot kept in sync
+        intents (Union[Path, str], optional): Intents file. Defaults to None.
+        flow (Union[Path, str], optional): Flow file. Defaults to None.
+        metadata (Union[Path, str], optional): Metadata file. Defaults to None.
+        validate (bool, optional): Validate intents and flow before pushing, invalid saves are not pushed. Defaults to True.
+        dedupe (bool, optional): Drop duplicate utterances before pushing intents. Defaults to False.
+        debounce (float, optional): Seconds without saves before a burst is synced. Defaults to 0.25.
+        poll_interval (float, optional): Seconds between checks when watchdog is not installed. Defaults to 0.5.
+        on_sync (Callable[[SyncResult], None], optional): Called after every sync. Defaults to None.
+    """
+
+    def __init__(
+        self,
+        client,
+        bot_id: int,
+        intents: Union[Path, str] = None,
+        flow: Union[Path, str] = None,
+        metadata: Union[Path, str] = None,
+        validate: bool = True,
+        dedupe: bool = False,
+        debounce: float = DEBOUNCE,
+        poll_interval: float = POLL_INTERVAL,
+        on_sync: Callable[[SyncResult], None] = None,
+    ) -> None:
+        self.client = client
+        self.bot_id = bot_id
+        self.files = {
+            section: os.path.realpath(path)
+            for section, path in (("intents", intents), ("flow", flow), ("metadata", metadata))
+            if path
+        }
+        if not self.files:
+            raise ValueError("nothing to watch, pass intents, flow or metadata")
+        self.validate = validate
+        self.dedupe = dedupe
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.on_sync = on_sync
+        self.latency = LatencyStats()
+        self.results: Deque[SyncResult] = deque(maxlen=64)
+        self.notifications: Optional[str] = None
+
+        self._sections = {path: section for section, path in self.files.items()}
+        self._live: Dict[str, Any] = {}  # section contents the bot is known to have
+        self._pending: Dict[str, float] = {}  # changed path -> time of its first event
+        self._last_event = 0.0
+        self._condition = threading.Condition()
+        self._stopped = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._observer = None
+
+    @property
+    def last_result(self) -> Optional[SyncResult]:
+        return self.results[-1] if self.results else None
+
+    def start(self) -> BotWatcher:
+        """Syncs the files once against the live bot, then watches them in the background"""
+        bot = self.client.get_bot(self.bot_id)
+        if isinstance(bot, dict):
+            raise ValueError(f"could not fetch bot {self.bot_id}: {bot}")
+        self._live = {
+            "intents": _plain(bot.intents or {}),
+            "flow": _plain(bot.flow or {}),
+            "metadata": _plain({field: bot.data.get(field) for field in METADATA_FIELDS}),
+        }
+        self._sync({path: time.time() for path in self.files.values()})
+
+        if self._start_watchdog():
+            self.notifications = "watchdog"
+        else:
+            self.notifications = "polling"
+            self._spawn(self._poll, "sarufi-watch-poll")
+        self._spawn(self._work, "sarufi-watch")
+        logger.info(
+            f"Watching {', '.join(self.files.values())} for bot {self.bot_id} ({self.notifications})"
+        )
+        return self
+
+    def stop(self) -> None:
+        self._stopped.set()
+        with self._condition:
+            self._condition.notify_all()
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+        for thread in self._threads:
+            thread.join()
+
+    def run(self) -> None:
+        """Starts watching and blocks until interrupted (Ctrl+C)"""
+        self.start()
+        try:
+            while not self._stopped.wait(1.0):
+                pass
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def __enter__(self) -> BotWatcher:
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def _spawn(self, target: Callable[[], None], name: str) -> None:
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def _start_watchdog(self) -> bool:
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            logger.info("watchdog is not installed, polling the files for changes")
+            return False
+
+        watcher = self
+
+        class _Handler(FileSystemEventHandler):
+            def on_any_event(self, event) -> None:
+                if event.event_type not in _WRITE_EVENTS:
+                    return
+                # editors saving atomically write a temporary file and move it over the original
+                for path in (event.src_path, getattr(event, "dest_path", "")):
+                    if path:
+                        watcher._changed(os.fsdecode(path))
+
+        self._observer = Observer()
+        handler = _Handler()
+        for directory in {os.path.dirname(path) for path in self.files.values()}:
+            self._observer.schedule(handler, directory, recursive=False)
+        self._observer.start()
+        return True
+
+    def _poll(self) -> None:
+        def signature(path: str) -> Optional[Tuple[int, int, int]]:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                return None
+            return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+        seen = {path: signature(path) for path in self.files.values()}
+        while not self._stopped.wait(self.poll_interval):
+            for path in self.files.values():
+                current = signature(path)
+                if current is not None and current != seen[path]:
+                    seen[path] = current
+                    self._changed(path)
+
+    def _changed(self, path: str) -> None:
+        if path not in self._sections:
+            return
+        with self._condition:
+            self._pending.setdefault(path, time.time())
+            self._last_event = time.monotonic()
+            self._condition.notify()
+
+    def _work(self) -> None:
+        while not self._stopped.is_set():
+            with self._condition:
+                while not self._pending and not self._stopped.is_set():
+                    self._condition.wait()
+                # debounce: wait until the files have been quiet for a while
+                while not self._stopped.is_set():
+                    quiet = self._last_event + self.debounce - time.monotonic()
+                    if quiet <= 0:
+                        break
+                    self._condition.wait(quiet)
+                if self._stopped.is_set():
+                    return
+                pending, self._pending = self._pending, {}
+            result = self._sync(pending)
+            if result is not None and result.error and result.error.startswith("push failed"):
+                with self._condition:
+                    for path, first_event in pending.items():
+                        self._pending.setdefault(path, first_event)
+                self._stopped.wait(RETRY_INTERVAL)
+
+    def _read(self, section: str, path: str) -> Any:
+        content = read_file(path)  # logs and returns None when the file does not parse
+        if content is None:
+            return None
+        content = _plain(content)
+        if section == "intents" and self.dedupe:
+            content = self.client._dedupe(content)
+        if section == "metadata":
+            content = {field: content.get(field) for field in METADATA_FIELDS if field in content}
+        return content
+
+    def _sync(self, pending: Dict[str, float]) -> Optional[SyncResult]:
+        """Re-parses the changed files and pushes the sections that differ from the live bot"""
+        files = sorted(pending)
+        saved_at = max(_mtime(path, pending[path]) for path in files)
+        contents: Dict[str, Any] = {}
+        changed: Dict[str, List[str]] = {}
+        error = None
+        for path in files:
+            section = self._sections[path]
+            try:
+                content = self._read(section, path)
+            except FileNotFoundError:
+                continue  # removed in the middle of a save, its next save syncs it
+            if content is None:
+                error = f"could not parse {path}"
+                continue
+            keys = changed_keys(self._live.get(section), content)
+            if section == "metadata":
+                keys = [key for key in keys if key in content]  # fields cannot be unset
+            if keys:
+                contents[section], changed[section] = content, keys
+
+        if error is None and not changed:
+            return None  # saved without changes
+        if error is None and self.validate and ("intents" in changed or "flow" in changed):
+            report = validate_bot(
+                contents.get("intents", self._live.get("intents")),
+                contents.get("flow", self._live.get("flow")),
+            )
+            for warning in report.warnings:
+                logger.warning(str(warning))
+            if not report.ok:
+                error = f"validation failed:\n{report}"
+
+        pushed = False
+        if error is None:
+            changes: Dict[str, Any] = {}
+            if "intents" in changed:
+                changes["intents"] = contents["intents"]
+            if "flow" in changed:
+                changes["flow"] = contents["flow"]
+            for field in changed.get("metadata", ()):
+                changes[field] = contents["metadata"][field]
+            try:
+                response = self.client.update_bot(self.bot_id, **changes)
+            except Exception as exception:
+                error = f"push failed: {exception!r}"
+            else:
+                if isinstance(response, dict):
+                    error = f"push failed: {response}"
+                else:
+                    pushed = True
+                    self._live.update(contents)
+
+        result = SyncResult(
+            files=[os.path.basename(path) for path in files],
+            changed=changed,
+            pushed=pushed,
+            latency=round(max(time.time() - saved_at, 0.0), 6),
+            error=error,
+        )
+        self.results.append(result)
+        self.latency.observe(result.latency, error=not pushed)
+        summary = "; ".join(f"{section}: {', '.join(keys)}" for section, keys in changed.items())
+        if pushed:
+            logger.info(f"Synced {summary} to bot {self.bot_id} in {result.latency * 1000:.0f} ms")
+        else:
+            logger.error(f"Not synced to bot {self.bot_id}: {error}")
+        if self.on_sync is not None:
+            self.on_sync(result)
+        return result
+
+
+def _mtime(path: str, default: float) -> float:
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return default
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m sarufi.watch", description="Sync intents/flow files to a bot as you save them"
+    )
+    parser.add_argument("--api-key", default=os.environ.get("SARUFI_API_KEY"))
+    parser.add_argument("--bot-id", type=int, required=True)
+    parser.add_argument("--intents", help="intents file (JSON or YAML)")
+    parser.add_argument("--flow", help="flow file (JSON or YAML)")
+    parser.add_argument("--metadata", help="metadata file (JSON or YAML)")
+    parser.add_argument("--no-validate", action="store_true", help="push without validating")
+    parser.add_argument("--dedupe", action="store_true", help="drop duplicate utterances")
+    parser.add_argument("--debounce", type=float, default=DEBOUNCE)
+    args = parser.parse_args(argv)
+    if not args.api_key:
+        parser.error("--api-key (or SARUFI_API_KEY) is required")
+
+    from .client import Sarufi
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    client = Sarufi(api_key=args.api_key)
+    BotWatcher(
+        client,
+        args.bot_id,
+        intents=args.intents,
+        flow=args.flow,
+        metadata=args.metadata,
+        validate=not args.no_validate,
+        dedupe=args.dedupe,
+        debounce=args.debounce,
+    ).run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,288 @@
+"""Receiving side of the bot `webhook_url` fulfillment callbacks
+
+Sarufi calls the bot's `webhook_url` whenever one of the
+`webhook_trigger_intents` is fulfilled. `WebhookReceiver` parses those
+callbacks, routes them by intent to registered handler functions and returns
+the handler result as the JSON response. It can be mounted on any WSGI
+server (gunicorn, waitress, ...) or ASGI server (uvicorn, hypercorn, ...).
+
+Examples:
+
+>>> from sarufi.webhook import WebhookReceiver
+>>> receiver = WebhookReceiver(deadline=3)
+>>> @receiver.handler("toa_hela")
+... def withdraw(payload):
+...     return {"message": ["Umetoa hela"]}
+>>> app = receiver          # WSGI application
+>>> asgi_app = receiver.asgi  # ASGI application
+"""
+from __future__ import annotations
+import json
+import time
+import asyncio
+import logging
+import inspect
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .stats import LatencyStats
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[Dict[str, Any]], Any]
+
+_REASONS = {
+    200: "200 OK",
+    400: "400 Bad Request",
+    404: "404 Not Found",
+    405: "405 Method Not Allowed",
+    500: "500 Internal Server Error",
+    504: "504 Gateway Timeout",
+}
+
+
+class WebhookReceiver(object):
+    """Routes webhook callbacks to handler functions by intent
+
+    Args:
+        deadline (float, optional): Seconds a handler may run before the callback is answered
+            with a timeout response. Defaults to 5.
+        max_workers (int, optional): Size of the thread pool running blocking handlers. Defaults to 32.
+        intent_key (str, optional): Payload field holding the intent name. Defaults to "intent".
+    """
+
+    def __init__(
+        self,
+        deadline: float = 5.0,
+        max_workers: int = 32,
+        intent_key: str = "intent",
+    ) -> None:
+        self.deadline = deadline
+        self.intent_key = intent_key
+        self._handlers: Dict[Optional[str], Handler] = {}
+        self._stats: Dict[str, LatencyStats] = {}
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="sarufi-webhook"
+        )
+
+    def add_handler(self, intent: Optional[str], func: Handler) -> Handler:
+        """add_handler
+
+        Registers a handler for an intent, `None` registers the fallback handler
+        used for intents without a dedicated one
+
+        Args:
+            intent (Optional[str]): Intent name the handler answers
+            func (Handler): Callable (or coroutine function) receiving the parsed payload
+
+        Returns:
+            Handler: The registered handler
+        """
+        if not callable(func):
+            raise TypeError("handler must be callable")
+        self._handlers[intent] = func
+        self._stats.setdefault(intent or "*", LatencyStats())
+        return func
+
+    def handler(self, intent: Optional[str] = None) -> Callable[[Handler], Handler]:
+        """Decorator version of `add_handler`"""
+
+        def decorator(func: Handler) -> Handler:
+            return self.add_handler(intent, func)
+
+        return decorator
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """stats
+
+        Returns:
+            Dict[str, Dict[str, float]]: Handler latency summary per intent ("*" is the fallback handler)
+        """
+        return {intent: stats.summary() for intent, stats in self._stats.items()}
+
+    def close(self) -> None:
+        """Stops the handler thread pool"""
+        self._executor.shutdown(wait=False)
+
+    def _parse(self, body: bytes) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        try:
+            payload = json.loads(body or b"{}")
+        except ValueError:
+            return None, "invalid JSON body"
+        if not isinstance(payload, dict):
+            return None, "webhook body must be a JSON object"
+        return payload, None
+
+    def _route(self, payload: Dict[str, Any]) -> Tuple[Optional[Handler], str]:
+        intent = payload.get(self.intent_key)
+        func = self._handlers.get(intent)
+        if func is not None:
+            return func, intent
+        return self._handlers.get(None), "*"
+
+    def _observe(self, intent: str, started: float, failed: bool) -> None:
+        # handlers that raised or missed the deadline are both counted as errors
+        elapsed = time.perf_counter() - started
+        self._stats[intent].observe(elapsed, error=failed or elapsed > self.deadline)
+
+    @staticmethod
+    def _result(value: Any) -> Tuple[int, Dict[str, Any]]:
+        if value is None:
+            return 200, {}
+        if isinstance(value, dict):
+            return 200, value
+        return 200, {"message": value}
+
+    def dispatch(self, body: bytes) -> Tuple[int, Dict[str, Any]]:
+        """dispatch
+
+        Parses a raw callback body and runs the matching handler on the thread pool,
+        waiting at most `deadline` seconds for it
+
+        Args:
+            body (bytes): Raw request body
+
+        Returns:
+            Tuple[int, Dict[str, Any]]: HTTP status code and JSON response body
+        """
+        payload, error = self._parse(body)
+        if error:
+            return 400, {"error": error}
+        func, intent = self._route(payload)
+        if func is None:
+            return 404, {"error": f"no handler for intent {payload.get(self.intent_key)}"}
+
+        started = time.perf_counter()
+        if inspect.iscoroutinefunction(func):
+            future = self._executor.submit(asyncio.run, func(payload))
+        else:
+            future = self._executor.submit(func, payload)
+        future.add_done_callback(
+            lambda f: self._observe(intent, started, f.exception() is not None)
+        )
+        try:
+            return self._result(future.result(timeout=self.deadline))
+        except FutureTimeout:
+            logger.warning(f"Webhook handler for {intent} exceeded {self.deadline}s")
+            return 504, {"error": "handler deadline exceeded"}
+        except Exception as error:
+            logger.exception(error)
+            return 500, {"error": "handler failed"}
+
+    async def dispatch_async(self, body: bytes) -> Tuple[int, Dict[str, Any]]:
+        """Asyncio version of `dispatch`, blocking handlers still run on the thread pool"""
+        payload, error = self._parse(body)
+        if error:
+            return 400, {"error": error}
+        func, intent = self._route(payload)
+        if func is None:
+            return 404, {"error": f"no handler for intent {payload.get(self.intent_key)}"}
+
+        started = time.perf_counter()
+        if inspect.iscoroutinefunction(func):
+            task = asyncio.ensure_future(func(payload))
+        else:
+            loop = asyncio.get_running_loop()
+            task = loop.run_in_executor(self._executor, func, payload)
+        task.add_done_callback(
+            lambda f: self._observe(
+                intent, started, f.cancelled() or f.exception() is not None
+            )
+        )
+        try:
+            return self._result(
+                await asyncio.wait_for(asyncio.shield(task), self.deadline)
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"Webhook handler for {intent} exceeded {self.deadline}s")
+            return 504, {"error": "handler deadline exceeded"}
+        except Exception as error:
+            logger.exception(error)
+            return 500, {"error": "handler failed"}
+
+    def __call__(self, environ: Dict[str, Any], start_response: Callable):
+        """WSGI entry point"""
+        if environ.get("REQUEST_METHOD") != "POST":
+            status, response = 405, {"error": "webhook accepts POST only"}
+        else:
+            try:
+                length = int(environ.get("CONTENT_LENGTH") or 0)
+            except ValueError:
+                length = 0
+            status, response = self.dispatch(environ["wsgi.input"].read(length))
+        data = json.dumps(response).encode("utf-8")
+        start_response(
+            _REASONS.get(status, str(status)),
+            [("Content-Type", "application/json"), ("Content-Length", str(len(data)))],
+        )
+        return [data]
+
+    async def asgi(self, scope: Dict[str, Any], receive: Callable, send: Callable):
+        """ASGI entry point"""
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    self.close()
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if scope["type"] != "http":
+            return
+
+        if scope.get("method") != "POST":
+            status, response = 405, {"error": "webhook accepts POST only"}
+        else:
+            chunks = []
+            more_body = True
+            while more_body:
+                message = await receive()
+                chunks.append(message.get("body", b""))
+                more_body = message.get("more_body", False)
+            status, response = await self.dispatch_async(b"".join(chunks))
+
+        data = json.dumps(response).encode("utf-8")
+        await send(
+            {
+                "type": "http.response.start",
+                "status": status,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(data)).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": data})
+
+    def serve(self, host: str = "127.0.0.1", port: int = 8000):
+        """serve
+
+        Serves the receiver with a threaded `wsgiref` server, handy for local
+        development and load tests. Use a production WSGI/ASGI server otherwise.
+
+        Args:
+            host (str, optional): Interface to bind. Defaults to "127.0.0.1".
+            port (int, optional): Port to bind, 0 picks a free one. Defaults to 8000.
+
+        Returns:
+            WSGIServer: The server, call `serve_forever()` on it
+        """
+        from socketserver import ThreadingMixIn
+        from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+        class _ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+            daemon_threads = True
+            request_queue_size = 1024
+
+        class _QuietHandler(WSGIRequestHandler):
+            def log_message(self, *args):
+                pass
+
+        return make_server(
+            host,
+            port,
+            self,
+            server_class=_ThreadingWSGIServer,
+            handler_class=_QuietHandler,
+        )
@@ -20,6 +20,7 @@ setup(
     license="MIT",
     packages=["sarufi"],
     install_requires=["requests", "pyyaml"],
+    extras_require={"http2": ["httpx[http2]"], "analytics": ["numpy"], "watch": ["watchdog"]},
     keywords=[
         "sarufi",
         "Sarufi Python SDK",